@@ -0,0 +1,160 @@
+import os
+import asyncio
+import threading
+from pathlib import Path
+from functools import partial
+from operator import methodcaller
+from contextlib import asynccontextmanager
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, List, Optional, Set, Union
+
+from archive.open_archive import ArchiveHandle, open_archive
+from archive.wrappers import ArchiveWrapper
+
+CHUNK_SIZE = 64 * 1024
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def default_executor() -> ThreadPoolExecutor:
+    """
+    One bounded thread pool shared by every AsyncArchive that isn't given
+    its own, so the number of threads doesn't grow with open archives.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DEFAULT_WORKERS,
+                                           thread_name_prefix='archive-aio')
+        return _executor
+
+
+def _read_member(wrapper: ArchiveWrapper, name: str) -> bytes:
+    item = wrapper.open_by_name(name)
+    stream = item.get(name) if item else None
+    if stream is None:
+        raise KeyError('No file named {}'.format(name))
+    with stream:
+        return stream.read()
+
+
+class AsyncArchive:
+    """
+    asyncio front end to an archive. Every call that decompresses or touches
+    the disk runs on executor, keeping the event loop free.
+
+    A wrapper can't serve two calls at once, so the archive keeps up to
+    max_concurrency handles and a semaphore admits that many calls, each on
+    a handle of its own. Further calls wait their turn. Cancelling a call
+    returns control at once, but the thread running it can't be
+    interrupted. Its handle is closed when the thread finishes rather than
+    being reused.
+    """
+
+    def __init__(self, path: Path, handle: ArchiveHandle, executor: Executor,
+                 max_concurrency: int = 1, **open_kwargs: Any) -> None:
+        self.path = path
+        self._executor = executor
+        self._open_kwargs = open_kwargs
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._idle: List[ArchiveHandle] = [handle]
+        self._retired: Set[ArchiveHandle] = set()
+        self._closed = False
+
+    @classmethod
+    async def open(cls, path: Union[str, Path], executor: Optional[Executor] = None,
+                   max_concurrency: int = 1, **open_kwargs: Any) -> 'AsyncArchive':
+        """
+        open_kwargs are passed on to open_archive. Raises ValueError if path
+        isn't a recognised archive.
+        """
+        path = Path(path)
+        executor = executor or default_executor()
+        handle = await asyncio.get_running_loop().run_in_executor(
+            executor, partial(open_archive, path, **open_kwargs))
+        if handle is None:
+            raise ValueError('Not a recognised archive: {}'.format(path))
+        return cls(path, handle, executor, max_concurrency, **open_kwargs)
+
+    async def _call(self, handle: ArchiveHandle, func: Callable, *args: Any) -> Any:
+        future = asyncio.get_running_loop().run_in_executor(self._executor, partial(func, *args))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if not future.done():
+                self._retired.add(handle)
+                future.add_done_callback(lambda _: handle.close())
+            raise
+
+    @asynccontextmanager
+    async def _checkout(self) -> AsyncIterator[ArchiveHandle]:
+        async with self._semaphore:
+            if self._closed:
+                raise ValueError('Archive is closed')
+            if self._idle:
+                handle = self._idle.pop()
+            else:
+                handle = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, partial(open_archive, self.path, **self._open_kwargs))
+                if handle is None:
+                    raise ValueError('{} is no longer a recognised archive'.format(self.path))
+            try:
+                yield handle
+            finally:
+                if handle in self._retired:
+                    self._retired.discard(handle)
+                elif self._closed:
+                    handle.close()
+                else:
+                    self._idle.append(handle)
+
+    async def _run(self, func: Callable, *args: Any) -> Any:
+        async with self._checkout() as handle:
+            # wrapper is built on first use, which can read the archive
+            return await self._call(handle, lambda: func(handle.wrapper, *args))
+
+    async def list(self) -> List[str]:
+        return await self._run(methodcaller('list'))
+
+    async def read(self, name: str) -> bytes:
+        return await self._run(_read_member, name)
+
+    async def iter_chunks(self, name: str, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """
+        Yield a member's data chunk_size bytes at a time. The member holds
+        one of the archive's handles until iteration finishes or the
+        iterator is closed.
+        """
+        async with self._checkout() as handle:
+            item = await self._call(handle, lambda: handle.wrapper.open_by_name(name))
+            stream = item.get(name) if item else None
+            if stream is None:
+                raise KeyError('No file named {}'.format(name))
+            try:
+                while chunk := await self._call(handle, stream.read, chunk_size):
+                    yield chunk
+            finally:
+                # A retired handle may still be reading from the stream
+                if handle not in self._retired:
+                    stream.close()
+
+    async def extract_to(self, path: Union[str, Path]) -> None:
+        await self._run(methodcaller('extract_to', Path(path)))
+
+    async def close(self) -> None:
+        """
+        Close idle handles now. Handles still in use are closed as their
+        calls finish.
+        """
+        self._closed = True
+        idle, self._idle = self._idle, []
+        for handle in idle:
+            await asyncio.get_running_loop().run_in_executor(self._executor, handle.close)
+
+    async def __aenter__(self) -> 'AsyncArchive':
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.close()
@@ -0,0 +1,195 @@
+import os
+import glob
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Iterable, Iterator, NamedTuple, Optional
+
+from archive.open_archive import open_archive
+from archive.index_cache import IndexCache
+from archive.nested import list_nested, extract_nested
+from archive.hashing import DEFAULT_ALGORITHMS, hash_members
+from archive.incremental import extract_incremental
+
+ACTIONS = ('detect', 'list', 'extract', 'hash')
+
+
+class BatchResult(NamedTuple):
+    path: str
+    ok: bool
+    value: Any = None
+    error: Optional[str] = None
+
+
+def expand_paths(patterns: Iterable[str]) -> Iterator[str]:
+    """
+    Lazily expand each pattern: directories are walked recursively, glob
+    patterns are matched (** included) and anything else is passed through.
+    """
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for dirpath, _, files in os.walk(pattern):
+                for file in sorted(files):
+                    yield os.path.join(dirpath, file)
+        elif any(char in pattern for char in '*?['):
+            for path in glob.iglob(pattern, recursive=True):
+                if os.path.isfile(path):
+                    yield path
+        else:
+            yield pattern
+
+
+def process_path(path: str, action: str, target: Optional[str] = None,
+                 index_cache: Optional[str] = None, nested: bool = False,
+                 algorithms: Iterable[str] = DEFAULT_ALGORITHMS,
+                 incremental: bool = False) -> BatchResult:
+    """
+    Run one action on one archive. Errors are returned rather than raised,
+    so a bad archive never stops the rest of a batch. index_cache is the
+    path of an IndexCache database to list through. With nested set, list
+    and extract descend into archives inside the archive. hash returns a
+    manifest of each member's digests under algorithms. With incremental
+    set, extract skips files already on disk and unchanged.
+    """
+    cache = None
+    try:
+        if nested and action == 'list':
+            return BatchResult(path, True, list_nested(path))
+        if nested and action == 'extract':
+            extract_nested(path, target or '.')
+            return BatchResult(path, True, target)
+        cache = IndexCache(index_cache) if index_cache else None
+        if action == 'hash':
+            return BatchResult(path, True, hash_members(path, algorithms, index_cache=cache))
+        handle = open_archive(Path(path), index_cache=cache)
+        if handle is None:
+            return BatchResult(path, False, error='Not a recognised archive')
+        with handle:
+            wrapper = handle.wrapper
+            if action == 'detect':
+                value: Any = type(handle.archive_obj).__name__
+            elif action == 'list':
+                value = wrapper.list()
+            elif action == 'extract' and incremental:
+                written, skipped = extract_incremental(wrapper, target or '.')
+                value = {'target': target, 'written': len(written), 'skipped': len(skipped)}
+            elif action == 'extract':
+                wrapper.extract_to(Path(target or '.'))
+                value = target
+            else:
+                raise ValueError('Unknown action {}'.format(action))
+    except Exception as exc:
+        return BatchResult(path, False, error='{}: {}'.format(type(exc).__name__, exc))
+    finally:
+        if cache is not None:
+            cache.close()
+    return BatchResult(path, True, value)
+
+
+def archive_target(target: str, path: str) -> str:
+    """
+    The directory within target that a batch extracts path into, named
+    after the archive's path relative to the working directory, or its
+    absolute path for archives outside it. Archives therefore never write
+    over each other, even when they hold files of the same name.
+    """
+    absolute = Path(path).resolve()
+    try:
+        relative = absolute.relative_to(Path.cwd())
+    except ValueError:
+        relative = absolute.relative_to(absolute.anchor)
+    return str(Path(target, relative))
+
+
+def _path_args(path: str, args: tuple) -> tuple:
+    action, target = args[:2]
+    if action == 'extract':
+        return (action, archive_target(target or '.', path)) + args[2:]
+    return args
+
+
+def _crashed(path: str) -> BatchResult:
+    return BatchResult(path, False, error='BrokenProcessPool: the worker process died')
+
+
+def _isolate(paths: list[str], args: tuple) -> Iterator[BatchResult]:
+    """
+    Rerun the archives that were in flight when a worker died, one at a
+    time in a single worker, to find the one that killed it. Tasks finish
+    in order, so the first to fail with BrokenProcessPool is the culprit.
+    It is reported as failed and the rest go on in a fresh worker.
+    """
+    while paths:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            futures = [executor.submit(process_path, path, *_path_args(path, args))
+                       for path in paths]
+            remaining: list[str] = []
+            for number, future in enumerate(futures):
+                try:
+                    yield future.result()
+                except BrokenProcessPool:
+                    yield _crashed(paths[number])
+                    remaining = paths[number + 1:]
+                    break
+                except Exception as exc:
+                    yield BatchResult(paths[number], False,
+                                      error='{}: {}'.format(type(exc).__name__, exc))
+        paths = remaining
+
+
+def process_paths(paths: Iterable[str], action: str, target: Optional[str] = None,
+                  workers: Optional[int] = None, max_pending: Optional[int] = None,
+                  index_cache: Optional[str] = None,
+                  nested: bool = False,
+                  algorithms: Iterable[str] = DEFAULT_ALGORITHMS,
+                  incremental: bool = False) -> Iterator[BatchResult]:
+    """
+    Run action over paths in a process pool, yielding results as archives
+    finish. At most max_pending archives are queued at once, so paths can
+    be a lazy iterator over any number of files. extract gives each archive
+    its own directory in target, as laid out by archive_target().
+
+    A worker that dies, say from a crash in a native decoder or the OOM
+    killer, takes the pool down with every archive in flight. Those are
+    rerun one at a time to single out the one responsible, which is
+    reported as failed, and the batch carries on in a new pool.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 4
+    args = (action, target, index_cache, nested, tuple(algorithms), incremental)
+    paths = iter(paths)
+    pending: dict[Future, str] = {}
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        while True:
+            suspects: list[str] = []
+            for path in paths:
+                try:
+                    future = executor.submit(process_path, path, *_path_args(path, args))
+                except BrokenProcessPool:
+                    suspects.append(path)
+                    break
+                pending[future] = path
+                if len(pending) >= max_pending:
+                    break
+            if not pending and not suspects:
+                return
+            if pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = pending.pop(future)
+                    try:
+                        yield future.result()
+                    except BrokenProcessPool:
+                        suspects.append(path)
+                    except Exception as exc:
+                        yield BatchResult(path, False,
+                                          error='{}: {}'.format(type(exc).__name__, exc))
+            if suspects:
+                suspects.extend(pending.values())
+                pending.clear()
+                executor.shutdown(wait=True)
+                yield from _isolate(suspects, args)
+                executor = ProcessPoolExecutor(max_workers=workers)
+    finally:
+        executor.shutdown(wait=True)
@@ -0,0 +1,181 @@
+import os
+import stat
+import time
+import tarfile
+import zipfile
+import tempfile
+from pathlib import Path
+from collections import deque
+from contextlib import ExitStack
+from functools import partial
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import IO, Callable, Optional, Union
+
+import pyzstd
+
+from archive.members import MemberInfo, UNKNOWN
+from archive.open_archive import open_archive
+from archive.wrappers import ZIP_UNIX, copy_stream
+
+TAR_MODES = {'tar': 'w', 'tar.gz': 'w:gz', 'tar.bz2': 'w:bz2', 'tar.xz': 'w:xz'}
+FORMATS = tuple(TAR_MODES) + ('tar.zst', 'zip')
+ZSTD_LEVEL = 3
+# Members of unknown size are spooled to learn it, spilling to disk past this.
+# Zip members up to this size are also held in memory while they wait to be
+# deflated, larger ones on disk.
+SPOOL_SIZE = 16 * 1024 * 1024
+# Zip members read ahead of the one being deflated
+ZIP_QUEUE_DEPTH = 4
+# The earliest time a zip header can hold
+ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+
+def format_from_path(path: Union[str, Path]) -> str:
+    name = Path(path).name.lower()
+    for dst_format in sorted(FORMATS, key=len, reverse=True):
+        if name.endswith('.{}'.format(dst_format)):
+            return dst_format
+    raise ValueError('Cannot tell the output format of {}'.format(path))
+
+
+def _sized(stream: IO[bytes], size: int, stack: ExitStack) -> tuple[IO[bytes], int]:
+    if size != UNKNOWN:
+        return stream, size
+    spool = stack.enter_context(tempfile.SpooledTemporaryFile(SPOOL_SIZE))
+    size = copy_stream(stream, spool)  # type: ignore
+    spool.seek(0)
+    return spool, size  # type: ignore
+
+
+def _open_tar(dst: Path, dst_format: str, level: Optional[int], workers: int,
+              stack: ExitStack) -> tarfile.TarFile:
+    if dst_format == 'tar.zst':
+        option = {pyzstd.CParameter.compressionLevel: ZSTD_LEVEL if level is None else level,
+                  pyzstd.CParameter.nbWorkers: workers}
+        zst = stack.enter_context(pyzstd.ZstdFile(dst, 'w', level_or_option=option))
+        return stack.enter_context(tarfile.open(fileobj=zst, mode='w'))  # type: ignore
+    mode = TAR_MODES[dst_format]
+    if level is None or dst_format == 'tar':
+        return stack.enter_context(tarfile.open(dst, mode))
+    if dst_format == 'tar.xz':
+        return stack.enter_context(tarfile.open(dst, mode, preset=level))
+    return stack.enter_context(tarfile.open(dst, mode, compresslevel=level))
+
+
+def _mode(info: MemberInfo) -> int:
+    if info.mode != UNKNOWN:
+        return info.mode
+    return 0o755 if info.is_dir else 0o644
+
+
+def _add_to_tar(archive_obj: tarfile.TarFile, info: MemberInfo, stream: Optional[IO[bytes]]) -> None:
+    tarinfo = tarfile.TarInfo(info.name.rstrip('/') if info.is_dir else info.name)
+    if info.mtime != UNKNOWN:
+        tarinfo.mtime = int(info.mtime)
+    tarinfo.mode = _mode(info)
+    if info.is_dir:
+        tarinfo.type = tarfile.DIRTYPE
+        archive_obj.addfile(tarinfo)
+        return
+    with ExitStack() as stack:
+        stream, tarinfo.size = _sized(stream, info.size, stack)  # type: ignore
+        archive_obj.addfile(tarinfo, stream)
+
+
+def _zip_info(info: MemberInfo) -> zipfile.ZipInfo:
+    date_time = time.localtime(info.mtime)[:6] if info.mtime != UNKNOWN else ZIP_EPOCH
+    zinfo = zipfile.ZipInfo(info.name, max(date_time, ZIP_EPOCH))
+    zinfo.create_system = ZIP_UNIX
+    if info.is_dir:
+        zinfo.external_attr = (stat.S_IFDIR | _mode(info)) << 16 | 0x10
+    else:
+        zinfo.external_attr = (stat.S_IFREG | _mode(info)) << 16
+        zinfo.compress_type = zipfile.ZIP_DEFLATED
+    return zinfo
+
+
+def _read_for_zip(archive_obj: zipfile.ZipFile, info: MemberInfo, stream: Optional[IO[bytes]],
+                  level: Optional[int], spool_dir: str) -> Callable[[], None]:
+    """
+    Read the member on the calling thread and return the call that deflates
+    it into archive_obj, so the next member can be read meanwhile. Up to
+    SPOOL_SIZE bytes are kept in memory and written with writestr. Anything
+    bigger is spooled to a file in spool_dir, given the member's mode and
+    mtime, and added with write.
+    """
+    zinfo = _zip_info(info)
+    if info.is_dir:
+        return partial(archive_obj.writestr, zinfo, b'')
+    data = stream.read(SPOOL_SIZE + 1)  # type: ignore
+    if len(data) <= SPOOL_SIZE:
+        return partial(archive_obj.writestr, zinfo, data, compresslevel=level)
+    descriptor, spool = tempfile.mkstemp(dir=spool_dir)
+    with open(descriptor, 'wb') as fileobj:
+        fileobj.write(data)
+        del data
+        copy_stream(stream, fileobj)  # type: ignore
+    os.chmod(spool, _mode(info))
+    mtime = time.mktime(zinfo.date_time + (0, 0, -1))
+    os.utime(spool, (mtime, mtime))
+
+    def write() -> None:
+        try:
+            archive_obj.write(spool, info.name, zipfile.ZIP_DEFLATED, level)
+        finally:
+            os.unlink(spool)
+
+    return write
+
+
+def convert(src: Union[str, Path], dst: Union[str, Path], dst_format: Optional[str] = None,
+            level: Optional[int] = None, workers: Optional[int] = None) -> int:
+    """
+    Repack src as dst in one of FORMATS, taken from dst's name unless given,
+    and return the number of members written. Members are streamed from the
+    source wrapper straight into the writer, so nothing is extracted to disk
+    except members bigger than SPOOL_SIZE, for zip, or whose size the source
+    doesn't record. Names, directories, modification times and permission
+    bits are kept, with 0o644 for files and 0o755 for directories where the source records no
+    mode, as lha and archives made on Windows don't. Owners are not
+    carried over. Members with no data of their own, such as tar links and
+    device files, are skipped.
+
+    tar.zst is compressed on workers threads by zstd itself. zip members
+    are deflated on a writer thread, in order, while the calling thread
+    reads up to ZIP_QUEUE_DEPTH members ahead. zipfile holds its lock for
+    the whole of a writestr, so members can't be deflated side by side,
+    but zlib releases the GIL, so deflating overlaps with decompressing
+    the source. The tar formats compress on the calling thread. level is
+    the codec's own compression level, left to its default when None.
+    """
+    dst = Path(dst)
+    dst_format = dst_format or format_from_path(dst)
+    if dst_format not in FORMATS:
+        raise ValueError('Unsupported output format {}'.format(dst_format))
+    workers = workers or os.cpu_count() or 1
+    handle = open_archive(Path(src))
+    if handle is None:
+        raise ValueError('Not a recognised archive: {}'.format(src))
+    count = 0
+    with handle, ExitStack() as stack:
+        if dst_format == 'zip':
+            zip_obj = stack.enter_context(zipfile.ZipFile(dst, 'w', zipfile.ZIP_DEFLATED))
+            spool_dir = stack.enter_context(tempfile.TemporaryDirectory())
+            writer = stack.enter_context(ThreadPoolExecutor(1))
+            pending: deque[Future] = deque()
+        else:
+            tar_obj = _open_tar(dst, dst_format, level, workers, stack)
+        for info, stream in handle.wrapper.iter_members():
+            if stream is None and not info.is_dir:
+                continue
+            if dst_format == 'zip':
+                pending.append(writer.submit(_read_for_zip(zip_obj, info, stream, level, spool_dir)))
+                while len(pending) > ZIP_QUEUE_DEPTH:
+                    pending.popleft().result()
+            else:
+                _add_to_tar(tar_obj, info, stream)
+            count += 1
+        if dst_format == 'zip':
+            while pending:
+                pending.popleft().result()
+    return count
@@ -0,0 +1,138 @@
+import os
+import zlib
+import queue
+import hashlib
+import zipfile
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import IO, Any, Iterable, Optional, Union
+
+import py7zr
+import rarfile
+
+from archive.open_archive import open_archive
+from archive.index_cache import IndexCache
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# Chunks read ahead of the hashing thread, per member
+QUEUE_DEPTH = 4
+DEFAULT_ALGORITHMS = ('sha256',)
+ALGORITHMS = ('sha256', 'blake2b', 'crc32') + (('xxh64',) if xxhash is not None else ())
+
+Manifest = dict[str, dict[str, str]]
+
+
+class Crc32:
+    """
+    zlib.crc32 behind the same update()/hexdigest() interface as hashlib.
+    """
+
+    def __init__(self) -> None:
+        self.value = 0
+
+    def update(self, data: bytes) -> None:
+        self.value = zlib.crc32(data, self.value)
+
+    def hexdigest(self) -> str:
+        return '{:08x}'.format(self.value)
+
+
+def new_hasher(algorithm: str) -> Any:
+    if algorithm not in ALGORITHMS:
+        raise ValueError('Unsupported hash algorithm {}'.format(algorithm))
+    if algorithm == 'crc32':
+        return Crc32()
+    if algorithm == 'xxh64':
+        return xxhash.xxh64()
+    return hashlib.new(algorithm)
+
+
+def hash_stream(stream: IO[bytes], algorithms: Iterable[str] = DEFAULT_ALGORITHMS,
+                chunk_size: int = HASH_CHUNK_SIZE) -> dict[str, str]:
+    hashers = {algorithm: new_hasher(algorithm) for algorithm in algorithms}
+    while chunk := stream.read(chunk_size):
+        for hasher in hashers.values():
+            hasher.update(chunk)
+    return {algorithm: hasher.hexdigest() for algorithm, hasher in hashers.items()}
+
+
+def _hash_queue(chunks: queue.Queue, algorithms: tuple[str, ...]) -> dict[str, str]:
+    hashers = {algorithm: new_hasher(algorithm) for algorithm in algorithms}
+    while (chunk := chunks.get()) is not None:
+        for hasher in hashers.values():
+            hasher.update(chunk)
+    return {algorithm: hasher.hexdigest() for algorithm, hasher in hashers.items()}
+
+
+def stored_crc_values(archive_obj: Any) -> Optional[dict[str, Optional[int]]]:
+    """
+    The CRC32 zip, rar and 7z record for each file, None where one is
+    missing, as with rar5's optional checksums. None for other formats.
+    """
+    if isinstance(archive_obj, zipfile.ZipFile):
+        return {info.filename: info.CRC for info in archive_obj.infolist() if not info.is_dir()}
+    if isinstance(archive_obj, rarfile.RarFile):
+        return {info.filename: info.CRC for info in archive_obj.infolist() if not info.isdir()}
+    if isinstance(archive_obj, py7zr.SevenZipFile):
+        return {member.filename: member.crc32 for member in archive_obj.files
+                if not member.is_directory}
+    return None
+
+
+def stored_crcs(archive_obj: Any) -> Optional[Manifest]:
+    """
+    A crc32 manifest from the archive's own CRCs, or None unless every file
+    has one.
+    """
+    crcs = stored_crc_values(archive_obj)
+    if crcs is None or any(crc is None for crc in crcs.values()):
+        return None
+    return {name: {'crc32': '{:08x}'.format(crc)} for name, crc in crcs.items()}  # type: ignore
+
+
+def hash_members(path: Union[str, Path], algorithms: Iterable[str] = DEFAULT_ALGORITHMS,
+                 workers: Optional[int] = None,
+                 index_cache: Optional[IndexCache] = None) -> Manifest:
+    """
+    Hash every file in the archive, returning a manifest of name to
+    {algorithm: hexdigest}. Directories and special tar members are left
+    out.
+
+    Each member is decompressed once, in archive order, and its chunks are
+    handed to a thread which updates every requested digest. hashlib and
+    zlib release the GIL on large buffers, so up to workers members are
+    hashed while the next is being decompressed. When only crc32 is asked
+    for, zip and rar answer from the CRCs stored in the archive without
+    decompressing anything, as does 7z when every file has a CRC.
+    """
+    algorithms = tuple(algorithms)
+    for algorithm in algorithms:
+        new_hasher(algorithm)
+    workers = workers or os.cpu_count() or 1
+    handle = open_archive(Path(path), index_cache=index_cache)
+    if handle is None:
+        raise ValueError('Not a recognised archive: {}'.format(path))
+    with handle:
+        if algorithms == ('crc32',) and (stored := stored_crcs(handle.archive_obj)) is not None:
+            return stored
+        futures: dict[str, Future] = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for info, stream in handle.wrapper.iter_members():
+                if stream is None:
+                    continue
+                running = [future for future in futures.values() if not future.done()]
+                if len(running) >= workers:
+                    wait(running, return_when=FIRST_COMPLETED)
+                chunks: queue.Queue = queue.Queue(QUEUE_DEPTH)
+                futures[info.name] = executor.submit(_hash_queue, chunks, algorithms)
+                try:
+                    while chunk := stream.read(HASH_CHUNK_SIZE):
+                        chunks.put(chunk)
+                finally:
+                    chunks.put(None)
+        return {name: future.result() for name, future in futures.items()}
@@ -0,0 +1,204 @@
+import os
+import json
+import gzip
+import lzma
+import zlib
+from pathlib import Path
+from typing import IO, Any, Callable, Iterable, NamedTuple, Optional, Union
+
+from archive.members import MemberInfo, UNKNOWN
+from archive.hashing import stored_crc_values
+from archive.seekindex import XzSeekIndex, gzip_trailer
+from archive.wrappers import ArchiveWrapper, copy_stream
+
+JOURNAL_NAME = '.sarc-journal'
+# Zip and FAT keep times to two seconds
+MTIME_TOLERANCE = 2.0
+PART_SUFFIX = '.sarc-part'
+# gzip's ISIZE holds the size modulo 2**32
+GZIP_ISIZE_MASK = 0xffffffff
+
+
+class SyncResult(NamedTuple):
+    written: list[str]
+    skipped: list[str]
+
+
+class Journal:
+    """
+    Files already written, one JSON line each, appended and flushed as each
+    file lands so a crashed run leaves a usable record. Each entry notes the
+    member's CRC and the size and mtime_ns of the file written. A file that
+    still matches is then trusted without reading it back. Rewritten without
+    superseded lines on close.
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+        self.entries: dict[str, dict[str, Any]] = {}
+        try:
+            with open(self.path) as fileobj:
+                for line in fileobj:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash
+                        continue
+                    self.entries[entry['name']] = entry
+        except FileNotFoundError:
+            pass
+        self._fileobj: Optional[IO[str]] = None
+
+    def vouches_for(self, name: str, stat: os.stat_result, crc: int) -> bool:
+        entry = self.entries.get(name)
+        return entry is not None and entry['crc'] == crc and \
+            entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns
+
+    def record(self, name: str, stat: os.stat_result, crc: Optional[int]) -> None:
+        entry = {'name': name, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'crc': crc}
+        self.entries[name] = entry
+        if self._fileobj is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fileobj = open(self.path, 'a')
+        self._fileobj.write(json.dumps(entry) + '\n')
+        self._fileobj.flush()
+
+    def close(self) -> None:
+        if self._fileobj is not None:
+            self._fileobj.close()
+            self._fileobj = None
+        if not self.entries:
+            return
+        part = self.path.with_name(self.path.name + PART_SUFFIX)
+        with open(part, 'w') as fileobj:
+            for entry in self.entries.values():
+                fileobj.write(json.dumps(entry) + '\n')
+        os.replace(part, self.path)
+
+
+def file_crc32(path: Path) -> int:
+    crc = 0
+    with open(path, 'rb') as fileobj:
+        while chunk := fileobj.read(1024 * 1024):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def _stored_payload(wrapper: ArchiveWrapper) -> tuple[Optional[int], Optional[int], Optional[int]]:
+    """
+    The size, CRC and size mask gzip and xz record for their payload: the
+    gzip trailer's ISIZE and CRC32, masked as ISIZE wraps, and the total
+    the xz indexes give. None for each the format doesn't store.
+    """
+    try:
+        if isinstance(wrapper.archive_obj, gzip.GzipFile):
+            with open(wrapper.path, 'rb') as fileobj:
+                crc, size = gzip_trailer(fileobj)
+            return size, crc, GZIP_ISIZE_MASK
+        if isinstance(wrapper.archive_obj, lzma.LZMAFile):
+            with open(wrapper.path, 'rb') as fileobj:
+                return XzSeekIndex.build(fileobj).size, None, None
+    except (OSError, lzma.LZMAError, IndexError):
+        # Read from a pipe, or a .lzma file without an index
+        pass
+    return None, None, None
+
+
+def _unchanged(target: Path, info: MemberInfo, crc: Optional[int], journal: Optional[Journal],
+               check_crc: bool, size_mask: Optional[int] = None) -> bool:
+    try:
+        stat = target.stat()
+    except FileNotFoundError:
+        return False
+    if not target.is_file():
+        return False
+    if info.size == UNKNOWN:
+        # Nothing stored to compare, as for bzip2, so only the journal can tell
+        return journal is not None and journal.vouches_for(info.name, stat, crc)
+    size = stat.st_size if size_mask is None else stat.st_size & size_mask
+    if size != info.size:
+        return False
+    if info.mtime != UNKNOWN and abs(stat.st_mtime - info.mtime) > MTIME_TOLERANCE:
+        return False
+    if crc is None or not check_crc:
+        return True
+    if journal is not None and journal.vouches_for(info.name, stat, crc):
+        return True
+    if file_crc32(target) != crc:
+        return False
+    if journal is not None:
+        journal.record(info.name, stat, crc)
+    return True
+
+
+def extract_incremental(wrapper: ArchiveWrapper, path: Union[str, Path], check_crc: bool = True,
+                        journal: Union[bool, str, Path] = True,
+                        include: Optional[Iterable[str]] = None,
+                        exclude: Optional[Iterable[str]] = None,
+                        predicate: Optional[Callable[[MemberInfo], bool]] = None) -> SyncResult:
+    """
+    Extract like extract_to, skipping files already on disk with the
+    member's size and mtime and, where zip, rar or 7z store one, its CRC.
+    gzip and xz payloads are checked against the size and, for gzip, the
+    CRC in the trailer. Checking a CRC means reading the file back unless
+    the journal, kept in path as JOURNAL_NAME or at the path given, vouches
+    for it. Where nothing is stored, as for bzip2, a file is skipped only
+    when the journal vouches for it.
+
+    Each file is written under a temporary name, given the member's mtime
+    and renamed into place, so an interrupted run never leaves a
+    half-written file that would pass for complete. Running again resumes
+    where it stopped. Members with no data of their own, such as tar links,
+    and names escaping path are skipped.
+    """
+    root = Path(wrapper._get_extract_path(Path(path))).resolve()
+    crcs = (stored_crc_values(wrapper.archive_obj) or {}) if check_crc else {}  # type: ignore
+    size, crc, size_mask = _stored_payload(wrapper)
+    if crc is not None and check_crc:
+        crcs[wrapper._name()] = crc
+    journal_obj = None
+    if journal:
+        journal_obj = Journal(Path(path, JOURNAL_NAME) if journal is True else journal)  # type: ignore
+    names = wrapper.select(include, exclude, predicate)
+    selected = set(wrapper.list() if names is None else names)
+    written: list[str] = []
+    skipped: list[str] = []
+    changed = []
+    try:
+        for info in wrapper.members:
+            if info.name not in selected:
+                continue
+            target = Path(root, info.name).resolve()
+            if not target.is_relative_to(root):
+                continue
+            if info.is_dir:
+                target.mkdir(parents=True, exist_ok=True)
+            elif _unchanged(target, info if size is None else info._replace(size=size),
+                            crcs.get(info.name), journal_obj, check_crc, size_mask):
+                skipped.append(info.name)
+            else:
+                changed.append(info.name)
+        for name, stream in wrapper.iter_by_names(changed):
+            if stream is None:
+                continue
+            info = wrapper.members.get(name)
+            target = Path(root, name).resolve()
+            target.parent.mkdir(parents=True, exist_ok=True)
+            part = target.with_name(target.name + PART_SUFFIX)
+            try:
+                with open(part, 'wb') as target_file:
+                    copy_stream(stream, target_file)
+                if info is not None and info.mtime != UNKNOWN:
+                    os.utime(part, (info.mtime, info.mtime))
+                os.replace(part, target)
+            finally:
+                stream.close()
+                if part.exists():
+                    part.unlink()
+            if journal_obj is not None:
+                journal_obj.record(name, target.stat(), crcs.get(name))
+            written.append(name)
+    finally:
+        if journal_obj is not None:
+            journal_obj.close()
+    return SyncResult(written, skipped)
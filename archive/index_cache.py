@@ -0,0 +1,82 @@
+import os
+import json
+import zlib
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from archive.members import MemberTable
+
+FINGERPRINT_SAMPLE = 64 * 1024
+# Bump when the stored layout changes; older rows are then ignored
+CACHE_VERSION = 3
+
+
+def fingerprint(path: Union[str, Path]) -> str:
+    """
+    Hash of the file's identity (device, inode and mtime_ns), its size and
+    its first and last FINGERPRINT_SAMPLE bytes. Any write moves mtime_ns
+    on, so an edit anywhere in the file changes the key, at the cost of a
+    copied or restored file being scanned again. Only a write that lands
+    within the filesystem's timestamp resolution of the previous one and
+    keeps the size and both ends goes unnoticed.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as fileobj:
+        stat = os.fstat(fileobj.fileno())
+        for value in (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size):
+            digest.update(value.to_bytes(16, 'little'))
+        size = stat.st_size
+        digest.update(fileobj.read(FINGERPRINT_SAMPLE))
+        if size > FINGERPRINT_SAMPLE:
+            fileobj.seek(max(size - FINGERPRINT_SAMPLE, FINGERPRINT_SAMPLE))
+            digest.update(fileobj.read(FINGERPRINT_SAMPLE))
+    return digest.hexdigest()
+
+
+class IndexCache:
+    """
+    Member tables kept in a SQLite database keyed by archive fingerprint,
+    so an unchanged archive is listed without scanning it again. Wrappers
+    can store extra format-specific data beside the table, such as tar's
+    member headers. Safe to share between threads, and between processes
+    through SQLite's own locking.
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS archives '
+                '(fingerprint TEXT PRIMARY KEY, version INTEGER, data BLOB)')
+
+    def get(self, key: str) -> Optional[tuple[MemberTable, Any]]:
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT data FROM archives WHERE fingerprint = ? AND version = ?',
+                (key, CACHE_VERSION)).fetchone()
+        if row is None:
+            return None
+        value = json.loads(zlib.decompress(row[0]))
+        return MemberTable.from_dict(value['members']), value['extra']
+
+    def put(self, key: str, members: MemberTable, extra: Any = None) -> None:
+        data = zlib.compress(json.dumps({'members': members.to_dict(), 'extra': extra}).encode())
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO archives (fingerprint, version, data) VALUES (?, ?, ?)',
+                (key, CACHE_VERSION, data))
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def __enter__(self) -> 'IndexCache':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
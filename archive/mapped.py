@@ -0,0 +1,171 @@
+import io
+import mmap
+import pathlib
+import zipfile
+from typing import Any, IO, Optional, Union
+
+ZIP_LOCAL_HEADER_SIZE = 30
+ZIP_LOCAL_HEADER_MAGIC = b'PK\x03\x04'
+
+
+class MappedFile(io.BufferedIOBase):
+    """
+    A read-only file object over an mmap of the whole file. read() returns
+    a copy of a slice of the mapping and readinto() copies from the mapping
+    into the caller's buffer, so pages are faulted in by the kernel rather
+    than read with system calls. The data is still copied once per read;
+    view() gives a slice of the mapping itself.
+    """
+
+    def __init__(self, path: Union[str, pathlib.Path]) -> None:
+        super().__init__()
+        self.name = str(path)
+        with open(path, 'rb') as fileobj:
+            self._map = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+        self._size = len(self._map)
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def peek(self, size: int = 0) -> bytes:
+        return self._map[self._pos:self._pos + max(size, 1)]
+
+    def read(self, size: Any = -1) -> bytes:
+        if size is None or size < 0:
+            end = self._size
+        else:
+            end = min(self._pos + size, self._size)
+        data = self._map[self._pos:end]
+        self._pos = max(self._pos, end)
+        return data
+
+    read1 = read
+
+    def readinto(self, buffer: Any) -> int:
+        with memoryview(buffer) as target, memoryview(self._map) as source:
+            count = max(min(len(target), self._size - self._pos), 0)
+            target[:count] = source[self._pos:self._pos + count]
+        self._pos += count
+        return count
+
+    readinto1 = readinto
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        if offset < 0:
+            raise ValueError('negative seek position {}'.format(offset))
+        self._pos = offset
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def view(self, start: int, end: int) -> memoryview:
+        return memoryview(self._map)[start:end]
+
+    def close(self) -> None:
+        if not self.closed:
+            try:
+                self._map.close()
+            except BufferError:
+                # A member view is still in use; the mapping goes when it does
+                pass
+        super().close()
+
+
+class MemoryReader(io.BufferedIOBase):
+    """
+    A read-only file object over a memoryview. read_view() hands out slices
+    of the view itself, so data can go from the page cache to a write()
+    without being copied. read() returns bytes, a copy, as file objects
+    must.
+    """
+
+    def __init__(self, view: memoryview, name: str = '') -> None:
+        super().__init__()
+        self.name = name
+        self._view: Optional[memoryview] = view
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read_view(self, size: Any = -1) -> memoryview:
+        if self._view is None:
+            raise ValueError('I/O operation on closed file.')
+        end = len(self._view) if size is None or size < 0 else min(self._pos + size, len(self._view))
+        view = self._view[self._pos:end]
+        self._pos = max(self._pos, end)
+        return view
+
+    def read(self, size: Any = -1) -> bytes:
+        return bytes(self.read_view(size))
+
+    read1 = read
+
+    def readinto(self, buffer: Any) -> int:
+        with memoryview(buffer) as target, self.read_view(target.nbytes) as source:
+            count = len(source)
+            target.cast('B')[:count] = source
+        return count
+
+    readinto1 = readinto
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view or b'')
+        if offset < 0:
+            raise ValueError('negative seek position {}'.format(offset))
+        self._pos = offset
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self) -> None:
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        super().close()
+
+
+def open_stored_member(archive_obj: zipfile.ZipFile, info: zipfile.ZipInfo) -> Optional[MemoryReader]:
+    """
+    A MemoryReader straight over the data of a stored, unencrypted member
+    of a zip read from a MappedFile, or None for any other member. Nothing
+    is decompressed or copied, so the CRC isn't checked either.
+    """
+    fileobj = archive_obj.fp
+    if not isinstance(fileobj, MappedFile) or info.compress_type != zipfile.ZIP_STORED or \
+            info.flag_bits & 0x1:
+        return None
+    start = info.header_offset
+    with fileobj.view(start, start + ZIP_LOCAL_HEADER_SIZE) as header:
+        if len(header) < ZIP_LOCAL_HEADER_SIZE or header[:4] != ZIP_LOCAL_HEADER_MAGIC:
+            raise zipfile.BadZipFile('Bad magic number for file header')
+        extra = int.from_bytes(header[26:28], 'little') + int.from_bytes(header[28:30], 'little')
+    start += ZIP_LOCAL_HEADER_SIZE + extra
+    return MemoryReader(fileobj.view(start, start + info.file_size), info.filename)
+
+
+def open_mapped(path: Union[str, pathlib.Path]) -> IO[bytes]:
+    """
+    Map path if possible. Empty files can't be mapped, so those (and
+    anything else mmap refuses) get a plain buffered file instead.
+    """
+    try:
+        return MappedFile(path)
+    except (ValueError, OSError):
+        return open(path, 'rb')
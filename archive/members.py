@@ -0,0 +1,127 @@
+from array import array
+from fnmatch import fnmatchcase
+from typing import Any, Callable, Iterable, Iterator, NamedTuple, Optional
+
+UNKNOWN = -1
+
+
+class MemberInfo(NamedTuple):
+    name: str
+    size: int
+    compressed_size: int
+    is_dir: bool
+    offset: int
+    mtime: float = UNKNOWN
+    mode: int = UNKNOWN
+
+
+class MemberTable:
+    """
+    Member metadata kept in parallel arrays rather than one object per
+    member, with a name to row dict for O(1) lookups. Names follow the
+    wrappers' list() convention of a trailing '/' on directories. Sizes and
+    offsets the format doesn't record are UNKNOWN. Offsets are where the
+    format locates the member in the archive: the data for tar, rar and lha,
+    the local header for zip. mtime is in seconds since the epoch. mode is
+    the permission bits, UNKNOWN where the archive was made on a system
+    without them.
+    """
+
+    __slots__ = ('names', 'sizes', 'compressed_sizes', 'is_dir', 'offsets', 'mtimes', 'modes',
+                 'index')
+
+    def __init__(self) -> None:
+        self.names: list[str] = []
+        self.sizes = array('q')
+        self.compressed_sizes = array('q')
+        self.is_dir = bytearray()
+        self.offsets = array('q')
+        self.mtimes = array('d')
+        self.modes = array('q')
+        self.index: dict[str, int] = {}
+
+    def append(self, name: str, size: Optional[int] = None,
+               compressed_size: Optional[int] = None, is_dir: bool = False,
+               offset: Optional[int] = None, mtime: Optional[float] = None,
+               mode: Optional[int] = None) -> None:
+        self.index[name] = len(self.names)
+        self.names.append(name)
+        self.sizes.append(UNKNOWN if size is None else size)
+        self.compressed_sizes.append(UNKNOWN if compressed_size is None else compressed_size)
+        self.is_dir.append(is_dir)
+        self.offsets.append(UNKNOWN if offset is None else offset)
+        self.mtimes.append(UNKNOWN if mtime is None else mtime)
+        self.modes.append(UNKNOWN if mode is None else mode)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.index
+
+    def __iter__(self) -> Iterator[MemberInfo]:
+        for row in range(len(self.names)):
+            yield self.row(row)
+
+    def row(self, row: int) -> MemberInfo:
+        return MemberInfo(self.names[row], self.sizes[row], self.compressed_sizes[row],
+                          bool(self.is_dir[row]), self.offsets[row], self.mtimes[row],
+                          self.modes[row])
+
+    def get(self, name: str) -> Optional[MemberInfo]:
+        row = self.index.get(name)
+        if row is None:
+            return None
+        return self.row(row)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {'names': self.names, 'sizes': self.sizes.tolist(),
+                'compressed_sizes': self.compressed_sizes.tolist(),
+                'is_dir': list(self.is_dir), 'offsets': self.offsets.tolist(),
+                'mtimes': self.mtimes.tolist(), 'modes': self.modes.tolist()}
+
+    @classmethod
+    def from_dict(cls, value: dict[str, Any]) -> 'MemberTable':
+        members = cls()
+        members.names = value['names']
+        members.sizes = array('q', value['sizes'])
+        members.compressed_sizes = array('q', value['compressed_sizes'])
+        members.is_dir = bytearray(value['is_dir'])
+        members.offsets = array('q', value['offsets'])
+        members.mtimes = array('d', value['mtimes'])
+        members.modes = array('q', value['modes'])
+        members.index = {name: row for row, name in enumerate(members.names)}
+        return members
+
+
+class MemberFilter:
+    """
+    Picks members by name and metadata. A member is selected when it
+    matches an include pattern, or there are none, matches no exclude
+    pattern and passes predicate. Patterns are fnmatch-style against the
+    whole name, and '*' crosses '/', so '*.json' matches at any depth.
+    Include patterns with no wildcards are exact names, and if all of them
+    are, targets holds them so a scan can stop once each has been found.
+    """
+
+    def __init__(self, include: Optional[Iterable[str]] = None,
+                 exclude: Optional[Iterable[str]] = None,
+                 predicate: Optional[Callable[[MemberInfo], bool]] = None) -> None:
+        self.include = list(include) if include is not None else None
+        self.exclude = list(exclude) if exclude is not None else []
+        self.predicate = predicate
+        self.targets: Optional[frozenset[str]] = None
+        if self.include is not None and not any(char in pattern for pattern in self.include
+                                                for char in '*?['):
+            self.targets = frozenset(self.include)
+
+    def __call__(self, info: MemberInfo) -> bool:
+        if self.targets is not None:
+            if info.name not in self.targets:
+                return False
+        elif self.include is not None and \
+                not any(fnmatchcase(info.name, pattern) for pattern in self.include):
+            return False
+        if any(fnmatchcase(info.name, pattern) for pattern in self.exclude):
+            return False
+        return self.predicate is None or self.predicate(info)
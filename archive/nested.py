@@ -0,0 +1,128 @@
+import io
+import os
+import tempfile
+from pathlib import Path
+from typing import IO, Any, Iterator, List, Optional, Union
+
+from archive.members import MemberInfo
+from archive.open_archive import SNIFF_SIZE, PrependedReader, get_open_funcs_by_signature, \
+                                 open_archive, open_fileobj, read_header
+from archive.wrappers import ArchiveWrapper, copy_stream, wrap_archive
+
+MAX_DEPTH = 8
+# Bytes decompressed across every layer, per byte of the outer archive
+MAX_RATIO = 1000
+# Inner archives larger than this spill from memory to a temporary file
+SPOOL_SIZE = 16 * 1024 * 1024
+
+NestedMember = tuple[str, MemberInfo, Optional[IO[bytes]]]
+
+
+class NestedLimitError(Exception):
+    pass
+
+
+class _Budget:
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.used = 0
+
+    def spend(self, count: int) -> None:
+        self.used += count
+        if self.used > self.limit:
+            raise NestedLimitError('Expanded past {} bytes'.format(self.limit))
+
+
+class _CountingReader(io.RawIOBase):
+    """
+    Charges every byte read from stream to a shared budget, so a bomb is
+    stopped while it is being read rather than after.
+    """
+
+    def __init__(self, stream: IO[bytes], budget: _Budget) -> None:
+        super().__init__()
+        self._stream = stream
+        self._budget = budget
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        count = self._stream.readinto(buffer)  # type: ignore
+        self._budget.spend(count)
+        return count
+
+
+def _iter_wrapper(wrapper: ArchiveWrapper, prefix: str, depth: int, budget: _Budget,
+                  max_depth: int, spool_size: int) -> Iterator[NestedMember]:
+    for info, stream in wrapper.iter_members():
+        name = prefix + info.name
+        if stream is None:
+            yield name, info, None
+            continue
+        counted = _CountingReader(stream, budget)
+        header = read_header(counted, SNIFF_SIZE)  # type: ignore
+        if depth >= max_depth or not get_open_funcs_by_signature(header):
+            yield name, info, io.BufferedReader(PrependedReader(header, counted))  # type: ignore
+            continue
+        with tempfile.SpooledTemporaryFile(spool_size) as spool:
+            spool.write(header)
+            copy_stream(counted, spool)  # type: ignore
+            spool.seek(0)
+            archive_obj = open_fileobj(spool, Path(info.name))  # type: ignore
+            if archive_obj is None:
+                spool.seek(0)
+                yield name, info, spool  # type: ignore
+                continue
+            try:
+                inner = wrap_archive(archive_obj, Path(info.name))
+                yield from _iter_wrapper(inner, name + '/', depth + 1, budget, max_depth, spool_size)
+            finally:
+                # Not every archive type has close(), LhaFile for one
+                if hasattr(archive_obj, 'close'):
+                    archive_obj.close()
+
+
+def iter_nested(path: Union[str, Path], max_depth: int = MAX_DEPTH, max_ratio: int = MAX_RATIO,
+                spool_size: int = SPOOL_SIZE) -> Iterator[NestedMember]:
+    """
+    Walk an archive and every archive inside it, yielding (name, info,
+    stream) for the members that aren't archives themselves, directories
+    with a None stream. Names run through each layer, so a file inside
+    b.zip inside a.tar is 'b.zip/file'.
+
+    Members are recognised as archives by their header signature. An
+    inner archive is spooled into memory, or a temporary file past
+    spool_size, and walked from there. Layers deeper than max_depth are
+    yielded as plain members. NestedLimitError is raised once the bytes
+    read across all layers pass max_ratio times the size of path.
+    """
+    budget = _Budget(os.path.getsize(path) * max_ratio)
+    handle = open_archive(Path(path))
+    if handle is None:
+        raise ValueError('Not a recognised archive: {}'.format(path))
+    with handle:
+        yield from _iter_wrapper(handle.wrapper, '', 1, budget, max_depth, spool_size)
+
+
+def list_nested(path: Union[str, Path], **limits: int) -> List[str]:
+    return [name for name, _, _ in iter_nested(path, **limits)]
+
+
+def extract_nested(path: Union[str, Path], target: Union[str, Path], **limits: int) -> None:
+    """
+    Extract every layer at once. Each inner archive becomes a directory
+    named after it. Anything that would land outside target is skipped.
+    """
+    root = Path(target).resolve()
+    for name, _, stream in iter_nested(path, **limits):
+        destination = Path(root, name).resolve()
+        if not destination.is_relative_to(root):
+            continue
+        if stream is None:
+            destination.mkdir(parents=True, exist_ok=True)
+            continue
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        with open(destination, 'wb') as target_file:
+            copy_stream(stream, target_file)
@@ -1,4 +1,6 @@
 import os
+import io
+import re
 import pathlib
 import shutil
 import zipfile
@@ -6,13 +8,16 @@ import tarfile
 import gzip
 import bz2
 import lzma
-from typing import IO, Optional, Union, Callable
+from typing import IO, Any, Optional, Union, Callable
 
 import py7zr
 import rarfile
 import lhafile
 
 from custom_types.io import ArchiveIO, CompressionIO
+from archive.mapped import open_mapped
+from archive.wrappers import ArchiveWrapper, SevenZMemberReader, wrap_archive
+from archive.index_cache import IndexCache
 
 
 def open_as_zip(fileobj: IO[bytes]) -> Optional[zipfile.ZipFile]:
@@ -63,10 +68,11 @@ def open_as_tar_7z(fileobj: IO[bytes]) -> Optional[tarfile.TarFile]:
         szf = py7zr.SevenZipFile(fileobj)  # type: ignore
     except py7zr.Bad7zFile:
         return None
-    if len(szf.files) == 1:
-        if fileobjs := szf.read(targets=[szf.files[0].filename]):
-            sz_tar_fobj = tuple(fileobjs.values())[0]
-            return open_as_tar(sz_tar_fobj)
+    if len(szf.files) == 1 and szf.files[0].folder is not None:
+        # The tar is decompressed as tarfile reads it, so detection only
+        # costs the first header block rather than the whole tar
+        reader = io.BufferedReader(SevenZMemberReader(szf, szf.files[0]))
+        return open_as_tar(reader)  # type: ignore
     return None
 
 
@@ -121,6 +127,25 @@ EXTENSIONS = {
 }
 
 
+# Enough to cover the ustar magic at offset 257
+SNIFF_SIZE = 512
+
+# (offset, pattern, candidate open funcs). Compressed streams may hold a
+# tar, so the tar opener is tried before the plain decompressor.
+SIGNATURES = [
+    (0, re.compile(rb'PK\x03\x04'), [open_as_zip]),
+    (0, re.compile(rb'PK\x05\x06'), [open_as_zip]),
+    (0, re.compile(rb"7z\xbc\xaf'\x1c"), [open_as_tar_7z, open_as_7z]),
+    (0, re.compile(rb'Rar!\x1a\x07\x01\x00'), [open_as_rar]),
+    (0, re.compile(rb'Rar!\x1a\x07\x00'), [open_as_rar]),
+    (0, re.compile(rb'\x1f\x8b'), [open_as_tar, open_as_gzip]),
+    (0, re.compile(rb'BZh'), [open_as_tar, open_as_bz2]),
+    (0, re.compile(rb'\xfd7zXZ\x00'), [open_as_tar, open_as_lzma]),
+    (2, re.compile(rb'-lh[0-7d]-'), [open_as_lha]),
+    (257, re.compile(rb'ustar'), [open_as_tar]),
+]
+
+
 def get_open_func_by_ext(path: pathlib.Path) -> Optional[Callable]:
     for ext, openfunc in EXTENSIONS.items():
         if str(path).endswith(ext):
@@ -128,18 +153,174 @@ def get_open_func_by_ext(path: pathlib.Path) -> Optional[Callable]:
     return None
 
 
-def open_archive(path: pathlib.Path) -> Optional[ArchiveIO]:
+def get_open_funcs_by_signature(header: bytes) -> list[Callable]:
+    for offset, pattern, open_funcs in SIGNATURES:
+        if pattern.match(header, offset):
+            return open_funcs
+    return []
+
+
+def open_with(fileobj: IO[bytes], open_funcs: list[Callable]) -> Optional[ArchiveIO]:
+    for open_func in open_funcs:
+        fileobj.seek(0)
+        archive_obj = open_func(fileobj)
+        if archive_obj:
+            return archive_obj
+    return None
+
+
+def open_by_probing(fileobj: IO[bytes], path: pathlib.Path) -> Optional[ArchiveIO]:
     open_funcs = OPEN_FUNCS
-    with open(path, 'rb') as fileobj:
-        ext_open_func = get_open_func_by_ext(path)
-        if ext_open_func:
-            archive_obj = ext_open_func(fileobj)
-            if archive_obj:
-                return archive_obj
-            open_funcs = [func for func in OPEN_FUNCS if func
-                          is not ext_open_func]
-        for open_func in open_funcs:
-            archive_obj = open_func(fileobj)
-            if archive_obj:
-                return archive_obj
+    ext_open_func = get_open_func_by_ext(path)
+    if ext_open_func:
+        archive_obj = open_with(fileobj, [ext_open_func])
+        if archive_obj:
+            return archive_obj
+        open_funcs = [func for func in OPEN_FUNCS if func
+                      is not ext_open_func]
+    return open_with(fileobj, open_funcs)
+
+
+def open_fileobj(fileobj: IO[bytes], path: pathlib.Path) -> Optional[ArchiveIO]:
+    """
+    Sniff the header for a known signature and only try the matching
+    openers. Probing every opener is the fallback for unrecognised headers.
+    """
+    open_funcs = get_open_funcs_by_signature(fileobj.read(SNIFF_SIZE))
+    if open_funcs:
+        return open_with(fileobj, open_funcs)
+    return open_by_probing(fileobj, path)
+
+
+class PrependedReader(io.RawIOBase):
+    """
+    A forward-only stream with the bytes already read from it put back in
+    front, so a pipe can be sniffed and then handed on whole.
+    """
+
+    def __init__(self, head: bytes, fileobj: IO[bytes]) -> None:
+        super().__init__()
+        self._head = head
+        self._fileobj = fileobj
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        if self._head:
+            data, self._head = self._head[:len(buffer)], self._head[len(buffer):]
+        else:
+            data = self._fileobj.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+STREAM_DECOMPRESSORS = [
+    (b'\x1f\x8b', gzip.open),
+    (b'BZh', bz2.open),
+    (b'\xfd7zXZ\x00', lzma.open),
+]
+
+
+def read_header(fileobj: IO[bytes], size: int) -> bytes:
+    # Pipes can return short reads
+    header = b''
+    while len(header) < size and (data := fileobj.read(size - len(header))):
+        header += data
+    return header
+
+
+def _is_tar(header: bytes) -> bool:
+    return get_open_funcs_by_signature(header) == [open_as_tar]
+
+
+def open_stream(fileobj: IO[bytes]) -> Optional[ArchiveIO]:
+    """
+    Open a tar, plain or gzip, bzip2 or xz compressed, or a single
+    compressed file from a stream that can't seek, such as a pipe or
+    socket. Nothing is buffered beyond the header. The result only
+    supports a single pass with the wrapper's iter_members().
+    """
+    header = read_header(fileobj, SNIFF_SIZE)
+    stream = io.BufferedReader(PrependedReader(header, fileobj))
+    for magic, decompressor in STREAM_DECOMPRESSORS:
+        if header.startswith(magic):
+            decompressed = decompressor(stream)
+            if _is_tar(decompressed.peek(SNIFF_SIZE)):
+                return tarfile.open(fileobj=decompressed, mode='r|')
+            return decompressed
+    if _is_tar(header):
+        return tarfile.open(fileobj=stream, mode='r|')
     return None
+
+
+class ArchiveHandle:
+    """
+    An opened archive together with the file it is read from. The handle
+    owns that file, which stays open for lazily read formats until close()
+    or the end of a with block. Closing is idempotent.
+    """
+
+    def __init__(self, archive_obj: ArchiveIO, fileobj: IO[bytes], path: pathlib.Path,
+                 index_cache: Optional[IndexCache] = None) -> None:
+        self.archive_obj = archive_obj
+        self.fileobj = fileobj
+        self.path = path
+        self.index_cache = index_cache
+        self._wrapper: Optional[ArchiveWrapper] = None
+
+    @property
+    def wrapper(self) -> ArchiveWrapper:
+        if self.closed:
+            raise ValueError('I/O operation on closed archive {}'.format(self.path))
+        if self._wrapper is None:
+            self._wrapper = wrap_archive(self.archive_obj, self.path, self.index_cache)
+        return self._wrapper
+
+    @property
+    def closed(self) -> bool:
+        return self.fileobj.closed
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            if self._wrapper is not None:
+                self._wrapper.close()
+            # Not every archive type has close(), LhaFile for one
+            if hasattr(self.archive_obj, 'close'):
+                self.archive_obj.close()
+        finally:
+            self.fileobj.close()
+
+    def __enter__(self) -> 'ArchiveHandle':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        return '<{} {} {}{}>'.format(type(self).__name__, type(self.archive_obj).__name__,
+                                     self.path, ' closed' if self.closed else '')
+
+
+def open_archive(path: pathlib.Path, use_mmap: bool = False,
+                 index_cache: Optional[IndexCache] = None) -> Optional[ArchiveHandle]:
+    """
+    Open path and return a handle owning the file, or None if it isn't a
+    recognised archive. With use_mmap set, the openers read from an mmap of
+    the file rather than through buffered reads and seeks. That alone made
+    no measurable difference to listing a large zip; what it buys is that
+    stored zip members are read straight from the mapping, without a copy.
+    The handle's wrapper lists members through index_cache if one is given.
+    """
+    fileobj = open_mapped(path) if use_mmap else open(path, 'rb')
+    try:
+        archive_obj = open_fileobj(fileobj, path)
+    except BaseException:
+        fileobj.close()
+        raise
+    if archive_obj is None:
+        fileobj.close()
+        return None
+    return ArchiveHandle(archive_obj, fileobj, pathlib.Path(path), index_cache)
@@ -0,0 +1,56 @@
+import heapq
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Hashable, Iterable
+
+import zipfile
+import py7zr
+
+
+def split_by_size(sizes: dict[Hashable, int], parts: int) -> list[list[Hashable]]:
+    """
+    Greedily hand the largest remaining item to the least loaded part, so
+    each worker ends up with roughly the same number of bytes to write.
+    """
+    heap = [(0, index) for index in range(parts)]
+    groups: list[list[Hashable]] = [[] for _ in range(parts)]
+    for key, size in sorted(sizes.items(), key=lambda item: item[1], reverse=True):
+        load, index = heapq.heappop(heap)
+        groups[index].append(key)
+        heapq.heappush(heap, (load + size, index))
+    return [group for group in groups if group]
+
+
+def make_parent_dirs(path: Path, names: Iterable[str]) -> None:
+    """
+    Create parents up front so workers never race each other to make the
+    same directory. Anything resolving outside path is left to the archive
+    library's own sanitising.
+    """
+    root = Path(path).resolve()
+    for parent in set(Path(root, name).resolve().parent for name in names):
+        if parent.is_relative_to(root):
+            parent.mkdir(parents=True, exist_ok=True)
+
+
+def extract_zip_members(archive_path: Path, names: list[str], path: Path) -> None:
+    with zipfile.ZipFile(archive_path) as archive_obj:
+        for name in names:
+            archive_obj.extract(name, path)
+
+
+def extract_7z_members(archive_path: Path, names: list[str], path: Path) -> None:
+    with py7zr.SevenZipFile(archive_path) as archive_obj:
+        archive_obj.extract(path, targets=names)
+
+
+def run_parallel(extract_func: Callable, archive_path: Path, groups: list[list[str]],
+                 path: Path, workers: int) -> None:
+    """
+    Run extract_func over each group in its own process. Each worker opens
+    its own handle on archive_path. The first worker error is re-raised.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(extract_func, archive_path, group, path) for group in groups]
+        for future in futures:
+            future.result()
@@ -0,0 +1,99 @@
+import os
+import queue
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Any, Optional
+
+PIPELINE_CHUNK_SIZE = 1024 * 1024
+# Chunks read but not yet written, across every file in flight
+MAX_PENDING_CHUNKS = 32
+
+
+class PipelinedWriter:
+    """
+    Writes files on a pool of writer threads, so the thread decompressing
+    moves on to the next member while earlier ones are still reaching the
+    disk. write_stream() reads a member on the calling thread and queues
+    its chunks, and a writer thread drains them into the file. A semaphore
+    caps the chunks queued across all files at max_pending, blocking the
+    reader when writers fall behind.
+
+    With preallocate set, files of known size are given their full extent
+    up front with os.posix_fallocate where the platform and filesystem
+    allow it. The first write error is raised from close(), or from the
+    next write_stream() call.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = MAX_PENDING_CHUNKS,
+                 chunk_size: int = PIPELINE_CHUNK_SIZE, preallocate: bool = False) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='archive-writer')
+        self._budget = threading.Semaphore(max_pending)
+        self._chunk_size = chunk_size
+        self._preallocate = preallocate and hasattr(os, 'posix_fallocate')
+        self._error: Optional[BaseException] = None
+
+    def _write(self, target: Path, chunks: queue.Queue, size: Optional[int],
+               mtime: Optional[float], mode: Optional[int]) -> None:
+        try:
+            with open(target, 'wb') as target_file:
+                if self._preallocate and size:
+                    try:
+                        os.posix_fallocate(target_file.fileno(), 0, size)
+                    except OSError:
+                        # Not every filesystem supports it
+                        pass
+                while (chunk := chunks.get()) is not None:
+                    self._budget.release()
+                    if self._error is None:
+                        target_file.write(chunk)
+            if mode is not None:
+                os.chmod(target, mode)
+            if mtime is not None:
+                os.utime(target, (mtime, mtime))
+        except BaseException as exc:
+            self._error = self._error or exc
+            # Keep draining so the reader never waits on budget held here
+            while (chunk := chunks.get()) is not None:
+                self._budget.release()
+
+    def _check(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    def write_stream(self, target: Path, stream: IO[bytes], size: Optional[int] = None,
+                     mtime: Optional[float] = None, mode: Optional[int] = None) -> None:
+        """
+        Read stream to the end and queue it for writing to target, creating
+        parent directories first. The stream is not closed.
+        """
+        self._check()
+        target.parent.mkdir(parents=True, exist_ok=True)
+        chunks: queue.Queue = queue.Queue()
+        self._executor.submit(self._write, target, chunks, size, mtime, mode)
+        # A MemoryReader's views go to the writer without a copy
+        read = getattr(stream, 'read_view', stream.read)
+        try:
+            while True:
+                self._budget.acquire()
+                try:
+                    chunk = read(self._chunk_size)
+                except BaseException:
+                    self._budget.release()
+                    raise
+                if not chunk:
+                    self._budget.release()
+                    break
+                chunks.put(chunk)
+        finally:
+            chunks.put(None)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self._check()
+
+    def __enter__(self) -> 'PipelinedWriter':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
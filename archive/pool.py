@@ -0,0 +1,175 @@
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+from archive.open_archive import ArchiveHandle, open_archive
+
+PoolKey = tuple[str, int, int]
+
+
+class _Entry:
+    __slots__ = ('handle', 'lock', 'users', 'error')
+
+    def __init__(self) -> None:
+        self.handle: Optional[ArchiveHandle] = None
+        self.lock = threading.Lock()
+        self.users = 0
+        self.error: Optional[BaseException] = None
+
+
+class HandlePool:
+    """
+    Keeps up to max_open archives open between lookups, so a hot archive's
+    central directory or headers are parsed once rather than per lookup.
+    Handles are keyed by path, mtime and size, so a file changed on disk is
+    reopened rather than served stale. When every slot is taken, the least
+    recently used idle handle is closed.
+
+    checkout() gives one thread at a time a handle, since archive objects
+    share a file position. It blocks while another thread holds the same
+    archive, or while every slot is held.
+    """
+
+    def __init__(self, max_open: int = 64, use_mmap: bool = False) -> None:
+        if max_open < 1:
+            raise ValueError('max_open must be at least 1')
+        self.max_open = max_open
+        self.use_mmap = use_mmap
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[PoolKey, _Entry] = OrderedDict()
+        self._keys: dict[str, PoolKey] = {}
+        # Open handles, counting stale ones still checked out
+        self._open = 0
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _key(path: Union[str, Path]) -> PoolKey:
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+    def _evict_idle(self) -> bool:
+        for key, entry in self._entries.items():
+            if not entry.users:
+                del self._entries[key]
+                del self._keys[key[0]]
+                self._close_entry(entry)
+                return True
+        return False
+
+    def _close_entry(self, entry: _Entry) -> None:
+        self._open -= 1
+        if entry.handle is not None:
+            entry.handle.close()
+
+    def _retire(self, key: PoolKey) -> None:
+        # Drop the entry for an older version of the same file; if it is
+        # checked out it is closed when returned
+        old_key = self._keys.pop(key[0], None)
+        if old_key is not None and old_key != key:
+            entry = self._entries.pop(old_key)
+            if not entry.users:
+                self._close_entry(entry)
+
+    def _acquire(self, key: PoolKey) -> tuple[_Entry, bool]:
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise ValueError('HandlePool is closed')
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self.hits += 1
+                    entry.users += 1
+                    self._entries.move_to_end(key)
+                    return entry, False
+                self._retire(key)
+                if self._open < self.max_open or self._evict_idle():
+                    self.misses += 1
+                    entry = _Entry()
+                    entry.users = 1
+                    # Taken before anyone else can see the entry, so other
+                    # threads wait for the open to finish
+                    entry.lock.acquire()
+                    self._entries[key] = entry
+                    self._keys[key[0]] = key
+                    self._open += 1
+                    return entry, True
+                self._condition.wait()
+
+    def _release(self, key: PoolKey, entry: _Entry) -> None:
+        with self._condition:
+            entry.users -= 1
+            if self._entries.get(key) is entry and (entry.handle is None or self._closed):
+                del self._entries[key]
+                del self._keys[key[0]]
+            # Entries dropped from the pool while checked out are closed by
+            # their last user
+            if not entry.users and self._entries.get(key) is not entry:
+                self._close_entry(entry)
+            self._condition.notify_all()
+
+    @contextmanager
+    def checkout(self, path: Union[str, Path]) -> Iterator[ArchiveHandle]:
+        """
+        Lend out the open handle for path, opening it on first use. Raises
+        ValueError if path isn't a recognised archive.
+        """
+        key = self._key(path)
+        entry, held = self._acquire(key)
+        try:
+            if held:
+                try:
+                    entry.handle = open_archive(Path(path), self.use_mmap)
+                    if entry.handle is None:
+                        raise ValueError('Not a recognised archive: {}'.format(path))
+                except BaseException as exc:
+                    entry.error = exc
+                    raise
+            else:
+                entry.lock.acquire()
+                held = True
+                if entry.handle is None:
+                    raise entry.error or ValueError('Could not open {}'.format(path))
+            yield entry.handle
+        finally:
+            if held:
+                entry.lock.release()
+            self._release(key, entry)
+
+    def read(self, path: Union[str, Path], name: str) -> Optional[bytes]:
+        """
+        Read one member in full, or None if it is missing or a directory.
+        """
+        with self.checkout(path) as handle:
+            item = handle.wrapper.open_by_name(name)
+            fileobj = item.get(name) if item else None
+            if fileobj is None:
+                return None
+            with fileobj:
+                return fileobj.read()
+
+    def close(self) -> None:
+        """
+        Close every idle handle now and the rest as they are returned.
+        """
+        with self._condition:
+            self._closed = True
+            for key, entry in list(self._entries.items()):
+                if not entry.users:
+                    del self._entries[key]
+                    del self._keys[key[0]]
+                    self._close_entry(entry)
+            self._condition.notify_all()
+
+    def __enter__(self) -> 'HandlePool':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -0,0 +1,595 @@
+import os
+import io
+import bz2
+import json
+import lzma
+import zlib
+from abc import ABC, abstractmethod
+from bisect import bisect_right
+from pathlib import Path
+from typing import IO, Any, Iterable, Iterator, List, NamedTuple, Optional
+
+READ_SIZE = 64 * 1024
+SCAN_SIZE = 1024 * 1024
+DEFAULT_SPAN = 4 * 1024 * 1024
+SIDECAR_SUFFIX = '.sidx'
+
+GZIP_WBITS = 31
+GZIP_FEED_SIZE = 8 * 1024
+XZ_HEADER_SIZE = 12
+XZ_FOOTER_SIZE = 12
+BZIP2_BLOCK_MAGIC = 0x314159265359
+BZIP2_EOS_MAGIC = 0x177245385090
+
+
+class SeekPoint(NamedTuple):
+    offset: int
+    position: int
+    extra: Any = None
+
+
+def _decompress(decompressor: Any, data: bytes) -> Iterator[bytes]:
+    """
+    Feed data to a bz2 or lzma decompressor, yielding its output at most
+    READ_SIZE bytes at a time.
+    """
+    chunk = decompressor.decompress(data, READ_SIZE)
+    while True:
+        if chunk:
+            yield chunk
+        if decompressor.eof or decompressor.needs_input:
+            return
+        chunk = decompressor.decompress(b'', READ_SIZE)
+
+
+def _read_bits(fileobj: IO[bytes], start: int, count: int) -> int:
+    fileobj.seek(start // 8)
+    data = fileobj.read((start % 8 + count + 7) // 8)
+    value = int.from_bytes(data, 'big')
+    return (value >> (len(data) * 8 - start % 8 - count)) & ((1 << count) - 1)
+
+
+def _bits(fileobj: IO[bytes], start: int, end: int, tail: int = 0,
+          tail_bits: int = 0) -> Iterator[bytes]:
+    """
+    Yield bits start to end of fileobj followed by the low tail_bits of
+    tail, shifted to begin on a byte boundary and zero padded at the end.
+    """
+    fileobj.seek(start // 8)
+    skip = start % 8
+    remaining = end - start
+    carry = carry_bits = 0
+    while remaining > 0:
+        data = fileobj.read(min(READ_SIZE, (skip + remaining + 7) // 8))
+        if not data:
+            raise EOFError('Compressed file ended before the end-of-stream marker was reached')
+        value = int.from_bytes(data, 'big')
+        count = len(data) * 8 - skip
+        value &= (1 << count) - 1
+        skip = 0
+        if count > remaining:
+            value >>= count - remaining
+            count = remaining
+        remaining -= count
+        value |= carry << count
+        count += carry_bits
+        carry_bits = count % 8
+        carry = value & ((1 << carry_bits) - 1)
+        yield (value >> carry_bits).to_bytes(count // 8, 'big')
+    count = carry_bits + tail_bits
+    padding = -count % 8
+    yield (((carry << tail_bits) | tail) << padding).to_bytes((count + padding) // 8, 'big')
+
+
+class SeekIndex(ABC):
+    """
+    Points in a compressed file from which decompression can restart, so
+    reaching an offset costs at most the distance from the point before it
+    rather than the whole of the file up to it. Each point maps an offset
+    in the decompressed data to a position in the compressed file.
+    """
+
+    format = ''
+    magic = b''
+
+    def __init__(self, points: List[SeekPoint], size: int,
+                 fingerprint: Optional[List[int]] = None) -> None:
+        self.points = points
+        self.offsets = [point.offset for point in points]
+        self.size = size
+        self.fingerprint = fingerprint
+
+    @classmethod
+    @abstractmethod
+    def build(cls, fileobj: IO[bytes], span: int = DEFAULT_SPAN) -> 'SeekIndex':
+        pass
+
+    @abstractmethod
+    def chunks_from(self, fileobj: IO[bytes], number: int) -> Iterator[bytes]:
+        """
+        Yield the decompressed data from point number to the end of the file.
+        """
+
+    def find(self, offset: int) -> int:
+        """
+        Number of the last point at or before offset, or -1 if there are no
+        points at all.
+        """
+        return max(bisect_right(self.offsets, offset) - 1, 0) if self.points else -1
+
+    def savable(self) -> bool:
+        """
+        Whether a saved copy of the index would hold every point.
+        """
+        return True
+
+    def _point_to_json(self, point: SeekPoint) -> Optional[list]:
+        return [point.offset, point.position, point.extra]
+
+    @classmethod
+    def _point_from_json(cls, value: list) -> SeekPoint:
+        return SeekPoint(*value)
+
+    def to_dict(self) -> dict:
+        points = [self._point_to_json(point) for point in self.points]
+        return {'format': self.format, 'size': self.size, 'fingerprint': self.fingerprint,
+                'points': [point for point in points if point is not None]}
+
+    @classmethod
+    def from_dict(cls, value: dict) -> 'SeekIndex':
+        if cls is SeekIndex:
+            return INDEX_CLASSES[value['format']].from_dict(value)
+        points = [cls._point_from_json(point) for point in value['points']]
+        return cls(points, value['size'], value['fingerprint'])
+
+    def save(self, path: Path) -> None:
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file)
+
+    @classmethod
+    def load(cls, path: Path) -> 'SeekIndex':
+        with open(path) as file:
+            return cls.from_dict(json.load(file))
+
+
+def _gunzip(fileobj: IO[bytes], position: int,
+            decompressor: Any = None) -> Iterator[tuple[bytes, Any, Optional[int]]]:
+    """
+    Yield (chunk, decompressor, position) through the gzip members from
+    position on. A member start is yielded as (b'', None, its position).
+    Otherwise position is only given where the decompressor could carry on
+    from it: all input before it consumed and no output held back.
+    """
+    fileobj.seek(position)
+    data = tail = b''
+    while True:
+        if not data and not tail:
+            data = fileobj.read(READ_SIZE)
+            position += len(data)
+            if not data:
+                if decompressor is not None:
+                    raise EOFError('Compressed file ended before the end-of-stream marker was reached')
+                return
+        if decompressor is None:
+            # gzip allows zero padding between and after members
+            data = data.lstrip(b'\0')
+            if not data:
+                continue
+            yield b'', None, position - len(data)
+            decompressor = zlib.decompressobj(GZIP_WBITS)
+        # Input goes in small pieces, each drained before the next, so
+        # there are frequent clean points even where the data compresses well
+        if not tail:
+            tail, data = data[:GZIP_FEED_SIZE], data[GZIP_FEED_SIZE:]
+        chunk = decompressor.decompress(tail, READ_SIZE)
+        tail = decompressor.unconsumed_tail
+        if decompressor.eof:
+            data = decompressor.unused_data + data
+            yield chunk, decompressor, None
+            decompressor = None
+        else:
+            clean = not tail and len(chunk) < READ_SIZE
+            yield chunk, decompressor, position - len(data) if clean else None
+
+
+def gzip_trailer(fileobj: IO[bytes]) -> tuple[int, int]:
+    """
+    The CRC32 and ISIZE, the uncompressed size modulo 2**32, from the
+    trailer of the last gzip member.
+    """
+    fileobj.seek(-8, io.SEEK_END)
+    trailer = fileobj.read(8)
+    return int.from_bytes(trailer[:4], 'little'), int.from_bytes(trailer[4:], 'little')
+
+
+class GzipSeekIndex(SeekIndex):
+    """
+    Points at the start of every gzip member, plus zlib decompressor
+    snapshots every span bytes. zlib can't serialise its state, so the
+    snapshots only live as long as the index object. Only an index of
+    member starts alone, as for files of many small members, is saved as a
+    sidecar.
+    """
+
+    format = 'gzip'
+    magic = b'\x1f\x8b'
+
+    @classmethod
+    def build(cls, fileobj: IO[bytes], span: int = DEFAULT_SPAN) -> 'GzipSeekIndex':
+        points: List[SeekPoint] = []
+        offset = 0
+        for chunk, decompressor, position in _gunzip(fileobj, 0):
+            if decompressor is None:
+                points.append(SeekPoint(offset, position))  # type: ignore
+                continue
+            offset += len(chunk)
+            if position is not None and offset - points[-1].offset >= span:
+                points.append(SeekPoint(offset, position, decompressor.copy()))
+        return cls(points, offset)
+
+    def chunks_from(self, fileobj: IO[bytes], number: int) -> Iterator[bytes]:
+        point = self.points[number]
+        decompressor = None if point.extra is None else point.extra.copy()
+        for chunk, _, _ in _gunzip(fileobj, point.position, decompressor):
+            if chunk:
+                yield chunk
+
+    def savable(self) -> bool:
+        return all(point.extra is None for point in self.points)
+
+    def _point_to_json(self, point: SeekPoint) -> Optional[list]:
+        return None if point.extra is not None else [point.offset, point.position]
+
+
+def _varint(data: bytes, pos: int) -> tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, pos
+
+
+def _xz_blocks(fileobj: IO[bytes]) -> List[tuple[int, int, int, int]]:
+    """
+    Read (stream start, block start, padded size, uncompressed size) for
+    every block, working back from the end through each stream's footer and
+    index, so concatenated streams are covered too.
+    """
+    blocks: List[tuple[int, int, int, int]] = []
+    end = fileobj.seek(0, io.SEEK_END)
+    while end > 0:
+        fileobj.seek(end - 4)
+        if fileobj.read(4) == b'\0\0\0\0':
+            end -= 4
+            continue
+        fileobj.seek(end - XZ_FOOTER_SIZE)
+        footer = fileobj.read(XZ_FOOTER_SIZE)
+        if footer[10:] != b'YZ':
+            raise lzma.LZMAError('Invalid xz stream footer')
+        index_size = (int.from_bytes(footer[4:8], 'little') + 1) * 4
+        index_start = end - XZ_FOOTER_SIZE - index_size
+        fileobj.seek(index_start)
+        index = fileobj.read(index_size)
+        count, pos = _varint(index, 1)
+        records = []
+        for _ in range(count):
+            unpadded, pos = _varint(index, pos)
+            uncompressed, pos = _varint(index, pos)
+            records.append(((unpadded + 3) // 4 * 4, uncompressed))
+        stream_start = index_start - sum(padded for padded, _ in records) - XZ_HEADER_SIZE
+        fileobj.seek(stream_start)
+        if fileobj.read(6) != XzSeekIndex.magic:
+            raise lzma.LZMAError('Invalid xz stream header')
+        stream_blocks = []
+        block_start = stream_start + XZ_HEADER_SIZE
+        for padded, uncompressed in records:
+            stream_blocks.append((stream_start, block_start, padded, uncompressed))
+            block_start += padded
+        blocks[:0] = stream_blocks
+        end = stream_start
+    return blocks
+
+
+class XzSeekIndex(SeekIndex):
+    """
+    Points at every xz block, read from the indexes xz already keeps at the
+    end of each stream, so building costs a few reads rather than a pass
+    over the data. Files written as a single block get a single point;
+    compress with a block size (xz --block-size, or -T) to make them
+    seekable.
+    """
+
+    format = 'xz'
+    magic = b'\xfd7zXZ\x00'
+
+    @classmethod
+    def build(cls, fileobj: IO[bytes], span: int = DEFAULT_SPAN) -> 'XzSeekIndex':
+        points = []
+        offset = 0
+        for stream_start, block_start, padded, uncompressed in _xz_blocks(fileobj):
+            points.append(SeekPoint(offset, block_start, (stream_start, padded)))
+            offset += uncompressed
+        return cls(points, offset)
+
+    def chunks_from(self, fileobj: IO[bytes], number: int) -> Iterator[bytes]:
+        for point in self.points[number:]:
+            stream_start, padded = point.extra
+            fileobj.seek(stream_start)
+            # A block only decodes after its stream's header
+            decompressor = lzma.LZMADecompressor(lzma.FORMAT_XZ)
+            yield from _decompress(decompressor, fileobj.read(XZ_HEADER_SIZE))
+            fileobj.seek(point.position)
+            remaining = padded
+            while remaining:
+                data = fileobj.read(min(READ_SIZE, remaining))
+                if not data:
+                    raise EOFError('Compressed file ended before the end-of-stream marker was reached')
+                remaining -= len(data)
+                yield from _decompress(decompressor, data)
+
+    @classmethod
+    def _point_from_json(cls, value: list) -> SeekPoint:
+        return SeekPoint(value[0], value[1], tuple(value[2]))
+
+
+def _bzip2_markers(fileobj: IO[bytes]) -> Iterator[tuple[int, int]]:
+    """
+    Yield (bit position, magic) for everything that looks like a bzip2 block
+    or end of stream marker, in file order. The markers aren't byte aligned,
+    so each is searched for at all eight shifts. Block data can contain the
+    same bits by chance, so callers have to check what they find.
+    """
+    patterns = []
+    for magic in (BZIP2_BLOCK_MAGIC, BZIP2_EOS_MAGIC):
+        for shift in range(8):
+            value = (magic << (8 - shift)).to_bytes(7, 'big')
+            # Only the bytes the magic covers completely are fixed
+            first = 0 if shift == 0 else 1
+            patterns.append((magic, shift, first, value[first:6]))
+    fileobj.seek(0)
+    start = 0
+    buffer = b''
+    while data := fileobj.read(SCAN_SIZE):
+        buffer += data
+        found = []
+        for magic, shift, first, pattern in patterns:
+            pos = buffer.find(pattern)
+            while pos >= 0:
+                byte = pos - first
+                if byte >= 0 and byte + 7 <= len(buffer):
+                    value = int.from_bytes(buffer[byte:byte + 7], 'big')
+                    if (value >> (8 - shift)) & ((1 << 48) - 1) == magic:
+                        found.append(((start + byte) * 8 + shift, magic))
+                pos = buffer.find(pattern, pos + 1)
+        yield from sorted(found)
+        # Markers starting in the last six bytes are picked up next time
+        keep = min(len(buffer), 6)
+        start += len(buffer) - keep
+        buffer = buffer[len(buffer) - keep:]
+
+
+def _combine_crcs(crcs: Iterable[int]) -> int:
+    combined = 0
+    for crc in crcs:
+        combined = (((combined << 1) | (combined >> 31)) & 0xffffffff) ^ crc
+    return combined
+
+
+def _bunzip2(fileobj: IO[bytes], level: int, start: int, end: int, crc: int) -> Iterator[bytes]:
+    """
+    Decompress the blocks between bits start and end as a stream of their
+    own: a stream header in front and an end of stream marker, carrying the
+    blocks' combined crc, behind. BZ2Decompressor holds back the end of each
+    block until it sees what follows, so the marker is needed even to read
+    a single block.
+    """
+    decompressor = bz2.BZ2Decompressor()
+    yield from _decompress(decompressor, BzipSeekIndex.magic + str(level).encode())
+    for data in _bits(fileobj, start, end, (BZIP2_EOS_MAGIC << 32) | crc, 80):
+        yield from _decompress(decompressor, data)
+    if not decompressor.eof:
+        raise EOFError('Compressed file ended before the end-of-stream marker was reached')
+
+
+class BzipSeekIndex(SeekIndex):
+    """
+    Points at every bzip2 block. Blocks hold at most 900k of input, so a
+    seek never decompresses more than one block to reach its offset.
+    Building decompresses each block once to learn its size.
+    """
+
+    format = 'bz2'
+    magic = b'BZh'
+
+    @classmethod
+    def build(cls, fileobj: IO[bytes], span: int = DEFAULT_SPAN) -> 'BzipSeekIndex':
+        markers = list(_bzip2_markers(fileobj))
+        points: List[SeekPoint] = []
+        offset = 0
+        stream_start = 0
+        number = 0
+        while True:
+            fileobj.seek(stream_start)
+            header = fileobj.read(4)
+            if header[:3] != cls.magic or not header[3:].isdigit():
+                if stream_start == 0:
+                    raise OSError('Invalid data stream')
+                break
+            level = int(header[3:])
+            while number < len(markers) and markers[number][0] < (stream_start + 4) * 8:
+                number += 1
+            if number == len(markers):
+                raise EOFError('Compressed file ended before the end-of-stream marker was reached')
+            start, magic = markers[number]
+            stream_points = []
+            while magic == BZIP2_BLOCK_MAGIC:
+                crc = _read_bits(fileobj, start + 48, 32)
+                number += 1
+                while True:
+                    if number == len(markers):
+                        raise EOFError('Compressed file ended before the end-of-stream marker was reached')
+                    end, next_magic = markers[number]
+                    try:
+                        size = sum(len(chunk) for chunk in _bunzip2(fileobj, level, start, end, crc))
+                        break
+                    except (OSError, EOFError):
+                        # Not a real marker, just matching bits inside the block
+                        number += 1
+                stream_points.append([offset, start, crc])
+                offset += size
+                start, magic = end, next_magic
+            points.extend(SeekPoint(point_offset, point_start, (level, start, crc))
+                          for point_offset, point_start, crc in stream_points)
+            number += 1
+            stream_start = (start + 80 + 7) // 8
+        return cls(points, offset)
+
+    def chunks_from(self, fileobj: IO[bytes], number: int) -> Iterator[bytes]:
+        while number < len(self.points):
+            level, end, _ = self.points[number].extra
+            last = number
+            while last + 1 < len(self.points) and self.points[last + 1].extra[1] == end:
+                last += 1
+            crc = _combine_crcs(point.extra[2] for point in self.points[number:last + 1])
+            yield from _bunzip2(fileobj, level, self.points[number].position, end, crc)
+            number = last + 1
+
+    @classmethod
+    def _point_from_json(cls, value: list) -> SeekPoint:
+        return SeekPoint(value[0], value[1], tuple(value[2]))
+
+
+INDEX_CLASSES = {index_class.format: index_class
+                 for index_class in (GzipSeekIndex, XzSeekIndex, BzipSeekIndex)}
+
+
+def build_index(fileobj: IO[bytes], span: int = DEFAULT_SPAN) -> SeekIndex:
+    fileobj.seek(0)
+    header = fileobj.read(6)
+    for index_class in INDEX_CLASSES.values():
+        if header.startswith(index_class.magic):
+            return index_class.build(fileobj, span)
+    raise ValueError('Not a gzip, bzip2 or xz file')
+
+
+def sidecar_path(path: Path) -> Path:
+    return Path(str(path) + SIDECAR_SUFFIX)
+
+
+def load_index(path: Path, span: int = DEFAULT_SPAN, sidecar: bool = True) -> SeekIndex:
+    """
+    Load the index saved beside path if it still matches the file's size
+    and mtime, otherwise build it, saving it for next time if sidecar is
+    set. A gzip index holding decompressor snapshots can't be saved, so
+    for a gzip file of one large member the index only lasts as long as
+    the object returned, and each process builds its own.
+    """
+    stat = os.stat(path)
+    fingerprint = [stat.st_size, stat.st_mtime_ns]
+    if sidecar:
+        try:
+            index = SeekIndex.load(sidecar_path(path))
+            if index.fingerprint == fingerprint:
+                return index
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+    with open(path, 'rb') as fileobj:
+        index = build_index(fileobj, span)
+    index.fingerprint = fingerprint
+    if sidecar:
+        try:
+            if index.savable():
+                index.save(sidecar_path(path))
+            else:
+                # Don't leave one for an older version of the file behind
+                sidecar_path(path).unlink(missing_ok=True)
+        except OSError:
+            pass
+    return index
+
+
+class IndexedReader(io.RawIOBase):
+    """
+    Reads a compressed file through its SeekIndex. A seek reads forward
+    when no index point lies between the current position and the target,
+    and otherwise restarts from the last point before the target. The
+    reader owns fileobj and closes it.
+    """
+
+    def __init__(self, fileobj: IO[bytes], index: SeekIndex) -> None:
+        super().__init__()
+        self._fileobj = fileobj
+        self._index = index
+        self._pos = 0
+        self._chunks: Optional[Iterator[bytes]] = None
+        self._buffer = memoryview(b'')
+
+    def _restart(self) -> None:
+        target = self._pos
+        number = self._index.find(target)
+        if number < 0:
+            self._chunks = iter(())
+            return
+        self._chunks = self._index.chunks_from(self._fileobj, number)
+        self._buffer = memoryview(b'')
+        self._pos = self._index.points[number].offset
+        self._skip(target)
+
+    def _fill(self) -> bool:
+        if self._chunks is None:
+            self._restart()
+        while not self._buffer:
+            chunk = next(self._chunks, None)  # type: ignore
+            if chunk is None:
+                return False
+            self._buffer = memoryview(chunk)
+        return True
+
+    def _skip(self, offset: int) -> None:
+        while self._pos < offset and self._fill():
+            count = min(offset - self._pos, len(self._buffer))
+            self._buffer = self._buffer[count:]
+            self._pos += count
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        if not self._fill():
+            return 0
+        count = min(len(buffer), len(self._buffer))
+        buffer[:count] = self._buffer[:count]
+        self._buffer = self._buffer[count:]
+        self._pos += count
+        return count
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._index.size
+        if offset < 0:
+            raise ValueError('negative seek position {}'.format(offset))
+        number = self._index.find(offset)
+        if (self._chunks is not None and offset >= self._pos
+                and (number < 0 or self._index.points[number].offset <= self._pos)):
+            self._skip(offset)
+        else:
+            self._chunks = None
+            self._buffer = memoryview(b'')
+            self._pos = offset
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self) -> None:
+        if not self.closed:
+            self._fileobj.close()
+        super().close()
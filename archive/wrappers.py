@@ -3,30 +3,120 @@
 # from io import RawIOBase
 import os
 import io
+import stat
+import time
+from contextlib import ExitStack
 from functools import cached_property
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import IO, Union, Any
+from typing import IO, Union, Any, Callable, Iterable, Iterator, List, NamedTuple, Optional
 import tarfile
 import zipfile
+import gzip
+import bz2
+import lzma
 
 import py7zr
+import py7zr.compressor
+import py7zr.exceptions
+import py7zr.helpers
 import rarfile
 import lhafile
+import lzhlib
 
 from custom_types.io import ArchiveIO, CompressionIO
+from archive.members import MemberTable, MemberInfo, MemberFilter, UNKNOWN
+from archive.index_cache import IndexCache, fingerprint
+from archive.seekindex import DEFAULT_SPAN, SeekIndex, IndexedReader, load_index
+from archive.pipeline import PipelinedWriter
+from archive.mapped import MemoryReader, open_stored_member
+from archive.parallel import split_by_size, make_parent_dirs, run_parallel, \
+                             extract_zip_members, extract_7z_members
+
+
+COPY_CHUNK_SIZE = 64 * 1024
+# ZipInfo.create_system for archives made on unix
+ZIP_UNIX = 3
+
+
+def copy_stream(source: IO[bytes], target: IO[bytes], chunk_size: int = COPY_CHUNK_SIZE) -> int:
+    """
+    Copy source to target through a single reused buffer, so memory use is
+    bounded by chunk_size whatever the size of the data.
+    """
+    if isinstance(source, MemoryReader):
+        # Already in memory, so written straight from the mapping
+        total = 0
+        while count := len(chunk := source.read_view(chunk_size)):
+            target.write(chunk)
+            total += count
+        return total
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    total = 0
+    while count := source.readinto(buffer):  # type: ignore
+        target.write(view[:count])
+        total += count
+    return total
+
+
+def date_time_to_mtime(date_time: tuple) -> float:
+    """
+    Zip and rar record times as local-time (year, month, day, hour, minute,
+    second) tuples.
+    """
+    return time.mktime(tuple(date_time) + (0, 0, -1))
 
 
 class ArchiveWrapper(ABC):
 
+    index_cache: Optional[IndexCache] = None
+
     @abstractmethod
     def __init__(self, archive_obj: ArchiveIO, path: Path) -> None:
         pass
 
+    @cached_property
+    def members(self) -> MemberTable:
+        """
+        Built on first use and then shared by list() and every other method
+        that needs member names or metadata. With an index_cache set, an
+        archive seen before is loaded from the cache instead.
+        """
+        if self.index_cache is None:
+            return self._build_members()
+        key = fingerprint(self.path)
+        cached = self.index_cache.get(key)
+        if cached is not None:
+            members, extra = cached
+            self._load_cache_extra(extra)
+            return members
+        members = self._build_members()
+        self.index_cache.put(key, members, self._cache_extra())
+        return members
+
     @abstractmethod
-    def list(self) -> list[str]:
+    def _build_members(self) -> MemberTable:
         pass
 
+    def close(self) -> None:
+        """
+        Release anything the wrapper opened itself. The archive object is
+        left to its owner.
+        """
+
+    def _cache_extra(self) -> Any:
+        """
+        Anything JSON serialisable the wrapper wants cached with the members.
+        """
+        return None
+
+    def _load_cache_extra(self, extra: Any) -> None:
+        pass
+
+    def list(self) -> list[str]:
+        return self.members.names.copy()
+
     @abstractmethod
     def open_by_name(self, name: str) -> Union[dict[Any, Any], None]:
         pass
@@ -42,18 +132,94 @@ class ArchiveWrapper(ABC):
         root_items = set([item.split('/')[0] for item in self.list()])
         return len(root_items)
 
+    def _has_multiple_roots(self) -> bool:
+        """
+        Whether names start with more than one first path component,
+        stopping at the second one found. Names come from the member table
+        when it is built or cached, otherwise from _scan_names().
+        """
+        if 'members' in self.__dict__ or self.index_cache is not None:
+            names: Iterable[str] = self.members.names
+        else:
+            names = self._scan_names()
+        first = None
+        for name in names:
+            root = name.split('/')[0]
+            if first is None:
+                first = root
+            elif root != first:
+                return True
+        return False
+
+    def _scan_names(self) -> Iterable[str]:
+        """
+        Member names, read no further than the caller iterates where the
+        format allows it.
+        """
+        return self.members.names
+
     def _get_extract_path(self, path):
-        if self._num_root_items() < 2:
+        if not self._has_multiple_roots():
             return path
         return Path(path, self._name())
 
-    def open_all(self):
-        all_items = {}
-        for name in self.list():
+    def open_by_names(self, names: Iterable[str]) -> dict[Any, Any]:
+        items = {}
+        for name in names:
+            item = self.open_by_name(name)
+            if item:
+                items.update(item)
+        return items
+
+    def iter_by_names(self, names: Iterable[str]) -> Iterator[tuple[str, Optional[IO[bytes]]]]:
+        """
+        Yield (name, stream) for each of names that exists, with None as the
+        stream for directories. Formats that can do better than opening each
+        member in turn override this.
+        """
+        for name in names:
             item = self.open_by_name(name)
             if item:
-                all_items.update(item)
-        return all_items
+                yield name, item.get(name)
+
+    def select(self, include: Optional[Iterable[str]] = None,
+               exclude: Optional[Iterable[str]] = None,
+               predicate: Optional[Callable[[MemberInfo], bool]] = None) -> Optional[List[str]]:
+        """
+        Names of the members a MemberFilter built from the arguments lets
+        through, in archive order, or None when no filter is given.
+        """
+        if include is None and exclude is None and predicate is None:
+            return None
+        member_filter = MemberFilter(include, exclude, predicate)
+        return [info.name for info in self.members if member_filter(info)]
+
+    def open_all(self, include: Optional[Iterable[str]] = None,
+                 exclude: Optional[Iterable[str]] = None,
+                 predicate: Optional[Callable[[MemberInfo], bool]] = None) -> dict[Any, Any]:
+        names = self.select(include, exclude, predicate)
+        return self.open_by_names(self.list() if names is None else names)
+
+    def iter_members(self) -> Iterator[tuple[MemberInfo, Optional[IO[bytes]]]]:
+        """
+        Yield (info, stream) for each member in archive order, with None as
+        the stream for directories. A stream is only valid until the next
+        step, when it is closed, so only one is ever open at a time.
+        """
+        for info in self.members:
+            item = self.open_by_name(info.name)
+            stream = item.get(info.name) if item else None
+            try:
+                yield info, stream
+            finally:
+                if stream is not None:
+                    stream.close()
+
+
+# Enough of a TarInfo for extractfile() to find the member's data
+TAR_INFO_FIELDS = ('name', 'mode', 'uid', 'gid', 'size', 'mtime', 'type', 'linkname',
+                   'uname', 'gname', 'devmajor', 'devminor', 'offset', 'offset_data',
+                   'pax_headers')
 
 
 class TarArchiveWrapper(ArchiveWrapper):
@@ -61,6 +227,8 @@ class TarArchiveWrapper(ArchiveWrapper):
     def __init__(self, archive_obj: tarfile.TarFile, path: Path) -> None:
         self.archive_obj = archive_obj
         self.path = path
+        self._cached_infos: Optional[List[list]] = None
+        self._indexed_tar: Optional[tarfile.TarFile] = None
 
     def _name(self):
         name = super()._name()
@@ -68,26 +236,187 @@ class TarArchiveWrapper(ArchiveWrapper):
             return name[:-4]
         return name
     
-    def list(self) -> list[str]:
-        members = self.archive_obj.getmembers()
-        names = []
-        for member in members:
-            if member.isdir():
-                names.append('{}/'.format(member.name))
-            else:
-                names.append(member.name)
-        return names
+    def _build_members(self) -> MemberTable:
+        members = MemberTable()
+        for member in self.archive_obj.getmembers():
+            name = '{}/'.format(member.name) if member.isdir() else member.name
+            members.append(name, member.size, None, member.isdir(), member.offset_data,
+                           member.mtime, member.mode)
+        return members
+
+    def _scan_names(self) -> Iterator[str]:
+        # Iterating a TarFile reads headers only as far as it is asked to,
+        # and keeps them for a later getmembers() or extractall()
+        for info in self.archive_obj:
+            yield info.name
+
+    def _cache_extra(self) -> Any:
+        infos = self.archive_obj.getmembers()
+        # Sparse maps aren't worth caching; such archives are rescanned
+        if any(info.sparse is not None for info in infos):
+            return None
+        return [[getattr(info, field) if field != 'type' else info.type.decode('latin-1')
+                 for field in TAR_INFO_FIELDS] for info in infos]
+
+    def _load_cache_extra(self, extra: Any) -> None:
+        self._cached_infos = extra
+
+    def _tarinfo(self, row: int) -> tarfile.TarInfo:
+        if self._cached_infos is None:
+            return self.archive_obj.getmembers()[row]
+        info = tarfile.TarInfo()
+        for field, value in zip(TAR_INFO_FIELDS, self._cached_infos[row]):
+            setattr(info, field, value)
+        info.type = info.type.encode('latin-1')
+        return info
+
+    def use_seek_index(self, span: int = DEFAULT_SPAN, sidecar: bool = True) -> bool:
+        """
+        Read members of a gzip, bzip2 or xz compressed tar through a seek
+        index, so reaching a member restarts decompression from the nearest
+        point before it rather than from the start of the file. Returns
+        False, changing nothing, for tars that can already seek directly.
+        """
+        if not isinstance(self.archive_obj.fileobj, (gzip.GzipFile, bz2.BZ2File, lzma.LZMAFile)):
+            return False
+        if self._indexed_tar is None:
+            reader = io.BufferedReader(IndexedReader(open(self.path, 'rb'),
+                                                     load_index(self.path, span, sidecar)))
+            try:
+                self._indexed_tar = tarfile.TarFile(fileobj=reader)  # type: ignore
+            except BaseException:
+                reader.close()
+                raise
+        return True
+
+    def close(self) -> None:
+        if self._indexed_tar is not None:
+            self._indexed_tar.fileobj.close()  # type: ignore
+            self._indexed_tar = None
 
     def open_by_name(self, name: str) -> Union[dict[Any, Any], None]:
-        try:
-            return {name: self.archive_obj.extractfile(name)}
-        except KeyError:
-            pass
-        return None
+        # Rows line up with getmembers(), which avoids tarfile's linear
+        # search by name. Cached headers avoid the scan altogether, and a
+        # seek index avoids decompressing everything before the member.
+        row = self.members.index.get(name, self.members.index.get('{}/'.format(name)))
+        if row is None:
+            return None
+        archive_obj = self._indexed_tar or self.archive_obj
+        return {name: archive_obj.extractfile(self._tarinfo(row))}
 
-    def extract_to(self, path: Path) -> None:
-        path_ = self._get_extract_path(path)
-        self.archive_obj.extractall(path_)
+    def iter_members(self) -> Iterator[tuple[MemberInfo, Optional[IO[bytes]]]]:
+        """
+        Works on tars opened for streaming ('r|*'), reading each header as it
+        is reached. Links and other special members have no stream.
+        """
+        archive_obj = self.archive_obj
+        streaming = isinstance(archive_obj.fileobj, tarfile._Stream)  # type: ignore
+        for info in iter(archive_obj.next, None) if streaming else archive_obj:
+            stream = archive_obj.extractfile(info) if info.isreg() else None
+            try:
+                yield self._member_info(info), stream
+            finally:
+                if stream is not None:
+                    stream.close()
+            if streaming:
+                # tarfile keeps every header it reads; dropping them keeps
+                # memory flat however many members go past
+                archive_obj.members.clear()
+
+    @staticmethod
+    def _member_info(info: tarfile.TarInfo) -> MemberInfo:
+        name = '{}/'.format(info.name) if info.isdir() else info.name
+        return MemberInfo(name, info.size, UNKNOWN, info.isdir(), info.offset_data, info.mtime,
+                          info.mode)
+
+    @staticmethod
+    def _extract_member(archive_obj: tarfile.TarFile, info: tarfile.TarInfo, path: Path,
+                        writer: Optional[PipelinedWriter],
+                        directories: List[tuple[tarfile.TarFile, tarfile.TarInfo, Path]]) -> None:
+        if writer is not None and info.isdir():
+            # Files are still to be written into it, which would move its mtime on
+            archive_obj.extract(info, path, set_attrs=False)
+            directories.append((archive_obj, info, Path(path)))
+            return
+        if writer is None or not info.isreg():
+            archive_obj.extract(info, path)
+            return
+        target = Path(path, info.name)
+        if not target.resolve().is_relative_to(Path(path).resolve()):
+            return
+        with archive_obj.extractfile(info) as stream:  # type: ignore
+            writer.write_stream(target, stream, info.size, info.mtime, info.mode & 0o777)
+
+    @staticmethod
+    def _set_directory_attrs(directories: List[tuple[tarfile.TarFile, tarfile.TarInfo, Path]]) -> None:
+        # As extractall() does, deepest first and once everything is written
+        for archive_obj, info, path in sorted(directories, key=lambda item: item[1].name,
+                                              reverse=True):
+            dir_path = os.path.join(path, info.name)
+            try:
+                archive_obj.chown(info, dir_path, False)
+                archive_obj.utime(info, dir_path)
+                archive_obj.chmod(info, dir_path)
+            except tarfile.ExtractError:
+                if archive_obj.errorlevel > 1:
+                    raise
+
+    def extract_to(self, path: Path, *, include: Optional[Iterable[str]] = None,
+                   exclude: Optional[Iterable[str]] = None,
+                   predicate: Optional[Callable[[MemberInfo], bool]] = None,
+                   writers: int = 0, preallocate: bool = False) -> None:
+        """
+        With a filter, tars that can seek only read the headers and data of
+        the members selected. A tar opened for streaming ('r|*') can't be
+        listed in advance, so it is extracted straight into path. When every
+        include is an exact name, the scan stops once each has turned up,
+        and so it does for other tars whose member table isn't built yet,
+        which spares a compressed tar decompressing past the last of them.
+
+        With writers set, regular files are written by a PipelinedWriter
+        with that many threads, so decompression carries on while earlier
+        files are written. Names escaping path are then skipped, and
+        directories get their mtime and mode once the writer has finished.
+        """
+        if include is None and exclude is None and predicate is None and not writers:
+            path_ = self._get_extract_path(path)
+            self.archive_obj.extractall(path_)
+            return
+        member_filter = MemberFilter(include, exclude, predicate)
+        archive_obj = self.archive_obj
+        directories: List[tuple[tarfile.TarFile, tarfile.TarInfo, Path]] = []
+        with ExitStack() as stack:
+            writer = None
+            if writers:
+                writer = stack.enter_context(PipelinedWriter(writers, preallocate=preallocate))
+            streaming = isinstance(archive_obj.fileobj, tarfile._Stream)  # type: ignore
+            # Reading headers as they come beats listing every member first
+            lazy = member_filter.targets is not None and 'members' not in self.__dict__ \
+                and self.index_cache is None
+            if streaming or lazy:
+                if not streaming:
+                    path = self._get_extract_path(path)
+                remaining = set(member_filter.targets or ())
+                for info in iter(archive_obj.next, None) if streaming else archive_obj:
+                    member = self._member_info(info)
+                    if member_filter(member):
+                        self._extract_member(archive_obj, info, path, writer, directories)
+                        remaining.discard(member.name)
+                        if member_filter.targets is not None and not remaining:
+                            break
+                    if streaming:
+                        archive_obj.members.clear()
+            else:
+                path_ = self._get_extract_path(path)
+                infos = [self._tarinfo(row) for row, info in enumerate(self.members)
+                         if member_filter(info)]
+                source = self._indexed_tar or archive_obj
+                if writer is None:
+                    source.extractall(path_, infos)
+                else:
+                    for info in infos:
+                        self._extract_member(source, info, path_, writer, directories)
+        self._set_directory_attrs(directories)
 
 
 class ZipArchiveWrapper(ArchiveWrapper):
@@ -96,21 +425,196 @@ class ZipArchiveWrapper(ArchiveWrapper):
         self.archive_obj = archive_obj
         self.path = path
 
-    def list(self) -> list[str]:
-        return self.archive_obj.namelist()
+    def _build_members(self) -> MemberTable:
+        members = MemberTable()
+        for info in self.archive_obj.infolist():
+            # Only zips made on unix keep a mode in the high bits
+            mode = stat.S_IMODE(info.external_attr >> 16) \
+                if info.create_system == ZIP_UNIX and info.external_attr >> 16 else None
+            members.append(info.filename, info.file_size, info.compress_size,
+                           info.is_dir(), info.header_offset, date_time_to_mtime(info.date_time),
+                           mode)
+        return members
+
+    def _scan_names(self) -> Iterator[str]:
+        return (info.filename for info in self.archive_obj.infolist())
 
     def open_by_name(self, name: str) -> Union[dict[Any, Any], None]:
+        """
+        Stored members of a zip opened with use_mmap come back as a
+        MemoryReader over the mapping, with no decompressor in the way.
+        """
         try:
-            item: dict[str, Any] = {name: self.archive_obj.open(name)}
-            if name.endswith('/'):
-                item[name] = None
+            info = self.archive_obj.getinfo(name)
         except KeyError:
             return None
-        return item
+        if info.is_dir():
+            return {name: None}
+        return {name: self._open_member(info)}
+
+    def _open_member(self, info: zipfile.ZipInfo) -> IO[bytes]:
+        return open_stored_member(self.archive_obj, info) or self.archive_obj.open(info)
 
-    def extract_to(self, path: Path) -> None:
+    def extract_to(self, path: Path, *, workers: int = 1, include: Optional[Iterable[str]] = None,
+                   exclude: Optional[Iterable[str]] = None,
+                   predicate: Optional[Callable[[MemberInfo], bool]] = None,
+                   writers: int = 0, preallocate: bool = False) -> None:
+        """
+        With workers > 1, members are split across that many processes by
+        uncompressed size, each opening its own handle on self.path. Members
+        left out by a filter are never read, as each is found through its
+        own offset in the central directory. Otherwise, with writers set,
+        files are written by a PipelinedWriter with that many threads and
+        names escaping path are skipped.
+        """
         path = self._get_extract_path(path)
-        self.archive_obj.extractall(path)
+        names = self.select(include, exclude, predicate)
+        if workers < 2 and writers:
+            self._extract_pipelined(path, names, writers, preallocate)
+            return
+        if workers < 2:
+            self.archive_obj.extractall(path, names)
+            return
+        infos = self.archive_obj.infolist()
+        if names is not None:
+            selected = set(names)
+            infos = [info for info in infos if info.filename in selected]
+        sizes = {info.filename: info.file_size for info in infos if not info.is_dir()}
+        make_parent_dirs(path, sizes)
+        for info in infos:
+            if info.is_dir():
+                self.archive_obj.extract(info, path)
+        run_parallel(extract_zip_members, self.path, split_by_size(sizes, workers), path, workers)
+
+    def _extract_pipelined(self, path: Path, names: Optional[List[str]], writers: int,
+                           preallocate: bool) -> None:
+        root = Path(path).resolve()
+        selected = set(names) if names is not None else None
+        with PipelinedWriter(writers, preallocate=preallocate) as writer:
+            for info in self.archive_obj.infolist():
+                if selected is not None and info.filename not in selected:
+                    continue
+                target = Path(root, info.filename).resolve()
+                if not target.is_relative_to(root):
+                    continue
+                if info.is_dir():
+                    target.mkdir(parents=True, exist_ok=True)
+                    continue
+                with self._open_member(info) as stream:
+                    writer.write_stream(target, stream, info.file_size)
+
+
+def sevenz_folder_bounds(archive_obj: py7zr.SevenZipFile) -> dict[int, tuple[int, int]]:
+    """
+    Start and end of each folder's packed data in the archive file, keyed
+    by id() of the folder.
+    """
+    bounds = {}
+    if archive_obj.header.main_streams is not None:
+        start = archive_obj.afterheader  # type: ignore
+        positions = archive_obj.header.main_streams.packinfo.packpositions
+        folders = archive_obj.header.main_streams.unpackinfo.folders
+        for index, folder in enumerate(folders):
+            bounds[id(folder)] = (start + positions[index], start + positions[index + 1])
+    return bounds
+
+
+class SevenZMemberReader(io.RawIOBase):
+    """
+    Decompresses a 7z member on demand rather than into memory in one go.
+    py7zr's folder decompressor is pulled a block at a time, so only the
+    current block is buffered. Earlier members in the same solid folder are
+    decompressed and discarded on the way. Seeking backwards restarts the
+    folder.
+    """
+
+    def __init__(self, archive_obj: py7zr.SevenZipFile, member: Any) -> None:
+        super().__init__()
+        self._archive_obj = archive_obj
+        self._member = member
+        self._src_start, self._src_end = sevenz_folder_bounds(archive_obj)[id(member.folder)]
+        self._skip = 0
+        # files builds a fresh ArchiveFile on every access, so match on id
+        for other in archive_obj.files:
+            if other.id == member.id:
+                break
+            if other.folder is member.folder:
+                self._skip += other.uncompressed
+        self._start()
+
+    def _start(self) -> None:
+        folder = self._member.folder
+        # A decompressor of our own, so the folder's shared one is untouched
+        self._decompressor = py7zr.compressor.SevenZipDecompressor(
+            folder.coders, self._src_end - self._src_start, folder.unpacksizes, folder.crc,
+            folder.password)
+        self._fp_pos = self._src_start
+        self._buffer = b''
+        self._pos = 0
+        self._crc32 = 0
+        skip = self._skip
+        while skip:
+            skip -= len(self._next(min(skip, COPY_CHUNK_SIZE)))
+
+    def _next(self, size: int) -> bytes:
+        fp = self._archive_obj.fp
+        exhausted = False
+        while True:
+            fp.seek(self._fp_pos)
+            data = self._decompressor.decompress(fp, size)
+            self._fp_pos = fp.tell()
+            if data:
+                return data
+            # The codec may hold back output until it is called once more
+            # with no input, so only a second empty call is final
+            if exhausted:
+                raise py7zr.exceptions.Bad7zFile('{} is truncated'.format(self._member.filename))
+            exhausted = self._fp_pos >= self._src_end
+
+    def _fill(self) -> None:
+        remaining = self._member.uncompressed - self._pos
+        while not self._buffer and remaining:
+            self._buffer = self._next(min(remaining, COPY_CHUNK_SIZE))
+            self._crc32 = py7zr.helpers.calculate_crc32(self._buffer, self._crc32)
+            if len(self._buffer) == remaining:
+                self._check()
+
+    def _check(self) -> None:
+        if self._member.crc32 is not None and self._crc32 != self._member.crc32:
+            raise py7zr.exceptions.CrcError(self._crc32, self._member.crc32, self._member.filename)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        self._fill()
+        count = min(len(buffer), len(self._buffer))
+        buffer[:count] = self._buffer[:count]
+        self._buffer = self._buffer[count:]
+        self._pos += count
+        return count
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._member.uncompressed
+        if offset < self._pos:
+            self._start()
+        while self._pos < offset:
+            self._fill()
+            if not self._buffer:
+                break
+            count = min(offset - self._pos, len(self._buffer))
+            self._buffer = self._buffer[count:]
+            self._pos += count
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
 
 
 class SevenZArchiveWrapper(ArchiveWrapper):
@@ -119,68 +623,338 @@ class SevenZArchiveWrapper(ArchiveWrapper):
         self.archive_obj = archive_obj
         self.path = path
 
-    def list(self) -> list[str]:
-        names = []
-        for member in self.archive_obj.list():
-            if member.is_directory:
-                names.append('{}/'.format(member.filename))
-            else:
-                names.append(member.filename)
-        return names
+    def _build_members(self) -> MemberTable:
+        members = MemberTable()
+        for member in self.archive_obj.files:
+            name = '{}/'.format(member.filename) if member.is_directory else member.filename
+            mtime = member.lastwritetime.totimestamp() if member.lastwritetime else None
+            members.append(name, member.uncompressed, member.compressed, member.is_directory,
+                           mtime=mtime, mode=member.posix_mode)
+        return members
 
-    def open_by_name(self, name: str) -> Union[dict[Any, Any], None]:
+    def iter_by_names(self, names: Iterable[str]) -> Iterator[tuple[str, Optional[IO[bytes]]]]:
+        """
+        Decompress each folder once, in archive order, yielding the requested
+        members as they are reached. Solid blocks are never restarted, so any
+        number of members costs a single pass. Folders holding no requested
+        member are skipped, as is the rest of a folder after its last one.
+        Directories yield None.
+        """
+        wanted = set(names)
+        # Requested members still to come in each folder
+        folder_wanted: dict[int, int] = {}
+        for member in self.archive_obj.files:
+            if member.folder is not None and member.filename in wanted:
+                folder_wanted[id(member.folder)] = folder_wanted.get(id(member.folder), 0) + 1
         self.archive_obj.reset()
-        item = self.archive_obj.read(targets=[name])
-        if item:
-            return item
-        if name in self.list():
-            return {name: None}
-        return None
+        fp = self.archive_obj.fp
+        worker = self.archive_obj.worker
+        folder_bounds = sevenz_folder_bounds(self.archive_obj)
+        current_folder = None
+        for member in self.archive_obj.files:
+            if not wanted:
+                return
+            name = '{}/'.format(member.filename) if member.is_directory else member.filename
+            if member.folder is None:
+                if name in wanted:
+                    wanted.remove(name)
+                    yield name, None if member.is_directory else io.BytesIO()
+                continue
+            if not folder_wanted.get(id(member.folder)):
+                continue
+            src_start, src_end = folder_bounds[id(member.folder)]
+            if member.folder is not current_folder:
+                current_folder = member.folder
+                fp.seek(src_start)
+            fileobj = io.BytesIO()
+            crc32 = worker.decompress(fp, member.folder, fileobj, member.uncompressed,
+                                      member.compressed, src_end)
+            if member.crc32 is not None and crc32 != member.crc32:
+                raise py7zr.exceptions.CrcError(crc32, member.crc32, member.filename)
+            if name in wanted:
+                wanted.remove(name)
+                folder_wanted[id(member.folder)] -= 1
+                fileobj.seek(0)
+                yield name, fileobj
+
+    def open_by_names(self, names: Iterable[str]) -> dict[Any, Any]:
+        return dict(self.iter_by_names(names))
+
+    def open_by_name(self, name: str) -> Union[dict[Any, Any], None]:
+        return self.open_by_names([name]) or None
+
+    def iter_members(self) -> Iterator[tuple[MemberInfo, Optional[IO[bytes]]]]:
+        # One pass over the folders, as with iter_by_names()
+        for name, stream in self.iter_by_names(self.list()):
+            try:
+                yield self.members.get(name), stream  # type: ignore
+            finally:
+                if stream is not None:
+                    stream.close()
+
+    def _folder_members(self, targets: Optional[List[str]] = None) -> dict[int, List[str]]:
+        folders: dict[int, list[str]] = {}
+        wanted = None if targets is None else set(targets)
+        for member in self.archive_obj.files:
+            if member.folder is not None and (wanted is None or member.filename in wanted):
+                folders.setdefault(id(member.folder), []).append(member.filename)
+        return folders
 
-    def extract_to(self, path: Path) -> None:
+    def extract_to(self, path: Path, *, workers: int = 1, include: Optional[Iterable[str]] = None,
+                   exclude: Optional[Iterable[str]] = None,
+                   predicate: Optional[Callable[[MemberInfo], bool]] = None) -> None:
+        """
+        With workers > 1 and more than one folder (i.e. a non-solid
+        archive), folders are split across that many processes by
+        uncompressed size, each opening its own handle on self.path. With a
+        filter, py7zr skips folders holding nothing selected without
+        decompressing them, and stops within a folder after its last
+        selected member.
+        """
         path = self._get_extract_path(path)
-        self.archive_obj.extractall(path)
+        self.archive_obj.reset()
+        names = self.select(include, exclude, predicate)
+        targets = None if names is None else [name.rstrip('/') for name in names]
+        folder_members = self._folder_members(targets)
+        if workers < 2 or len(folder_members) < 2:
+            if targets is None:
+                self.archive_obj.extractall(path)
+            else:
+                self.archive_obj.extract(path, targets=targets)
+            return
+        sizes = {name: member.uncompressed for member in self.archive_obj.files
+                 for name in [member.filename] if member.folder is not None}
+        folder_sizes = {key: sum(sizes[name] for name in names)
+                        for key, names in folder_members.items()}
+        groups = [[name for key in keys for name in folder_members[key]]
+                  for keys in split_by_size(folder_sizes, workers)]
+        empty = [member.filename for member in self.archive_obj.files if member.folder is None
+                 and (targets is None or member.filename in targets)]
+        if empty:
+            self.archive_obj.extract(path, targets=empty)
+        run_parallel(extract_7z_members, self.path, groups, path, workers)
+        # Writing files has moved directory mtimes on since they were set
+        for member in self.archive_obj.files:
+            if not member.is_directory or member.lastwritetime is None or \
+                    (targets is not None and member.filename not in targets):
+                continue
+            dir_path = Path(path, member.filename)
+            if dir_path.is_dir():
+                timestamp = member.lastwritetime.totimestamp()
+                os.utime(dir_path, times=(timestamp, timestamp))
+
 
+class RarMemberReader(io.RawIOBase):
+    """
+    Independent reader over one member of an already parsed RarFile.
 
-# class RarFileObjWrapper(io.BufferedReader):
+    Uncompressed members are read straight from the archive's file object,
+    which every such reader shares (https://github.com/markokr/rarfile/issues/73).
+    Each reader keeps its own position and, if another reader has used the
+    shared file object since, reopens its member from the parsed header and
+    seeks back before reading. Headers are never re-parsed.
+    """
 
-#     def __init__(self, *args, **kwargs) -> None:
-#         super().__init__( *args, **kwargs)
+    def __init__(self, wrapper: 'RarArchiveWrapper', info: rarfile.RarInfo) -> None:
+        super().__init__()
+        self._wrapper = wrapper
+        self._info = info
+        self._pos = 0
+        self._raw = self._wrapper.archive_obj.open(info)
+        self._wrapper._reader_owner = self
+
+    def _sync(self) -> None:
+        if self._wrapper._reader_owner is self:
+            return
+        if isinstance(self._raw, rarfile.DirectReader):
+            self._raw.close()
+            self._raw = self._wrapper.archive_obj.open(self._info)
+            self._raw.seek(self._pos)
+        self._wrapper._reader_owner = self
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        self._sync()
+        count = self._raw.readinto(buffer)
+        self._pos += count
+        return count
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._info.file_size
+        self._sync()
+        self._pos = self._raw.seek(offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self) -> None:
+        if not self.closed:
+            self._raw.close()
+            if self._wrapper._reader_owner is self:
+                self._wrapper._reader_owner = None
+        super().close()
 
-#     def read(self, *args, **kwargs) -> bytes:
-#         self.seek(0)
-#         return super().read(*args, **kwargs)
 
 class RarArchiveWrapper(ArchiveWrapper):
 
     def __init__(self, archive_obj: rarfile.RarFile, path: Path) -> None:
         self.archive_obj = archive_obj
         self.path = path
-        self.rar_file_path = archive_obj.filename
+        self._reader_owner: Optional[RarMemberReader] = None
 
-    def _refresh(self):
-        """
-        Workaround this issue: https://github.com/markokr/rarfile/issues/73
-        """
-        self.archive_obj.close()
-        self.archive_obj = rarfile.RarFile(self.rar_file_path)
+    def _build_members(self) -> MemberTable:
+        members = MemberTable()
+        for info in self.archive_obj.infolist():
+            mtime = info.mtime.timestamp() if info.mtime else date_time_to_mtime(info.date_time)
+            mode = stat.S_IMODE(info.mode) if info.host_os == rarfile.RAR_OS_UNIX else None
+            members.append(info.filename, info.file_size, info.compress_size,
+                           info.is_dir(), info.data_offset, mtime, mode)
+        return members
 
-    def list(self) -> list[str]:
-        return self.archive_obj.namelist()
+    def _scan_names(self) -> Iterator[str]:
+        return (info.filename for info in self.archive_obj.infolist())
 
     def open_by_name(self, name: str) -> Union[dict[Any, Any], None]:
-        self._refresh()
         try:
-            item = {name: self.archive_obj.open(name)}
-        except io.UnsupportedOperation:
-            item = {name: None}
+            info = self.archive_obj.getinfo(name)
         except rarfile.NoRarEntry:
-            item = None
-        return item
+            return None
+        if info.is_dir():
+            return {name: None}
+        return {name: RarMemberReader(self, info)}
 
-    def extract_to(self, path: Path) -> None:
+    def extract_to(self, path: Path, *, include: Optional[Iterable[str]] = None,
+                   exclude: Optional[Iterable[str]] = None,
+                   predicate: Optional[Callable[[MemberInfo], bool]] = None) -> None:
         path = self._get_extract_path(path)
-        self.archive_obj.extractall(path)
+        self.archive_obj.extractall(path, self.select(include, exclude, predicate))
+
+
+class _LhaSource:
+    """
+    Bounded view of a member's compressed data for lzhlib to pull from. It
+    seeks the shared archive file object to its own position on each read.
+    """
+
+    def __init__(self, fp: IO[bytes], offset: int, size: int) -> None:
+        self._fp = fp
+        self._pos = offset
+        self._end = offset + size
+
+    def read(self, size: int) -> bytes:
+        self._fp.seek(self._pos)
+        data = self._fp.read(min(size, self._end - self._pos))
+        self._pos += len(data)
+        return data
+
+
+class _LhaSink:
+
+    def __init__(self, buffer: bytearray) -> None:
+        self._buffer = buffer
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        return len(data)
+
+
+class LhaMemberReader(io.RawIOBase):
+    """
+    Decompresses an LHA member on demand rather than reading it into memory
+    in one go. lzhlib works through the member a block at a time, so only
+    the current block is ever buffered. Seeking backwards restarts
+    decompression.
+    """
+
+    def __init__(self, archive_obj: lhafile.LhaFile, info: lhafile.LhaInfo) -> None:
+        super().__init__()
+        self._archive_obj = archive_obj
+        self._info = info
+        self._start()
+
+    def _start(self) -> None:
+        self._buffer = bytearray()
+        self._pos = 0
+        self._done = False
+        source = _LhaSource(self._archive_obj.fp, self._info.file_offset, self._info.compress_size)
+        self._session = lzhlib.LZHDecodeSession(source, _LhaSink(self._buffer), self._info)
+
+    def _fill(self) -> None:
+        while not self._buffer and not self._done:
+            self._done = bool(self._session.do_next())
+            if self._done:
+                self._check()
+
+    def _check(self) -> None:
+        if self._session.output_pos != self._info.file_size:
+            raise lhafile.BadLhafile('{} output_size is not matched {}/{}'.format(
+                self._info.filename, self._session.output_pos, self._info.file_size))
+        if self._session.crc16 != self._info.CRC:
+            raise lhafile.BadLhafile('crc is not matched')
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        self._fill()
+        count = min(len(buffer), len(self._buffer))
+        buffer[:count] = self._buffer[:count]
+        del self._buffer[:count]
+        self._pos += count
+        return count
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._info.file_size
+        if offset < self._pos:
+            self._start()
+        while self._pos < offset:
+            self._fill()
+            if not self._buffer:
+                break
+            count = min(offset - self._pos, len(self._buffer))
+            del self._buffer[:count]
+            self._pos += count
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+
+class LhaIndex(NamedTuple):
+    files: tuple[str, ...]
+    dirs: tuple[str, ...]
+    file_set: frozenset[str]
+    dir_set: frozenset[str]
+    num_root_items: int
+
+
+def build_lha_index(files: list[str]) -> LhaIndex:
+    """
+    LHA archives only store files, so directories are implied by the
+    files' parents. Work them out once rather than on every lookup.
+    """
+    dirs = set()
+    for file in files:
+        dirs.update('{}/'.format(parent) for parent in Path(file).parents)
+    dirs.discard('./')
+    root_items = set(file.split('/')[0] for file in files)
+    return LhaIndex(tuple(files), tuple(sorted(dirs)), frozenset(files),
+                    frozenset(dirs), len(root_items))
 
 
 class LhaArchiveWrapper(ArchiveWrapper):
@@ -188,33 +962,100 @@ class LhaArchiveWrapper(ArchiveWrapper):
     def __init__(self, archive_obj: lhafile.LhaFile, path: Path) -> None:
         self.archive_obj = archive_obj
         self.path = path
-        self._files = self.archive_obj.namelist()
+        self._index = build_lha_index(self.archive_obj.namelist() or [])
 
-    def _dirs(self) -> list[str]:
-        dirs = list(set(['{}/'.format(parent) for file in self._files for parent in Path(file).parents]))
-        dirs.remove('./')
-        return dirs
+    def _num_root_items(self) -> int:
+        return self._index.num_root_items
 
-    def list(self) -> list[str]:
-        return self._files + self._dirs()
+    def _has_multiple_roots(self) -> bool:
+        return self._index.num_root_items > 1
+
+    def _open_member(self, name: str) -> LhaMemberReader:
+        return LhaMemberReader(self.archive_obj, self.archive_obj.NameToInfo[name])
+
+    def _build_members(self) -> MemberTable:
+        members = MemberTable()
+        for file in self._index.files:
+            info = self.archive_obj.NameToInfo[file]
+            members.append(file, info.file_size, info.compress_size, False, info.file_offset,
+                           info.date_time.timestamp())
+        for directory in self._index.dirs:
+            members.append(directory, 0, 0, True)
+        return members
 
     def open_by_name(self, name: str) -> Union[dict[Any, Any], None]:
-        try:
-            item = {name: io.BytesIO(self.archive_obj.read(name))}
-        except KeyError:
-            if name in self._dirs():
-                item = {name: None}
-            else:
-                item = None
-        return item
+        if name in self._index.file_set:
+            return {name: self._open_member(name)}
+        if name in self._index.dir_set:
+            return {name: None}
+        return None
 
-    def extract_to(self, path: Path) -> None:
+    def extract_to(self, path: Path, *, include: Optional[Iterable[str]] = None,
+                   exclude: Optional[Iterable[str]] = None,
+                   predicate: Optional[Callable[[MemberInfo], bool]] = None,
+                   writers: int = 0, preallocate: bool = False) -> None:
+        """
+        With writers set, files are written by a PipelinedWriter with that
+        many threads while the next member is being decompressed.
+        """
         path = self._get_extract_path(path)
-        for file in self._files:
-            target_path = Path(path, file)
-            target_path.parent.mkdir(parents=True, exist_ok=True)
-            with open(target_path, 'wb') as target_file:
-                target_file.write(self.archive_obj.read(file))
+        names = self.select(include, exclude, predicate)
+        if names is not None:
+            for directory in names:
+                if directory in self._index.dir_set:
+                    Path(path, directory).mkdir(parents=True, exist_ok=True)
+        selected = set(names) if names is not None else None
+        with ExitStack() as stack:
+            writer = None
+            if writers:
+                writer = stack.enter_context(PipelinedWriter(writers, preallocate=preallocate))
+            for file in self._index.files:
+                if selected is not None and file not in selected:
+                    continue
+                target_path = Path(path, file)
+                with self._open_member(file) as member:
+                    if writer is not None:
+                        size = self.archive_obj.NameToInfo[file].file_size
+                        writer.write_stream(target_path, member, size)
+                        continue
+                    target_path.parent.mkdir(parents=True, exist_ok=True)
+                    with open(target_path, 'wb') as target_file:
+                        copy_stream(member, target_file)
+
+
+class PayloadReader(io.RawIOBase):
+    """
+    The decompressed data of a gzip, bz2 or xz file, read from the start
+    through the wrapper's archive object. Closing the reader leaves the
+    archive object open for the next one. Readers share the archive
+    object's position, so only one should be read at a time.
+    """
+
+    def __init__(self, archive_obj: CompressionIO) -> None:
+        super().__init__()
+        self._archive_obj = archive_obj
+        if archive_obj.tell():
+            # Restarts decompression from the beginning
+            archive_obj.seek(0)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return self._archive_obj.seekable()
+
+    def readinto(self, buffer: Any) -> int:
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
+        return self._archive_obj.readinto(buffer)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
+        return self._archive_obj.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._archive_obj.tell()
 
 
 class FileUnAwareArchiveWrapper(ArchiveWrapper):
@@ -222,18 +1063,69 @@ class FileUnAwareArchiveWrapper(ArchiveWrapper):
     def __init__(self, archive_obj: CompressionIO, path: Path) -> None:
         self.archive_obj = archive_obj
         self.path = path
+        self._seek_index: Optional[SeekIndex] = None
 
-    def list(self) -> list[str]:
-        return [self._name()]
+    def _build_members(self) -> MemberTable:
+        members = MemberTable()
+        members.append(self._name())
+        return members
 
-    # TODO - return file object if name is given
-    def open_by_name(self, name: str):
+    def open_seekable(self, span: int = DEFAULT_SPAN, sidecar: bool = True) -> io.BufferedReader:
+        """
+        Open the decompressed data for random access. seek() restarts from
+        the nearest point in a seek index instead of the start of the file.
+        The index is built on first use and, with sidecar set, saved beside
+        the archive for later runs.
+        """
+        if self._seek_index is None:
+            self._seek_index = load_index(self.path, span, sidecar)
+        return io.BufferedReader(IndexedReader(open(self.path, 'rb'), self._seek_index))
+
+    def open_by_name(self, name: str) -> Union[dict[Any, Any], None]:
         if name == self._name():
-            return {name: self.archive_obj}
+            return {name: io.BufferedReader(PayloadReader(self.archive_obj))}  # type: ignore
         return None
 
-    def extract_to(self, path: Path) -> None:
+    def extract_to(self, path: Path, *, chunk_size: int = COPY_CHUNK_SIZE,
+                   include: Optional[Iterable[str]] = None, exclude: Optional[Iterable[str]] = None,
+                   predicate: Optional[Callable[[MemberInfo], bool]] = None,
+                   writers: int = 0, preallocate: bool = False) -> None:
+        """
+        With writers set, the data is written by a PipelinedWriter, so each
+        chunk is decompressed while the one before it is being written. The
+        size isn't known in advance, so preallocate has no effect.
+        """
+        if self.select(include, exclude, predicate) == []:
+            return
         path = self._get_extract_path(path)
         file_path = Path(path, self._name())
-        with open(file_path, 'wb') as targetfobj:
-            targetfobj.write(self.archive_obj.read())
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        if writers:
+            with PayloadReader(self.archive_obj) as payload, \
+                 PipelinedWriter(writers, chunk_size=chunk_size, preallocate=preallocate) as writer:
+                writer.write_stream(file_path, payload)  # type: ignore
+            return
+        with open(file_path, 'wb') as targetfobj, PayloadReader(self.archive_obj) as payload:
+            copy_stream(payload, targetfobj, chunk_size)
+
+
+WRAPPERS = {
+    tarfile.TarFile: TarArchiveWrapper,
+    zipfile.ZipFile: ZipArchiveWrapper,
+    py7zr.SevenZipFile: SevenZArchiveWrapper,
+    rarfile.RarFile: RarArchiveWrapper,
+    lhafile.LhaFile: LhaArchiveWrapper,
+    gzip.GzipFile: FileUnAwareArchiveWrapper,
+    bz2.BZ2File: FileUnAwareArchiveWrapper,
+    lzma.LZMAFile: FileUnAwareArchiveWrapper,
+}
+
+
+def wrap_archive(archive_obj: ArchiveIO, path: Path,
+                 index_cache: Optional[IndexCache] = None) -> ArchiveWrapper:
+    for archive_type, wrapper_class in WRAPPERS.items():
+        if isinstance(archive_obj, archive_type):
+            wrapper = wrapper_class(archive_obj, path)
+            wrapper.index_cache = index_cache
+            return wrapper
+    raise TypeError('No wrapper for {}'.format(type(archive_obj).__name__))
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Measure FileUnAwareArchiveWrapper.extract_to throughput against copy chunk
+size for each codec. Run from the repo root:
+python -m benchmarks.bench_chunk_size
+"""
+
+import os
+import argparse
+import bz2
+import gzip
+import lzma
+import pathlib
+import tempfile
+import time
+
+from archive.wrappers import FileUnAwareArchiveWrapper
+
+CODECS = {
+    'gz': gzip.open,
+    'bz2': bz2.open,
+    'xz': lzma.open,
+}
+
+CHUNK_SIZES = [16 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024]
+
+
+def write_payload(path: pathlib.Path, open_func, size_mb: int) -> None:
+    # Half random, half zeros, so each codec has something to work on
+    block = os.urandom(512 * 1024) + bytes(512 * 1024)
+    with open_func(path, 'wb') as fileobj:
+        for _ in range(size_mb):
+            fileobj.write(block)
+
+
+def extract_seconds(path: pathlib.Path, open_func, chunk_size: int, target_dir: str) -> float:
+    with open(path, 'rb') as fileobj, open_func(fileobj) as archive_obj:
+        wrapper = FileUnAwareArchiveWrapper(archive_obj, path)
+        start = time.perf_counter()
+        wrapper.extract_to(target_dir, chunk_size=chunk_size)
+        return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-s', '--size-mb', type=int, default=64)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        print('{:<6} {:>10} {:>10}'.format('codec', 'chunk', 'MB/s'))
+        for ext, open_func in CODECS.items():
+            path = pathlib.Path(temp_dir, 'payload.bin.{}'.format(ext))
+            write_payload(path, open_func, args.size_mb)
+            for chunk_size in CHUNK_SIZES:
+                seconds = extract_seconds(path, open_func, chunk_size, temp_dir)
+                print('{:<6} {:>10} {:>10.1f}'.format(ext, chunk_size, args.size_mb / seconds))
+            path.unlink()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Compare per-file detection cost of signature sniffing against probing every
+opener. Run from the repo root: python -m benchmarks.bench_detection
+"""
+
+import os
+import argparse
+import pathlib
+import shutil
+import tempfile
+import timeit
+
+from archive import open_archive
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(SCRIPT_DIR, '..', 'tests', 'fixtures')
+
+
+def build_corpus(target_dir: pathlib.Path) -> list[pathlib.Path]:
+    # Extensions are stripped so probing can't shortcut on the name
+    corpus = []
+    for fixture in sorted(pathlib.Path(FIXTURES_DIR).glob('*.*')):
+        path = pathlib.Path(target_dir, fixture.name.replace('.', '_'))
+        shutil.copy(fixture, path)
+        corpus.append(path)
+    return corpus
+
+
+def detect_by_signature(path: pathlib.Path) -> None:
+    with open(path, 'rb') as fileobj:
+        open_funcs = open_archive.get_open_funcs_by_signature(
+            fileobj.read(open_archive.SNIFF_SIZE))
+        if open_funcs:
+            open_archive.open_with(fileobj, open_funcs)
+        else:
+            open_archive.open_by_probing(fileobj, path)
+
+
+def detect_by_probing(path: pathlib.Path) -> None:
+    with open(path, 'rb') as fileobj:
+        open_archive.open_by_probing(fileobj, path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--number', type=int, default=20)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        corpus = build_corpus(pathlib.Path(temp_dir))
+        print('{:<16} {:>12} {:>12}'.format('file', 'sniff (us)', 'probe (us)'))
+        totals = [0.0, 0.0]
+        for path in corpus:
+            timings = []
+            for detect in (detect_by_signature, detect_by_probing):
+                detect(path)  # warm up imports and caches
+                seconds = timeit.timeit(lambda: detect(path), number=args.number)
+                timings.append(seconds / args.number * 1e6)
+            totals = [total + timing for total, timing in zip(totals, timings)]
+            print('{:<16} {:>12.1f} {:>12.1f}'.format(path.name, *timings))
+        print('{:<16} {:>12.1f} {:>12.1f}'.format(
+            'mean', *[total / len(corpus) for total in totals]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Compare listing a many-member zip through open_archive with buffered file
+reads against an mmap of the file, and reading its stored members, which
+with mmap come straight from the mapping. Run from the repo root:
+python -m benchmarks.bench_mmap_listing
+"""
+
+import argparse
+import pathlib
+import tempfile
+import timeit
+import zipfile
+
+from archive.open_archive import open_archive
+from archive.wrappers import copy_stream
+
+
+class NullWriter:
+
+    def write(self, data: bytes) -> int:
+        return len(data)
+
+
+def write_zip(path: pathlib.Path, entries: int) -> None:
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as archive_obj:
+        for index in range(entries):
+            archive_obj.writestr('dir{}/member{}.txt'.format(index % 100, index), b'x' * (index % 64))
+
+
+def list_zip(path: pathlib.Path, use_mmap: bool) -> int:
+    with open_archive(path, use_mmap=use_mmap) as handle:  # type: ignore
+        return len(handle.wrapper.list())
+
+
+def read_zip(path: pathlib.Path, use_mmap: bool) -> int:
+    total = 0
+    with open_archive(path, use_mmap=use_mmap) as handle:  # type: ignore
+        for _, stream in handle.wrapper.iter_by_names(handle.wrapper.list()):
+            if stream is not None:
+                with stream:
+                    total += copy_stream(stream, NullWriter())  # type: ignore
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-e', '--entries', type=int, default=50000)
+    parser.add_argument('-n', '--number', type=int, default=5)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = pathlib.Path(temp_dir, 'many.zip')
+        write_zip(path, args.entries)
+        print('{} entries, {} bytes'.format(args.entries, path.stat().st_size))
+        print('{:<10} {:>12} {:>12}'.format('input', 'list (ms)', 'read (ms)'))
+        for label, use_mmap in (('buffered', False), ('mmap', True)):
+            list_zip(path, use_mmap)  # warm up the page cache
+            times = [timeit.timeit(lambda: function(path, use_mmap), number=args.number)
+                     for function in (list_zip, read_zip)]
+            print('{:<10} {:>12.1f} {:>12.1f}'.format(label, *(seconds / args.number * 1e3
+                                                              for seconds in times)))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,56 @@
 #!/usr/bin/env python3
 
+import sys
+import json
 import argparse
 
+from archive.batch import ACTIONS, expand_paths, process_paths
+from archive.hashing import ALGORITHMS, DEFAULT_ALGORITHMS
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Inspect and extract archives in bulk')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for action in ACTIONS:
+        subparser = subparsers.add_parser(action, help='{} each archive'.format(action))
+        subparser.add_argument('paths', nargs='+',
+                               help='archive paths, directories or glob patterns')
+        subparser.add_argument('-w', '--workers', type=int, default=None,
+                               help='worker processes (default: CPU count)')
+        subparser.add_argument('--max-pending', type=int, default=None,
+                               help='archives queued at once (default: 4 per worker)')
+        subparser.add_argument('--index-cache', default=None,
+                               help='SQLite file caching member listings between runs')
+        if action in ('list', 'extract'):
+            subparser.add_argument('--nested', action='store_true',
+                                   help='descend into archives inside each archive')
+        if action == 'hash':
+            subparser.add_argument('-a', '--algorithm', action='append', choices=ALGORITHMS,
+                                   dest='algorithms',
+                                   help='digest to compute, repeatable (default: sha256)')
+        if action == 'extract':
+            subparser.add_argument('-t', '--target', default='.',
+                                   help='directory to extract into, each archive in a subdirectory '
+                                        'named after its path')
+            subparser.add_argument('--incremental', action='store_true',
+                                   help='skip files already extracted and unchanged')
+    return parser
+
+
+def main(argv=None) -> int:
+    args = get_parser().parse_args(argv)
+    failed = 0
+    for result in process_paths(expand_paths(args.paths), args.command,
+                                target=getattr(args, 'target', None),
+                                workers=args.workers, max_pending=args.max_pending,
+                                index_cache=args.index_cache,
+                                nested=getattr(args, 'nested', False),
+                                algorithms=getattr(args, 'algorithms', None) or DEFAULT_ALGORITHMS,
+                                incremental=getattr(args, 'incremental', False)):
+        failed += not result.ok
+        print(json.dumps(result._asdict()), flush=True)
+    return 1 if failed else 0
+
+
 if __name__ == '__main__':
-    pass
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,94 @@
+import os
+import asyncio
+import pathlib
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from archive import aio
+from archive.aio import AsyncArchive
+from archive.wrappers import ZipArchiveWrapper
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(SCRIPT_DIR, 'fixtures')
+
+
+class TestAsyncArchive(unittest.IsolatedAsyncioTestCase):
+
+    async def test_list_read_and_chunks(self):
+        async with await AsyncArchive.open(os.path.join(FIXTURES_DIR, 'dirs.7z')) as archive:
+            self.assertIn('two/three.txt', await archive.list())
+            self.assertEqual(await archive.read('one.txt'), b'one\n')
+            chunks = [chunk async for chunk in archive.iter_chunks('two/three.txt', chunk_size=2)]
+            self.assertEqual(chunks, [b'th', b're', b'e\n'])
+            with self.assertRaises(KeyError):
+                await archive.read('missing.txt')
+
+    async def test_single_file_read_repeatedly(self):
+        async with await AsyncArchive.open(os.path.join(FIXTURES_DIR, 'file.txt.gz')) as archive:
+            for _ in range(2):
+                self.assertEqual(await archive.read('file.txt'), b'Test text\n')
+                chunks = [chunk async for chunk in archive.iter_chunks('file.txt', chunk_size=5)]
+                self.assertEqual(chunks, [b'Test ', b'text\n'])
+
+    async def test_extract_to(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            async with await AsyncArchive.open(os.path.join(FIXTURES_DIR, 'dirs.lha')) as archive:
+                await archive.extract_to(temp_dir)
+            with open(pathlib.Path(temp_dir, 'dirs', 'two', 'five', 'eight.txt'), 'rb') as file:
+                self.assertEqual(file.read(), b'eight\n')
+
+    async def test_not_an_archive(self):
+        with self.assertRaises(ValueError):
+            await AsyncArchive.open(os.path.join(FIXTURES_DIR, 'templates', 'file.txt'))
+
+    async def test_concurrency_limited_per_archive(self):
+        running = 0
+        peak = 0
+        lock = threading.Lock()
+        list_files = ZipArchiveWrapper.list
+
+        def slow_list(wrapper):
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            threading.Event().wait(0.05)
+            with lock:
+                running -= 1
+            return list_files(wrapper)
+
+        with patch.object(ZipArchiveWrapper, 'list', slow_list):
+            async with await AsyncArchive.open(os.path.join(FIXTURES_DIR, 'dirs.zip'),
+                                               max_concurrency=2) as archive:
+                results = await asyncio.gather(*[archive.list() for _ in range(6)])
+                self.assertEqual(len(archive._idle), 2)
+        self.assertEqual(peak, 2)
+        self.assertTrue(all('one.txt' in result for result in results))
+
+    async def test_cancelled_call_retires_handle(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def blocked_list(wrapper):
+            started.set()
+            release.wait(5)
+            return []
+
+        async with await AsyncArchive.open(os.path.join(FIXTURES_DIR, 'dirs.zip')) as archive:
+            handle = archive._idle[0]
+            with patch.object(ZipArchiveWrapper, 'list', blocked_list):
+                task = asyncio.ensure_future(archive.list())
+                await asyncio.get_running_loop().run_in_executor(None, started.wait)
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+            self.assertEqual(archive._idle, [])
+            self.assertEqual(await archive.read('one.txt'), b'one\n')
+            release.set()
+            while not handle.closed:
+                await asyncio.sleep(0.01)
+
+    def test_default_executor_shared(self):
+        self.assertIs(aio.default_executor(), aio.default_executor())
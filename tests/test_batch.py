@@ -0,0 +1,152 @@
+import os
+import io
+import gzip
+import pathlib
+import tempfile
+import unittest
+from unittest.mock import patch
+from contextlib import redirect_stdout
+
+import sarc
+from archive import batch
+from archive.batch import BatchResult, archive_target, expand_paths, process_path, process_paths
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(SCRIPT_DIR, 'fixtures')
+
+
+def crash_on_marker(path, *args):
+    # Looked up by name in the worker, like batch.process_path
+    if 'crash' in path:
+        os._exit(1)
+    return process_path(path, *args)
+
+
+class TestExpandPaths(unittest.TestCase):
+
+    def test_expand_directory(self):
+        paths = list(expand_paths([os.path.join(FIXTURES_DIR, 'templates', 'dirs')]))
+        self.assertEqual(len(paths), 6)
+        self.assertTrue(all(os.path.isfile(path) for path in paths))
+
+    def test_expand_glob(self):
+        paths = list(expand_paths([os.path.join(FIXTURES_DIR, '*.zip')]))
+        self.assertEqual(set(os.path.basename(path) for path in paths),
+                         {'dirs.zip', 'file.txt.zip'})
+
+    def test_plain_path_passed_through(self):
+        self.assertEqual(list(expand_paths(['missing.zip'])), ['missing.zip'])
+
+
+class TestProcessPath(unittest.TestCase):
+
+    def test_detect(self):
+        result = process_path(os.path.join(FIXTURES_DIR, 'dirs.tar.gz'), 'detect')
+        self.assertEqual(result, BatchResult(os.path.join(FIXTURES_DIR, 'dirs.tar.gz'), True, 'TarFile'))
+
+    def test_list(self):
+        result = process_path(os.path.join(FIXTURES_DIR, 'file.txt.lha'), 'list')
+        self.assertTrue(result.ok)
+        self.assertEqual(result.value, ['file.txt'])
+
+    def test_extract(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            result = process_path(os.path.join(FIXTURES_DIR, 'file.txt.rar'), 'extract', temp_dir)
+            self.assertTrue(result.ok)
+            with open(pathlib.Path(temp_dir, 'file.txt'), 'rb') as file:
+                self.assertEqual(b'Test text\n', file.read())
+
+    def test_not_an_archive(self):
+        result = process_path(os.path.join(FIXTURES_DIR, 'templates', 'file.txt'), 'list')
+        self.assertFalse(result.ok)
+        self.assertEqual(result.error, 'Not a recognised archive')
+
+    def test_missing_file(self):
+        result = process_path('missing.zip', 'list')
+        self.assertFalse(result.ok)
+        self.assertIn('FileNotFoundError', result.error)
+
+
+class TestProcessPaths(unittest.TestCase):
+
+    def test_failures_do_not_stop_batch(self):
+        paths = [os.path.join(FIXTURES_DIR, name) for name in
+                 ['dirs.zip', 'missing.zip', 'dirs.7z', 'templates/file.txt', 'dirs.lha']]
+        results = {result.path: result for result in process_paths(paths, 'list', workers=2)}
+        self.assertEqual(set(results), set(paths))
+        self.assertEqual([results[path].ok for path in paths], [True, False, True, False, True])
+
+    def test_backpressure(self):
+        consumed = []
+
+        def paths():
+            for index in range(20):
+                consumed.append(index)
+                yield os.path.join(FIXTURES_DIR, 'file.txt.zip')
+
+        results = process_paths(paths(), 'detect', workers=1, max_pending=3)
+        next(results)
+        self.assertLessEqual(len(consumed), 3)
+        self.assertEqual(len(list(results)), 19)
+
+    def test_worker_crash_does_not_stop_batch(self):
+        paths = [os.path.join(FIXTURES_DIR, 'file.txt.zip')] * 22
+        paths.insert(5, 'crash.zip')
+        with patch.object(batch, 'process_path', crash_on_marker):
+            results = list(process_paths(paths, 'detect', workers=2))
+        self.assertEqual(len(results), 23)
+        failed = [result for result in results if not result.ok]
+        self.assertEqual([result.path for result in failed], ['crash.zip'])
+        self.assertIn('BrokenProcessPool', failed[0].error)
+
+    def test_extract_gives_each_archive_a_directory(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = []
+            for name in ['x', 'y']:
+                os.mkdir(pathlib.Path(temp_dir, name))
+                paths.append(os.path.join(temp_dir, name, 'file.txt.gz'))
+                with open(paths[-1], 'wb') as file:
+                    file.write(gzip.compress(name.encode()))
+            target = os.path.join(temp_dir, 'out')
+            results = list(process_paths(paths, 'extract', target, workers=2))
+            self.assertTrue(all(result.ok for result in results))
+            for path, name in zip(paths, ['x', 'y']):
+                with open(pathlib.Path(archive_target(target, path), 'file.txt'), 'rb') as file:
+                    self.assertEqual(file.read(), name.encode())
+
+    def test_archive_target(self):
+        self.assertEqual(archive_target('out', os.path.join(os.getcwd(), 'a', 'b.zip')),
+                         os.path.join('out', 'a', 'b.zip'))
+        self.assertEqual(archive_target('out', '/elsewhere/b.zip'),
+                         os.path.join('out', 'elsewhere', 'b.zip'))
+
+
+class TestCli(unittest.TestCase):
+
+    def test_exit_code_reports_failures(self):
+        with redirect_stdout(io.StringIO()) as output:
+            code = sarc.main(['detect', '-w', '1', os.path.join(FIXTURES_DIR, 'dirs.zip')])
+        self.assertEqual(code, 0)
+        self.assertIn('"ZipFile"', output.getvalue())
+        with redirect_stdout(io.StringIO()):
+            code = sarc.main(['list', '-w', '1', 'missing.zip'])
+        self.assertEqual(code, 1)
+
+    def test_hash(self):
+        with redirect_stdout(io.StringIO()) as output:
+            code = sarc.main(['hash', '-w', '1', '-a', 'crc32', '-a', 'sha256',
+                              os.path.join(FIXTURES_DIR, 'file.txt.rar')])
+        self.assertEqual(code, 0)
+        self.assertIn('"crc32": "891bc0e8"', output.getvalue())
+        self.assertIn('"sha256": "66d5b2cc', output.getvalue())
+
+    def test_incremental_extract(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            argv = ['extract', '-w', '1', '--incremental', '-t', temp_dir,
+                    os.path.join(FIXTURES_DIR, 'dirs.zip')]
+            with redirect_stdout(io.StringIO()):
+                sarc.main(argv)
+            with redirect_stdout(io.StringIO()) as output:
+                code = sarc.main(argv)
+        self.assertEqual(code, 0)
+        self.assertIn('"written": 0, "skipped": 6', output.getvalue())
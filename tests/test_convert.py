@@ -0,0 +1,127 @@
+import io
+import os
+import pathlib
+import time
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from unittest.mock import patch
+
+import pyzstd
+import rarfile
+
+from archive import convert as convert_module
+from archive.convert import convert, format_from_path
+from archive.open_archive import open_archive
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(SCRIPT_DIR, 'fixtures')
+
+CONTENTS = {'one.txt': b'one\n', 'two/three.txt': b'three\n', 'two/four/six.txt': b'six\n',
+            'two/four/seven/.keep': b'', 'two/five/eight.txt': b'eight\n',
+            'two/five/nine/ten.txt': b'ten\n'}
+
+
+class TestConvert(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_rar_to_tar_zst(self):
+        dst = pathlib.Path(self.temp_dir.name, 'dirs.tar.zst')
+        with patch.object(convert_module.pyzstd, 'ZstdFile', wraps=pyzstd.ZstdFile) as zstd_file:
+            self.assertEqual(convert(os.path.join(FIXTURES_DIR, 'dirs.rar'), dst, workers=2), 11)
+            option = zstd_file.call_args.kwargs['level_or_option']
+            self.assertEqual(option[pyzstd.CParameter.nbWorkers], 2)
+        with rarfile.RarFile(os.path.join(FIXTURES_DIR, 'dirs.rar')) as source:
+            mtime = int(source.getinfo('one.txt').mtime.timestamp())
+        with pyzstd.ZstdFile(dst) as fileobj, tarfile.open(fileobj=fileobj) as archive_obj:
+            files = {info.name: archive_obj.extractfile(info).read()
+                     for info in archive_obj if info.isreg()}
+            self.assertEqual(files, CONTENTS)
+            self.assertTrue(archive_obj.getmember('two/five').isdir())
+            self.assertEqual(archive_obj.getmember('one.txt').mtime, mtime)
+
+    def test_lha_to_zip(self):
+        dst = pathlib.Path(self.temp_dir.name, 'dirs.zip')
+        convert(os.path.join(FIXTURES_DIR, 'dirs.lha'), dst)
+        with zipfile.ZipFile(dst) as archive_obj:
+            self.assertIsNone(archive_obj.testzip())
+            files = {info.filename: archive_obj.read(info)
+                     for info in archive_obj.infolist() if not info.is_dir()}
+            self.assertEqual(files, CONTENTS)
+            self.assertTrue(archive_obj.getinfo('two/four/').is_dir())
+
+    def test_zip_level_applied(self):
+        src = pathlib.Path(self.temp_dir.name, 'text.tar')
+        with tarfile.open(src, 'w') as archive_obj:
+            data = b''.join(b'line %d of some text\n' % (index % 977) for index in range(50000))
+            info = tarfile.TarInfo('text.txt')
+            info.size = len(data)
+            archive_obj.addfile(info, io.BytesIO(data))
+        sizes = []
+        for level in [1, 9]:
+            dst = pathlib.Path(self.temp_dir.name, '{}.zip'.format(level))
+            convert(src, dst, level=level)
+            with zipfile.ZipFile(dst) as archive_obj:
+                self.assertEqual(archive_obj.read('text.txt'), data)
+            sizes.append(os.path.getsize(dst))
+        self.assertGreater(sizes[0], sizes[1])
+
+    def test_modes_kept(self):
+        src = pathlib.Path(self.temp_dir.name, 'modes.tar')
+        with tarfile.open(src, 'w') as archive_obj:
+            info = tarfile.TarInfo('bin')
+            info.type, info.mode = tarfile.DIRTYPE, 0o700
+            archive_obj.addfile(info)
+            info = tarfile.TarInfo('bin/run.sh')
+            info.mode, info.size = 0o755, 3
+            archive_obj.addfile(info, io.BytesIO(b'ls\n'))
+        tar_dst = pathlib.Path(self.temp_dir.name, 'modes.tar.gz')
+        convert(src, tar_dst)
+        with tarfile.open(tar_dst) as archive_obj:
+            self.assertEqual(archive_obj.getmember('bin').mode, 0o700)
+            self.assertEqual(archive_obj.getmember('bin/run.sh').mode, 0o755)
+        zip_dst = pathlib.Path(self.temp_dir.name, 'modes.zip')
+        convert(tar_dst, zip_dst)
+        with zipfile.ZipFile(zip_dst) as archive_obj:
+            self.assertEqual(archive_obj.getinfo('bin/').external_attr >> 16, 0o40700)
+            self.assertEqual(archive_obj.getinfo('bin/run.sh').external_attr >> 16, 0o100755)
+        with open_archive(zip_dst) as handle:
+            self.assertEqual(handle.wrapper.members.get('bin/run.sh').mode, 0o755)
+
+    def test_unknown_size_member_spooled(self):
+        dst = pathlib.Path(self.temp_dir.name, 'file.tar.gz')
+        convert(os.path.join(FIXTURES_DIR, 'file.txt.gz'), dst)
+        with tarfile.open(dst) as archive_obj:
+            self.assertEqual(archive_obj.extractfile('file.txt').read(), b'Test text\n')
+
+    def test_zip_large_members_spooled(self):
+        src = pathlib.Path(self.temp_dir.name, 'mixed.tar')
+        mtime = 1700000000
+        with tarfile.open(src, 'w') as archive_obj:
+            for index, size in enumerate([10, 5000, 20, 3000]):
+                info = tarfile.TarInfo('{}.txt'.format(index))
+                info.size, info.mode, info.mtime = size, 0o640 + index, mtime
+                archive_obj.addfile(info, io.BytesIO(b'%d' % index * size))
+        dst = pathlib.Path(self.temp_dir.name, 'mixed.zip')
+        with patch.object(convert_module, 'SPOOL_SIZE', 1024):
+            self.assertEqual(convert(src, dst, level=9), 4)
+        with zipfile.ZipFile(dst) as archive_obj:
+            self.assertIsNone(archive_obj.testzip())
+            self.assertEqual(archive_obj.namelist(), ['0.txt', '1.txt', '2.txt', '3.txt'])
+            for index, info in enumerate(archive_obj.infolist()):
+                self.assertEqual(archive_obj.read(info), b'%d' % index * info.file_size)
+                self.assertEqual(info.compress_type, zipfile.ZIP_DEFLATED)
+                self.assertEqual(info.external_attr >> 16, 0o100640 + index)
+                self.assertEqual(info.date_time, time.localtime(mtime)[:6])
+
+    def test_format_from_path(self):
+        self.assertEqual(format_from_path('a/b.TAR.ZST'), 'tar.zst')
+        self.assertEqual(format_from_path('b.tar'), 'tar')
+        with self.assertRaises(ValueError):
+            format_from_path('b.rar')
@@ -0,0 +1,56 @@
+import os
+import zlib
+import hashlib
+import pathlib
+import tempfile
+import unittest
+import zipfile
+from unittest.mock import patch
+
+from archive.hashing import hash_members, stored_crcs
+from archive.wrappers import ArchiveWrapper
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(SCRIPT_DIR, 'fixtures')
+
+
+class TestHashMembers(unittest.TestCase):
+
+    def test_formats_agree(self):
+        expected = hash_members(os.path.join(FIXTURES_DIR, 'dirs.zip'), ['sha256', 'crc32'])
+        self.assertEqual(expected['one.txt'], {'sha256': hashlib.sha256(b'one\n').hexdigest(),
+                                               'crc32': '{:08x}'.format(zlib.crc32(b'one\n'))})
+        for name in ['dirs.tar.gz', 'dirs.7z', 'dirs.rar', 'dirs.lha']:
+            with self.subTest(name=name):
+                manifest = hash_members(os.path.join(FIXTURES_DIR, name), ['sha256', 'crc32'])
+                self.assertEqual(manifest, expected)
+
+    def test_crc_only_uses_stored_crcs(self):
+        for name in ['dirs.zip', 'dirs.rar']:
+            with self.subTest(name=name), \
+                 patch.object(ArchiveWrapper, 'iter_members') as iter_members:
+                manifest = hash_members(os.path.join(FIXTURES_DIR, name), ['crc32'])
+                iter_members.assert_not_called()
+                self.assertEqual(manifest['two/three.txt'],
+                                 {'crc32': '{:08x}'.format(zlib.crc32(b'three\n'))})
+
+    def test_stored_crcs_other_formats(self):
+        self.assertIsNone(stored_crcs(object()))
+
+    def test_many_members_in_parallel(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = pathlib.Path(temp_dir, 'many.zip')
+            contents = {}
+            with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive_obj:
+                for index in range(40):
+                    data = os.urandom(1024) * (index + 1) * 10
+                    contents['{}.bin'.format(index)] = data
+                    archive_obj.writestr('{}.bin'.format(index), data)
+            manifest = hash_members(path, ['blake2b'], workers=4)
+        self.assertEqual(list(manifest), list(contents))
+        for name, data in contents.items():
+            self.assertEqual(manifest[name]['blake2b'], hashlib.blake2b(data).hexdigest())
+
+    def test_unknown_algorithm(self):
+        with self.assertRaises(ValueError):
+            hash_members(os.path.join(FIXTURES_DIR, 'dirs.zip'), ['md4'])
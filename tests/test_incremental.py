@@ -0,0 +1,113 @@
+import os
+import json
+import pathlib
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from archive import incremental
+from archive.incremental import JOURNAL_NAME, extract_incremental
+from archive.open_archive import open_archive
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(SCRIPT_DIR, 'fixtures')
+
+
+class TestExtractIncremental(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _sync(self, name, target=None, **kwargs):
+        with open_archive(pathlib.Path(FIXTURES_DIR, name)) as handle:
+            return extract_incremental(handle.wrapper, target or self.temp_dir.name, **kwargs)
+
+    def test_second_run_skips_everything(self):
+        for name in ['dirs.zip', 'dirs.7z', 'dirs.rar', 'dirs.lha', 'dirs.tar.gz']:
+            with self.subTest(name=name):
+                target = pathlib.Path(self.temp_dir.name, name)
+                first = self._sync(name, target)
+                self.assertEqual(len(first.written), 6)
+                with patch.object(incremental, 'file_crc32') as file_crc32:
+                    second = self._sync(name, target)
+                    file_crc32.assert_not_called()
+                self.assertEqual(second.written, [])
+                self.assertEqual(sorted(second.skipped), sorted(first.written))
+                with open(pathlib.Path(target, 'dirs', 'two', 'three.txt'), 'rb') as file:
+                    self.assertEqual(file.read(), b'three\n')
+
+    def test_single_file_second_run_skips(self):
+        for name in ['file.txt.gz', 'file.txt.xz', 'file.txt.bz2']:
+            with self.subTest(name=name):
+                target = pathlib.Path(self.temp_dir.name, name)
+                self.assertEqual(self._sync(name, target).written, ['file.txt'])
+                with patch.object(incremental, 'file_crc32') as file_crc32:
+                    second = self._sync(name, target)
+                    file_crc32.assert_not_called()
+                self.assertEqual(second.skipped, ['file.txt'])
+
+    def test_gzip_same_size_change_caught_by_trailer_crc(self):
+        self._sync('file.txt.gz', journal=False)
+        path = pathlib.Path(self.temp_dir.name, 'file.txt')
+        with open(path, 'rb') as file:
+            data = file.read()
+        with open(path, 'wb') as file:
+            file.write(data.upper())
+        self.assertEqual(self._sync('file.txt.gz', journal=False).written, ['file.txt'])
+        with open(path, 'rb') as file:
+            self.assertEqual(file.read(), data)
+
+    def test_xz_size_change_rewritten(self):
+        self._sync('file.txt.xz', journal=False)
+        self.assertEqual(self._sync('file.txt.xz', journal=False).skipped, ['file.txt'])
+        with open(pathlib.Path(self.temp_dir.name, 'file.txt'), 'ab') as file:
+            file.write(b'more\n')
+        self.assertEqual(self._sync('file.txt.xz', journal=False).written, ['file.txt'])
+
+    def test_bzip2_without_journal_rewritten(self):
+        self._sync('file.txt.bz2', journal=False)
+        self.assertEqual(self._sync('file.txt.bz2', journal=False).written, ['file.txt'])
+
+    def test_same_size_change_caught_by_crc(self):
+        self._sync('dirs.zip', journal=False)
+        path = pathlib.Path(self.temp_dir.name, 'dirs', 'two', 'three.txt')
+        stat = path.stat()
+        with open(path, 'wb') as file:
+            file.write(b'THREE\n')
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        result = self._sync('dirs.zip', journal=False)
+        self.assertEqual(result.written, ['two/three.txt'])
+        with open(path, 'rb') as file:
+            self.assertEqual(file.read(), b'three\n')
+
+    def test_size_change_rewritten_without_crc(self):
+        self._sync('dirs.lha')
+        path = pathlib.Path(self.temp_dir.name, 'dirs', 'one.txt')
+        with open(path, 'wb') as file:
+            file.write(b'changed\n')
+        self.assertEqual(self._sync('dirs.lha').written, ['one.txt'])
+
+    def test_interrupted_run_resumes(self):
+        copy_stream = incremental.copy_stream
+        calls = []
+
+        def failing_copy(source, target):
+            if len(calls) == 3:
+                raise OSError('disk went away')
+            calls.append(source)
+            return copy_stream(source, target)
+
+        with patch.object(incremental, 'copy_stream', failing_copy):
+            with self.assertRaises(OSError):
+                self._sync('dirs.7z')
+        with open(pathlib.Path(self.temp_dir.name, JOURNAL_NAME)) as file:
+            self.assertEqual(len([json.loads(line) for line in file]), 3)
+        leftovers = [file for _, __, files in os.walk(self.temp_dir.name)
+                     for file in files if file.endswith(incremental.PART_SUFFIX)]
+        self.assertEqual(leftovers, [])
+        result = self._sync('dirs.7z')
+        self.assertEqual(len(result.written), 3)
+        self.assertEqual(len(result.skipped), 3)
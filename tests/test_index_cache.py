@@ -0,0 +1,102 @@
+import io
+import os
+import shutil
+import pathlib
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from unittest.mock import patch
+
+from archive.index_cache import IndexCache, fingerprint
+from archive.batch import process_path
+from archive.wrappers import TarArchiveWrapper, wrap_archive
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(SCRIPT_DIR, 'fixtures')
+
+
+class TestFingerprint(unittest.TestCase):
+
+    def test_changes_with_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            copy = pathlib.Path(temp_dir, 'copy.zip')
+            shutil.copy(os.path.join(FIXTURES_DIR, 'dirs.zip'), copy)
+            first = fingerprint(copy)
+            self.assertEqual(fingerprint(copy), first)
+            with open(copy, 'r+b') as fileobj:
+                fileobj.seek(-1, os.SEEK_END)
+                fileobj.write(b'!')
+            os.utime(copy, ns=(0, 0))
+            self.assertNotEqual(fingerprint(copy), first)
+
+
+class TestIndexCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = IndexCache(pathlib.Path(self.temp_dir.name, 'index.sqlite'))
+
+    def tearDown(self):
+        self.cache.close()
+        self.temp_dir.cleanup()
+
+    def _tar_wrapper(self, path):
+        archive_obj = tarfile.open(path)
+        self.addCleanup(archive_obj.close)
+        return wrap_archive(archive_obj, path, self.cache)
+
+    def test_tar_listed_and_read_without_scan(self):
+        for name in ['dirs.tar', 'dirs.tar.gz']:
+            path = pathlib.Path(FIXTURES_DIR, name)
+            names = self._tar_wrapper(path).list()
+            wrapper = self._tar_wrapper(path)
+            with patch.object(tarfile.TarFile, 'getmembers',
+                              side_effect=AssertionError('scanned')):
+                self.assertEqual(wrapper.list(), names)
+                self.assertEqual(wrapper.open_by_name('one.txt')['one.txt'].read(), b'one\n')
+                self.assertEqual(
+                    wrapper.open_by_name('two/five/nine/ten.txt')['two/five/nine/ten.txt'].read(),
+                    b'ten\n')
+
+    def test_same_size_edit_in_middle(self):
+        path = pathlib.Path(self.temp_dir.name, 'edited.tar')
+
+        def build(name):
+            with tarfile.open(path, 'w') as archive_obj:
+                for member, data in [('a.bin', bytes(256 * 1024)), (name, b'text\n'),
+                                     ('z.bin', bytes(256 * 1024))]:
+                    info = tarfile.TarInfo(member)
+                    info.size = len(data)
+                    archive_obj.addfile(info, io.BytesIO(data))
+
+        build('old.txt')
+        size = path.stat().st_size
+        self.assertIn('old.txt', self._tar_wrapper(path).list())
+        build('new.txt')
+        # Pin a distinct mtime, as a later write would have on any filesystem
+        os.utime(path, ns=(0, 0))
+        self.assertEqual(path.stat().st_size, size)
+        wrapper = self._tar_wrapper(path)
+        self.assertEqual(wrapper.list(), ['a.bin', 'new.txt', 'z.bin'])
+        self.assertEqual(wrapper.open_by_name('new.txt')['new.txt'].read(), b'text\n')
+
+    def test_zip_members_cached(self):
+        path = pathlib.Path(FIXTURES_DIR, 'dirs.zip')
+        with zipfile.ZipFile(path) as archive_obj:
+            members = list(wrap_archive(archive_obj, path, self.cache).members)
+        with zipfile.ZipFile(path) as archive_obj:
+            wrapper = wrap_archive(archive_obj, path, self.cache)
+            with patch.object(type(wrapper), '_build_members') as build:
+                self.assertEqual(list(wrapper.members), members)
+                build.assert_not_called()
+
+    def test_batch_list_uses_cache(self):
+        cache_path = str(pathlib.Path(self.temp_dir.name, 'batch.sqlite'))
+        path = os.path.join(FIXTURES_DIR, 'dirs.tar.bz2')
+        first = process_path(path, 'list', index_cache=cache_path)
+        with patch.object(TarArchiveWrapper, '_build_members') as build:
+            second = process_path(path, 'list', index_cache=cache_path)
+            build.assert_not_called()
+        self.assertTrue(first.ok)
+        self.assertEqual(first, second)
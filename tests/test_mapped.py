@@ -0,0 +1,118 @@
+import io
+import os
+import pathlib
+import tempfile
+import unittest
+from zipfile import ZipFile, ZIP_STORED, ZIP_DEFLATED
+from tarfile import TarFile
+
+from archive.mapped import MappedFile, MemoryReader, open_mapped
+from archive.open_archive import open_archive
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(SCRIPT_DIR, 'fixtures')
+
+
+class TestMappedFile(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.temp_dir.name, 'data.bin')
+        self.path.write_bytes(bytes(range(256)) * 4)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_read_and_seek(self):
+        with MappedFile(self.path) as fileobj:
+            self.assertEqual(fileobj.read(4), b'\x00\x01\x02\x03')
+            self.assertEqual(fileobj.seek(-2, io.SEEK_END), 1022)
+            self.assertEqual(fileobj.read(10), b'\xfe\xff')
+            self.assertEqual(fileobj.read(), b'')
+            fileobj.seek(2000)
+            self.assertEqual(fileobj.read(), b'')
+            fileobj.seek(256, io.SEEK_SET)
+            fileobj.seek(1, io.SEEK_CUR)
+            self.assertEqual(fileobj.peek(2), b'\x01\x02')
+            self.assertEqual(fileobj.tell(), 257)
+
+    def test_readinto(self):
+        with MappedFile(self.path) as fileobj:
+            buffer = bytearray(3)
+            fileobj.seek(1023)
+            self.assertEqual(fileobj.readinto(buffer), 1)
+            self.assertEqual(buffer, b'\xff\x00\x00')
+            fileobj.seek(10)
+            self.assertEqual(fileobj.readinto(buffer), 3)
+            self.assertEqual(buffer, b'\x0a\x0b\x0c')
+
+    def test_empty_file_falls_back(self):
+        path = pathlib.Path(self.temp_dir.name, 'empty')
+        path.touch()
+        with open_mapped(path) as fileobj:
+            self.assertNotIsInstance(fileobj, MappedFile)
+            self.assertEqual(fileobj.read(), b'')
+
+
+class TestOpenArchiveMapped(unittest.TestCase):
+
+    def test_open_zip(self):
+        path = pathlib.Path(FIXTURES_DIR, 'dirs.zip')
+        with open_archive(path, use_mmap=True) as handle:  # type: ignore
+            self.assertIsInstance(handle.archive_obj, ZipFile)
+
+    def test_open_tar_gz(self):
+        path = pathlib.Path(FIXTURES_DIR, 'dirs.tar.gz')
+        with open_archive(path, use_mmap=True) as handle:  # type: ignore
+            self.assertIsInstance(handle.archive_obj, TarFile)
+            self.assertIn('one.txt', handle.wrapper.list())
+
+
+class TestStoredMembers(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.temp_dir.name, 'mixed.zip')
+        self.data = os.urandom(200 * 1024)
+        with ZipFile(self.path, 'w') as archive_obj:
+            archive_obj.writestr('stored.bin', self.data, ZIP_STORED)
+            archive_obj.writestr('deflated.bin', self.data, ZIP_DEFLATED)
+            archive_obj.writestr('dir/', b'')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_stored_member_read_from_mapping(self):
+        with open_archive(self.path, use_mmap=True) as handle:  # type: ignore
+            stream = handle.wrapper.open_by_name('stored.bin')['stored.bin']
+            self.assertIsInstance(stream, MemoryReader)
+            with stream:
+                self.assertEqual(stream.read(10), self.data[:10])
+                view = stream.read_view(5)
+                self.assertIsInstance(view, memoryview)
+                self.assertEqual(view, self.data[10:15])
+                view.release()
+                buffer = bytearray(4)
+                self.assertEqual(stream.readinto(buffer), 4)
+                self.assertEqual(buffer, self.data[15:19])
+                self.assertEqual(stream.read(), self.data[19:])
+
+    def test_other_members_decompressed(self):
+        with open_archive(self.path, use_mmap=True) as handle:  # type: ignore
+            stream = handle.wrapper.open_by_name('deflated.bin')['deflated.bin']
+            self.assertNotIsInstance(stream, MemoryReader)
+            with stream:
+                self.assertEqual(stream.read(), self.data)
+            self.assertIsNone(handle.wrapper.open_by_name('dir/')['dir/'])
+        with open_archive(self.path) as handle:  # type: ignore
+            with handle.wrapper.open_by_name('stored.bin')['stored.bin'] as stream:
+                self.assertNotIsInstance(stream, MemoryReader)
+
+    def test_extract(self):
+        for writers in (0, 2):
+            with self.subTest(writers=writers):
+                target = pathlib.Path(self.temp_dir.name, str(writers))
+                with open_archive(self.path, use_mmap=True) as handle:  # type: ignore
+                    handle.wrapper.extract_to(target, writers=writers)
+                for name in ('stored.bin', 'deflated.bin'):
+                    self.assertEqual(pathlib.Path(target, 'mixed', name).read_bytes(), self.data)
@@ -0,0 +1,51 @@
+import unittest
+
+from archive.members import MemberTable, MemberInfo, MemberFilter, UNKNOWN
+
+
+class TestMemberTable(unittest.TestCase):
+
+    def setUp(self):
+        self.table = MemberTable()
+        self.table.append('one.txt', 4, 2, False, 512, 1692403076.0)
+        self.table.append('two/', 0, 0, True)
+        self.table.append('two/three.txt')
+
+    def test_lookup(self):
+        self.assertEqual(len(self.table), 3)
+        self.assertIn('two/', self.table)
+        self.assertNotIn('two', self.table)
+        self.assertEqual(self.table.index['two/three.txt'], 2)
+        self.assertEqual(self.table.get('one.txt'), MemberInfo('one.txt', 4, 2, False, 512, 1692403076.0))
+        self.assertIsNone(self.table.get('missing'))
+
+    def test_unknown_values(self):
+        self.assertEqual(self.table.get('two/three.txt'),
+                         MemberInfo('two/three.txt', UNKNOWN, UNKNOWN, False, UNKNOWN, UNKNOWN))
+
+    def test_iter(self):
+        self.assertEqual([info.name for info in self.table], ['one.txt', 'two/', 'two/three.txt'])
+        self.assertEqual([info.is_dir for info in self.table], [False, True, False])
+
+    def test_dict_round_trip(self):
+        table = MemberTable.from_dict(self.table.to_dict())
+        self.assertEqual(list(table), list(self.table))
+        self.assertEqual(table.index, self.table.index)
+
+
+class TestMemberFilter(unittest.TestCase):
+
+    def test_patterns(self):
+        member_filter = MemberFilter(include=['*.txt', 'two/'], exclude=['two/five/*'])
+        self.assertIsNone(member_filter.targets)
+        self.assertTrue(member_filter(MemberInfo('a/b/c.txt', 1, 1, False, 0)))
+        self.assertTrue(member_filter(MemberInfo('two/', 0, 0, True, 0)))
+        self.assertFalse(member_filter(MemberInfo('two/five/six.txt', 1, 1, False, 0)))
+        self.assertFalse(member_filter(MemberInfo('a.json', 1, 1, False, 0)))
+
+    def test_exact_names_are_targets(self):
+        member_filter = MemberFilter(include=['a.txt', 'b/c.txt'], predicate=lambda info: info.size < 10)
+        self.assertEqual(member_filter.targets, {'a.txt', 'b/c.txt'})
+        self.assertTrue(member_filter(MemberInfo('a.txt', 1, 1, False, 0)))
+        self.assertFalse(member_filter(MemberInfo('a.txt', 100, 1, False, 0)))
+        self.assertFalse(member_filter(MemberInfo('c.txt', 1, 1, False, 0)))
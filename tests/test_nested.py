@@ -0,0 +1,82 @@
+import io
+import os
+import gzip
+import pathlib
+import tarfile
+import tempfile
+import unittest
+import zipfile
+
+from archive.batch import process_path
+from archive.nested import NestedLimitError, iter_nested, list_nested, extract_nested
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(SCRIPT_DIR, 'fixtures')
+
+
+def add_tar_member(archive_obj, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    archive_obj.addfile(info, io.BytesIO(data))
+
+
+class TestNested(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        # A zip holding other archives, inside a tar, inside gzip
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, 'w') as archive_obj:
+            archive_obj.writestr('inner/a.txt', 'hello')
+            for name in ['dirs.7z', 'file.txt.lha', 'file.txt.gz']:
+                archive_obj.write(os.path.join(FIXTURES_DIR, name), 'arch/{}'.format(name))
+        tar_buffer = io.BytesIO()
+        with tarfile.open(fileobj=tar_buffer, mode='w') as archive_obj:
+            add_tar_member(archive_obj, 'pkg/data.zip', zip_buffer.getvalue())
+            add_tar_member(archive_obj, 'pkg/readme', b'plain')
+        self.path = pathlib.Path(self.temp_dir.name, 'outer.tar.gz')
+        self.path.write_bytes(gzip.compress(tar_buffer.getvalue()))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_iter_nested(self):
+        contents = {name: None if stream is None else stream.read()
+                    for name, _, stream in iter_nested(self.path)}
+        self.assertEqual(contents['pkg/data.zip/inner/a.txt'], b'hello')
+        self.assertEqual(contents['pkg/data.zip/arch/dirs.7z/two/five/nine/ten.txt'], b'ten\n')
+        self.assertEqual(contents['pkg/data.zip/arch/file.txt.lha/file.txt'], b'Test text\n')
+        self.assertEqual(contents['pkg/data.zip/arch/file.txt.gz/file.txt'], b'Test text\n')
+        self.assertEqual(contents['pkg/readme'], b'plain')
+        self.assertIsNone(contents['pkg/data.zip/arch/dirs.7z/two/'])
+
+    def test_max_depth(self):
+        names = list_nested(self.path, max_depth=1)
+        self.assertEqual(names, ['pkg/data.zip', 'pkg/readme'])
+
+    def test_spooled_to_disk(self):
+        names = list_nested(self.path, spool_size=16)
+        self.assertIn('pkg/data.zip/arch/file.txt.lha/file.txt', names)
+
+    def test_expansion_limit(self):
+        path = pathlib.Path(self.temp_dir.name, 'bomb.zip')
+        inner = gzip.compress(b'x' * 8 * 2**20)
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive_obj:
+            archive_obj.writestr('zeros.gz', inner)
+        with self.assertRaises(NestedLimitError):
+            for _, _, stream in iter_nested(path, max_ratio=100):
+                if stream is not None:
+                    stream.read()
+
+    def test_extract_nested(self):
+        target = pathlib.Path(self.temp_dir.name, 'out')
+        extract_nested(self.path, target)
+        self.assertEqual(pathlib.Path(target, 'pkg', 'data.zip', 'arch', 'dirs.7z', 'one.txt')
+                         .read_bytes(), b'one\n')
+        self.assertTrue(pathlib.Path(target, 'pkg', 'data.zip', 'arch', 'dirs.7z', 'two',
+                                     'four', 'seven').is_dir())
+
+    def test_batch_nested_list(self):
+        result = process_path(str(self.path), 'list', nested=True)
+        self.assertTrue(result.ok)
+        self.assertIn('pkg/data.zip/inner/a.txt', result.value)
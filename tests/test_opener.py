@@ -1,6 +1,10 @@
 import os
 import pathlib
+import shutil
+import tempfile
+import threading
 import unittest
+from unittest.mock import patch
 from zipfile import ZipFile
 from tarfile import TarFile
 from gzip import GzipFile
@@ -12,6 +16,7 @@ from rarfile import RarFile
 from lhafile import LhaFile
 
 from archive import open_archive
+from archive.wrappers import SevenZMemberReader, wrap_archive
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 FIXTURES_DIR = os.path.join(SCRIPT_DIR, 'fixtures')
@@ -152,6 +157,44 @@ class TestopenerArchiveSpecificFuncs(unittest.TestCase):
             value = open_archive.open_as_tar_7z(fileobj)
             self.assertIsNone(value)
 
+    def test_open_as_tar_7z_sniffs_header_only(self):
+        decompressed = []
+
+        def counting_next(reader, size):
+            data = next_block(reader, size)
+            decompressed.append(len(data))
+            return data
+
+        next_block = SevenZMemberReader._next
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = pathlib.Path(temp_dir, 'big.txt.7z')
+            with SevenZipFile(path, 'w') as archive:
+                archive.writestr(b''.join(b'line %d\n' % index for index in range(300000)), 'big.txt')
+            with open(path, 'rb') as fileobj, \
+                 patch.object(SevenZMemberReader, '_next', counting_next):
+                self.assertIsNone(open_archive.open_as_tar_7z(fileobj))
+        self.assertLess(sum(decompressed), 1024 * 1024)
+
+    def test_open_as_tar_7z_streams_members(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            tar_path = pathlib.Path(temp_dir, 'many.tar')
+            contents = {}
+            with TarFile.open(tar_path, 'w') as tar:
+                for index in range(50):
+                    data = b'member %d\n' % index * 2000
+                    contents['{}.txt'.format(index)] = data
+                    with open(pathlib.Path(temp_dir, '{}.txt'.format(index)), 'wb') as member:
+                        member.write(data)
+                    tar.add(pathlib.Path(temp_dir, '{}.txt'.format(index)), '{}.txt'.format(index))
+            path = pathlib.Path(temp_dir, 'many.tar.7z')
+            with SevenZipFile(path, 'w') as archive:
+                archive.write(tar_path, 'many.tar')
+            with open(path, 'rb') as fileobj:
+                tar = open_archive.open_as_tar_7z(fileobj)
+                # Backwards after forwards restarts the folder
+                for name in ['49.txt', '3.txt', '20.txt']:
+                    self.assertEqual(tar.extractfile(name).read(), contents[name])
+
     # rar
     def test_open_as_rar_with_rar_file(self):
         with open(os.path.join(FIXTURES_DIR, 'file.txt.rar'), 'rb') as fileobj:
@@ -178,4 +221,144 @@ class TestOpenerGeneralFuncs(unittest.TestCase):
 
     def test_open_with_zip_file(self):
         path = pathlib.Path(os.path.join(FIXTURES_DIR, 'file.txt.zip'))
-        self.assertIsInstance(open_archive.open_archive(path), ZipFile)
+        with open_archive.open_archive(path) as handle:  # type: ignore
+            self.assertIsInstance(handle.archive_obj, ZipFile)
+
+    def test_open_with_misnamed_lha_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = pathlib.Path(temp_dir, 'file.bin')
+            shutil.copy(os.path.join(FIXTURES_DIR, 'file.txt.lha'), path)
+            with open_archive.open_archive(path) as handle:  # type: ignore
+                self.assertIsInstance(handle.archive_obj, LhaFile)
+
+    def test_open_with_misnamed_tar_gz_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = pathlib.Path(temp_dir, 'file.zip')
+            shutil.copy(os.path.join(FIXTURES_DIR, 'file.tar.gz'), path)
+            with open_archive.open_archive(path) as handle:  # type: ignore
+                self.assertIsInstance(handle.archive_obj, TarFile)
+
+    def test_open_with_unrecognised_header_probes(self):
+        path = pathlib.Path(os.path.join(FIXTURES_DIR, 'file.txt.zip'))
+        with patch.object(open_archive, 'get_open_funcs_by_signature',
+                          return_value=[]), \
+             patch.object(open_archive, 'open_by_probing',
+                          wraps=open_archive.open_by_probing) as probe:
+            with open_archive.open_archive(path) as handle:  # type: ignore
+                self.assertIsInstance(handle.archive_obj, ZipFile)
+            probe.assert_called_once()
+
+    def test_open_non_archive_returns_none(self):
+        path = pathlib.Path(os.path.join(FIXTURES_DIR, 'templates', 'file.txt'))
+        self.assertIsNone(open_archive.open_archive(path))
+
+
+class TestArchiveHandle(unittest.TestCase):
+
+    def test_lazy_tar_usable_after_return(self):
+        path = pathlib.Path(os.path.join(FIXTURES_DIR, 'dirs.tar.gz'))
+        handle = open_archive.open_archive(path)
+        self.assertFalse(handle.closed)  # type: ignore
+        self.assertIn('one.txt', handle.wrapper.list())  # type: ignore
+        self.assertEqual(handle.wrapper.open_by_name('one.txt')['one.txt'].read(),  # type: ignore
+                         b'one\n')
+        handle.close()  # type: ignore
+        self.assertTrue(handle.closed)  # type: ignore
+        handle.close()  # type: ignore
+
+    def test_context_manager_closes_file(self):
+        path = pathlib.Path(os.path.join(FIXTURES_DIR, 'file.txt.lha'))
+        with open_archive.open_archive(path) as handle:  # type: ignore
+            self.assertEqual(handle.wrapper.list(), ['file.txt'])
+        self.assertTrue(handle.fileobj.closed)
+        with self.assertRaises(ValueError):
+            _ = handle.wrapper
+
+    def test_mapped_handle(self):
+        path = pathlib.Path(os.path.join(FIXTURES_DIR, 'dirs.zip'))
+        with open_archive.open_archive(path, use_mmap=True) as handle:  # type: ignore
+            self.assertEqual(handle.wrapper.open_by_name('one.txt')['one.txt'].read(), b'one\n')
+        self.assertTrue(handle.closed)
+
+
+class TestOpenStream(unittest.TestCase):
+
+    def _pipe(self, name):
+        read_fd, write_fd = os.pipe()
+        with open(os.path.join(FIXTURES_DIR, name), 'rb') as fileobj:
+            data = fileobj.read()
+
+        def write():
+            with os.fdopen(write_fd, 'wb') as pipe:
+                pipe.write(data)
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        self.addCleanup(writer.join)
+        reader = os.fdopen(read_fd, 'rb')
+        self.addCleanup(reader.close)
+        return reader
+
+    def test_stream_tars(self):
+        for name in ['dirs.tar', 'dirs.tar.gz', 'dirs.tar.bz2', 'dirs.tar.xz']:
+            with self.subTest(name=name):
+                archive_obj = open_archive.open_stream(self._pipe(name))
+                self.assertIsInstance(archive_obj, TarFile)
+                wrapper = wrap_archive(archive_obj, pathlib.Path(name))  # type: ignore
+                contents = {info.name: stream.read() for info, stream in wrapper.iter_members()
+                            if stream is not None}
+                self.assertEqual(contents['two/five/nine/ten.txt'], b'ten\n')
+
+    def test_stream_compressed_file(self):
+        archive_obj = open_archive.open_stream(self._pipe('file.txt.xz'))
+        self.assertIsInstance(archive_obj, LZMAFile)
+        wrapper = wrap_archive(archive_obj, pathlib.Path('file.txt.xz'))  # type: ignore
+        self.assertEqual([(info.name, stream.read()) for info, stream in wrapper.iter_members()],
+                         [('file.txt', b'Test text\n')])
+
+    def test_stream_zip_unsupported(self):
+        self.assertIsNone(open_archive.open_stream(self._pipe('dirs.zip')))
+
+
+class TestOpenerSignatureFuncs(unittest.TestCase):
+
+    def _sniff(self, name):
+        with open(os.path.join(FIXTURES_DIR, name), 'rb') as fileobj:
+            header = fileobj.read(open_archive.SNIFF_SIZE)
+        return open_archive.get_open_funcs_by_signature(header)
+
+    def test_signature_zip(self):
+        self.assertEqual(self._sniff('dirs.zip'), [open_archive.open_as_zip])
+
+    def test_signature_7z(self):
+        self.assertEqual(self._sniff('dirs.7z'),
+                         [open_archive.open_as_tar_7z, open_archive.open_as_7z])
+
+    def test_signature_rar(self):
+        self.assertEqual(self._sniff('dirs.rar'), [open_archive.open_as_rar])
+
+    def test_signature_rar5(self):
+        header = b'Rar!\x1a\x07\x01\x00' + bytes(24)
+        self.assertEqual(open_archive.get_open_funcs_by_signature(header),
+                         [open_archive.open_as_rar])
+
+    def test_signature_gzip(self):
+        self.assertEqual(self._sniff('file.txt.gz'),
+                         [open_archive.open_as_tar, open_archive.open_as_gzip])
+
+    def test_signature_bz2(self):
+        self.assertEqual(self._sniff('file.txt.bz2'),
+                         [open_archive.open_as_tar, open_archive.open_as_bz2])
+
+    def test_signature_xz(self):
+        self.assertEqual(self._sniff('file.txt.xz'),
+                         [open_archive.open_as_tar, open_archive.open_as_lzma])
+
+    def test_signature_lha(self):
+        self.assertEqual(self._sniff('dirs.lha'), [open_archive.open_as_lha])
+
+    def test_signature_ustar(self):
+        self.assertEqual(self._sniff('dirs.tar'), [open_archive.open_as_tar])
+
+    def test_signature_unknown(self):
+        self.assertEqual(self._sniff('templates/file.txt'), [])
@@ -0,0 +1,112 @@
+import os
+import pathlib
+import tempfile
+import unittest
+import zipfile
+
+import py7zr
+
+from archive.parallel import split_by_size
+from archive.wrappers import ZipArchiveWrapper, SevenZArchiveWrapper
+
+
+def tree(root):
+    contents = {}
+    for dirpath, dirs, files in os.walk(root):
+        for name in dirs:
+            path = pathlib.Path(dirpath, name)
+            contents[str(path.relative_to(root))] = (None, None)
+        for name in files:
+            path = pathlib.Path(dirpath, name)
+            contents[str(path.relative_to(root))] = (path.read_bytes(), int(path.stat().st_mtime))
+    return contents
+
+
+class TestSplitBySize(unittest.TestCase):
+
+    def test_split_by_size_balances_bytes(self):
+        sizes = {'a': 100, 'b': 60, 'c': 40, 'd': 30, 'e': 30}
+        groups = split_by_size(sizes, 2)
+        loads = sorted(sum(sizes[key] for key in group) for group in groups)
+        self.assertEqual(loads, [130, 130])
+        self.assertEqual(sorted(key for group in groups for key in group), sorted(sizes))
+
+    def test_split_by_size_drops_empty_groups(self):
+        self.assertEqual(split_by_size({'a': 1}, 4), [['a']])
+
+
+class TestParallelExtract(unittest.TestCase):
+
+    def _compare(self, make_wrapper, compare_mtimes):
+        with tempfile.TemporaryDirectory() as serial_dir, \
+             tempfile.TemporaryDirectory() as parallel_dir:
+            with make_wrapper() as wrapper:
+                wrapper.extract_to(serial_dir)
+            with make_wrapper() as wrapper:
+                wrapper.extract_to(parallel_dir, workers=4)
+            serial, parallel = tree(serial_dir), tree(parallel_dir)
+            if not compare_mtimes:
+                serial = {key: value[0] for key, value in serial.items()}
+                parallel = {key: value[0] for key, value in parallel.items()}
+            self.assertGreater(len(serial), 40)
+            self.assertEqual(serial, parallel)
+
+    def test_zip_parallel_matches_serial(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = pathlib.Path(temp_dir, 'many.zip')
+            with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive_obj:
+                archive_obj.writestr('top/', '')
+                for index in range(40):
+                    archive_obj.writestr('top/{}/{}.txt'.format(index % 5, index),
+                                         'member {}\n'.format(index) * index)
+
+            class Wrapper:
+                def __enter__(self):
+                    self.archive_obj = zipfile.ZipFile(path)
+                    return ZipArchiveWrapper(self.archive_obj, path)
+
+                def __exit__(self, *args):
+                    self.archive_obj.close()
+
+            self._compare(Wrapper, compare_mtimes=False)
+
+    def test_7z_parallel_matches_serial(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = pathlib.Path(temp_dir, 'many.7z')
+            # Each append session writes a separate folder
+            for batch in range(4):
+                with py7zr.SevenZipFile(path, 'a' if batch else 'w') as archive_obj:
+                    for index in range(batch * 10, batch * 10 + 10):
+                        archive_obj.writestr('member {}\n'.format(index) * (index + 1),
+                                             'top/{}/{}.txt'.format(batch, index))
+            with py7zr.SevenZipFile(path) as archive_obj:
+                self.assertEqual(archive_obj.header.main_streams.unpackinfo.numfolders, 4)
+
+            class Wrapper:
+                def __enter__(self):
+                    self.archive_obj = py7zr.SevenZipFile(path)
+                    return SevenZArchiveWrapper(self.archive_obj, path)
+
+                def __exit__(self, *args):
+                    self.archive_obj.close()
+
+            self._compare(Wrapper, compare_mtimes=True)
+
+    def test_7z_parallel_filtered(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source = pathlib.Path(temp_dir, 'source')
+            path = pathlib.Path(temp_dir, 'dirs.7z')
+            for batch in range(3):
+                pathlib.Path(source, 'b{}'.format(batch), 'sub').mkdir(parents=True)
+                with py7zr.SevenZipFile(path, 'a' if batch else 'w') as archive_obj:
+                    archive_obj.write(pathlib.Path(source, 'b{}'.format(batch)), 'b{}'.format(batch))
+                    archive_obj.write(pathlib.Path(source, 'b{}'.format(batch), 'sub'),
+                                      'b{}/sub'.format(batch))
+                    archive_obj.writestr('batch {}\n'.format(batch), 'b{}/sub/f.txt'.format(batch))
+            target = pathlib.Path(temp_dir, 'out')
+            with py7zr.SevenZipFile(path) as archive_obj:
+                self.assertEqual(archive_obj.header.main_streams.unpackinfo.numfolders, 3)
+                wrapper = SevenZArchiveWrapper(archive_obj, path)
+                wrapper.extract_to(target, workers=4, include=['b0/sub/f.txt', 'b2/sub/f.txt'])
+            self.assertEqual(sorted(key for key, value in tree(target).items() if value[0]),
+                             ['dirs/b0/sub/f.txt', 'dirs/b2/sub/f.txt'])
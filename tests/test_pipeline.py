@@ -0,0 +1,78 @@
+import io
+import os
+import pathlib
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from archive import pipeline
+from archive.pipeline import PipelinedWriter
+
+
+class TestPipelinedWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_files_written_in_full(self):
+        contents = {'a/{}.bin'.format(index): os.urandom(1000 * index) for index in range(20)}
+        with PipelinedWriter(workers=3, max_pending=4, chunk_size=777) as writer:
+            for name, data in contents.items():
+                writer.write_stream(pathlib.Path(self.temp_dir.name, name), io.BytesIO(data),
+                                    len(data), mtime=1000000000, mode=0o600)
+        for name, data in contents.items():
+            path = pathlib.Path(self.temp_dir.name, name)
+            with open(path, 'rb') as file:
+                self.assertEqual(file.read(), data)
+            self.assertEqual(path.stat().st_mtime, 1000000000)
+            self.assertEqual(path.stat().st_mode & 0o777, 0o600)
+
+    def test_reader_waits_for_slow_writer(self):
+        release = threading.Event()
+        written = []
+        chunks_read = []
+
+        class Gate(io.BytesIO):
+            def write(self, data):
+                release.wait(5)
+                written.append(data)
+
+        class Counting(io.BytesIO):
+            def read(self, size=-1):
+                data = super().read(size)
+                if data:
+                    chunks_read.append(data)
+                return data
+
+        writer = PipelinedWriter(workers=1, max_pending=3, chunk_size=10)
+        with patch.object(pipeline, 'open', lambda *args: Gate(), create=True):
+            thread = threading.Thread(target=writer.write_stream,
+                                      args=(pathlib.Path(self.temp_dir.name, 'x'),
+                                            Counting(b'x' * 100)))
+            thread.start()
+            thread.join(0.2)
+            self.assertTrue(thread.is_alive())
+            self.assertLessEqual(len(chunks_read), 4)
+            release.set()
+            thread.join(5)
+            writer.close()
+        self.assertEqual(b''.join(written), b'x' * 100)
+
+    def test_write_error_raised(self):
+        target = pathlib.Path(self.temp_dir.name, 'file')
+        target.mkdir()
+        writer = PipelinedWriter()
+        writer.write_stream(target, io.BytesIO(b'data' * 1000))
+        with self.assertRaises(IsADirectoryError):
+            writer.close()
+
+    @unittest.skipUnless(hasattr(os, 'posix_fallocate'), 'needs posix_fallocate')
+    def test_preallocate(self):
+        with patch.object(pipeline.os, 'posix_fallocate') as fallocate:
+            with PipelinedWriter(preallocate=True) as writer:
+                writer.write_stream(pathlib.Path(self.temp_dir.name, 'file'), io.BytesIO(b'abc'), 3)
+            self.assertEqual(fallocate.call_args.args[1:], (0, 3))
@@ -0,0 +1,118 @@
+import os
+import shutil
+import pathlib
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from archive import pool
+from archive.pool import HandlePool
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(SCRIPT_DIR, 'fixtures')
+
+
+class TestHandlePool(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.paths = {}
+        for name in ['dirs.zip', 'dirs.tar.gz', 'dirs.7z', 'dirs.lha']:
+            self.paths[name] = pathlib.Path(self.temp_dir.name, name)
+            shutil.copy(os.path.join(FIXTURES_DIR, name), self.paths[name])
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_handle_reused(self):
+        with HandlePool() as handles, \
+             patch.object(pool, 'open_archive', wraps=pool.open_archive) as open_archive:
+            for _ in range(5):
+                self.assertEqual(handles.read(self.paths['dirs.tar.gz'], 'one.txt'), b'one\n')
+            open_archive.assert_called_once()
+            self.assertEqual((handles.hits, handles.misses), (4, 1))
+
+    def test_single_file_reread(self):
+        with HandlePool() as handles:
+            for name in ['file.txt.gz', 'file.txt.bz2', 'file.txt.xz']:
+                path = os.path.join(FIXTURES_DIR, name)
+                for _ in range(3):
+                    self.assertEqual(handles.read(path, 'file.txt'), b'Test text\n')
+
+    def test_member_stream_closed(self):
+        with HandlePool() as handles, \
+             patch('zipfile.ZipExtFile.close', autospec=True) as close:
+            handles.read(self.paths['dirs.zip'], 'one.txt')
+            close.assert_called_once()
+
+    def test_lru_eviction(self):
+        with HandlePool(max_open=2) as handles:
+            with handles.checkout(self.paths['dirs.zip']) as first:
+                pass
+            with handles.checkout(self.paths['dirs.tar.gz']):
+                pass
+            # Touch the zip so the tar is least recently used
+            with handles.checkout(self.paths['dirs.zip']):
+                pass
+            with handles.checkout(self.paths['dirs.7z']):
+                pass
+            self.assertEqual(len(handles), 2)
+            self.assertFalse(first.closed)
+            with handles.checkout(self.paths['dirs.zip']) as again:
+                self.assertIs(again, first)
+
+    def test_changed_file_reopened(self):
+        path = self.paths['dirs.zip']
+        with HandlePool() as handles:
+            with handles.checkout(path) as first:
+                pass
+            shutil.copy(os.path.join(FIXTURES_DIR, 'file.txt.zip'), path)
+            os.utime(path, ns=(0, 0))
+            with handles.checkout(path) as second:
+                self.assertEqual(second.wrapper.list(), ['file.txt'])
+            self.assertTrue(first.closed)
+            self.assertEqual(len(handles), 1)
+
+    def test_not_an_archive_not_pooled(self):
+        path = pathlib.Path(FIXTURES_DIR, 'templates', 'file.txt')
+        with HandlePool() as handles:
+            with self.assertRaises(ValueError):
+                with handles.checkout(path):
+                    pass
+            self.assertEqual(len(handles), 0)
+
+    def test_close_waits_for_checked_out(self):
+        handles = HandlePool()
+        with handles.checkout(self.paths['dirs.zip']) as handle:
+            handles.close()
+            self.assertFalse(handle.closed)
+        self.assertTrue(handle.closed)
+        with self.assertRaises(ValueError):
+            with handles.checkout(self.paths['dirs.zip']):
+                pass
+
+    def test_threads_share_bounded_pool(self):
+        expected = {'dirs.zip': b'one\n', 'dirs.tar.gz': b'one\n', 'dirs.7z': b'one\n',
+                    'dirs.lha': b'one\n'}
+        errors = []
+        handles = HandlePool(max_open=2)
+
+        def worker(offset):
+            try:
+                names = sorted(expected)
+                for index in range(30):
+                    name = names[(index + offset) % len(names)]
+                    self.assertLessEqual(handles._open, 2)
+                    self.assertEqual(handles.read(self.paths[name], 'one.txt'), expected[name])
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        handles.close()
+        self.assertEqual(errors, [])
+        self.assertEqual(handles._open, 0)
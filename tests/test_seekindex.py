@@ -0,0 +1,166 @@
+import io
+import os
+import bz2
+import gzip
+import lzma
+import random
+import shutil
+import pathlib
+import tempfile
+import unittest
+import subprocess
+from unittest.mock import patch
+
+from archive.seekindex import SeekIndex, GzipSeekIndex, BzipSeekIndex, XzSeekIndex, \
+                              IndexedReader, build_index, load_index, sidecar_path
+from archive.wrappers import FileUnAwareArchiveWrapper
+
+
+def make_data(lines=60000):
+    rng = random.Random(0)
+    words = [b'alpha', b'beta', b'gamma', b'GET /index.html', b'error']
+    return b''.join(b'%d %s %s\n' % (index, rng.choice(words), rng.randbytes(4).hex().encode())
+                    for index in range(lines))
+
+
+class SeekIndexTestCase(unittest.TestCase):
+
+    data = make_data()
+
+    def _check_reads(self, compressed, index):
+        self.assertEqual(index.size, len(self.data))
+        reader = io.BufferedReader(IndexedReader(io.BytesIO(compressed), index))
+        rng = random.Random(1)
+        for _ in range(20):
+            offset, count = rng.randrange(len(self.data)), rng.randrange(50000)
+            reader.seek(offset)
+            self.assertEqual(reader.read(count), self.data[offset:offset + count])
+        reader.seek(-100, io.SEEK_END)
+        self.assertEqual(reader.read(), self.data[-100:])
+        reader.seek(0)
+        self.assertEqual(reader.read(), self.data)
+
+    def _round_trip(self, index):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = pathlib.Path(temp_dir, 'index.sidx')
+            index.save(path)
+            return SeekIndex.load(path)
+
+
+class TestGzipSeekIndex(SeekIndexTestCase):
+
+    def test_checkpoints(self):
+        compressed = gzip.compress(self.data)
+        index = build_index(io.BytesIO(compressed), span=128 * 1024)
+        self.assertIsInstance(index, GzipSeekIndex)
+        self.assertGreater(len(index.points), 5)
+        self._check_reads(compressed, index)
+
+    def test_members_survive_saving(self):
+        half = len(self.data) // 2
+        compressed = gzip.compress(self.data[:half]) + gzip.compress(self.data[half:])
+        index = build_index(io.BytesIO(compressed), span=128 * 1024)
+        loaded = self._round_trip(index)
+        self.assertEqual([point.offset for point in loaded.points], [0, half])
+        self._check_reads(compressed, loaded)
+
+    def test_empty(self):
+        compressed = gzip.compress(b'')
+        index = build_index(io.BytesIO(compressed))
+        self.assertEqual(IndexedReader(io.BytesIO(compressed), index).read(), b'')
+
+
+class TestBzipSeekIndex(SeekIndexTestCase):
+
+    def test_blocks(self):
+        # Level 1 means 100k blocks
+        compressed = bz2.compress(self.data, 1)
+        index = build_index(io.BytesIO(compressed))
+        self.assertIsInstance(index, BzipSeekIndex)
+        self.assertGreater(len(index.points), 5)
+        self._check_reads(compressed, index)
+
+    def test_streams(self):
+        half = len(self.data) // 2
+        compressed = bz2.compress(self.data[:half], 1) + bz2.compress(self.data[half:], 2)
+        index = self._round_trip(build_index(io.BytesIO(compressed)))
+        self.assertIn(half, [point.offset for point in index.points])
+        self._check_reads(compressed, index)
+
+
+class TestXzSeekIndex(SeekIndexTestCase):
+
+    def test_streams(self):
+        third = len(self.data) // 3
+        compressed = b''.join(lzma.compress(self.data[start:start + third])
+                              for start in range(0, len(self.data), third))
+        index = self._round_trip(build_index(io.BytesIO(compressed)))
+        self.assertIsInstance(index, XzSeekIndex)
+        self.assertEqual(index.points[1].offset, third)
+        self._check_reads(compressed, index)
+
+    @unittest.skipUnless(shutil.which('xz'), 'xz not installed')
+    def test_blocks(self):
+        compressed = subprocess.run(['xz', '--block-size=100KiB', '-c'], input=self.data,
+                                    capture_output=True, check=True).stdout
+        index = build_index(io.BytesIO(compressed))
+        self.assertGreater(len(index.points), 5)
+        self._check_reads(compressed, index)
+
+
+class TestIndexedReader(SeekIndexTestCase):
+
+    def test_seek_restarts_from_nearest_point(self):
+        compressed = bz2.compress(self.data, 1)
+        index = build_index(io.BytesIO(compressed))
+        reader = IndexedReader(io.BytesIO(compressed), index)
+        with patch.object(index, 'chunks_from', wraps=index.chunks_from) as chunks_from:
+            reader.seek(len(self.data) - 10)
+            self.assertEqual(reader.read(10), self.data[-10:])
+            chunks_from.assert_called_once()
+            self.assertEqual(chunks_from.call_args.args[1], len(index.points) - 1)
+            # Reading on within the same block doesn't restart
+            reader.seek(-5, io.SEEK_END)
+            reader.seek(-10, io.SEEK_END)
+            self.assertEqual(reader.read(10), self.data[-10:])
+            self.assertEqual(chunks_from.call_count, 2)
+
+
+class TestLoadIndex(SeekIndexTestCase):
+
+    def test_sidecar_reused_until_file_changes(self):
+        half = len(self.data) // 2
+        compressed = {'data.bz2': bz2.compress(self.data, 1),
+                      'data.gz': gzip.compress(self.data[:half]) + gzip.compress(self.data[half:])}
+        for name, data in compressed.items():
+            with self.subTest(name=name), tempfile.TemporaryDirectory() as temp_dir:
+                path = pathlib.Path(temp_dir, name)
+                path.write_bytes(data)
+                index = load_index(path, span=len(self.data))
+                self.assertTrue(sidecar_path(path).exists())
+                with patch('archive.seekindex.build_index') as build:
+                    self.assertEqual(load_index(path).offsets, index.offsets)
+                    build.assert_not_called()
+                path.write_bytes(bz2.compress(self.data[:1000], 1))
+                os.utime(path, ns=(0, 0))
+                self.assertEqual(load_index(path).size, 1000)
+
+    def test_gzip_snapshots_not_saved(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = pathlib.Path(temp_dir, 'data.gz')
+            path.write_bytes(gzip.compress(self.data))
+            sidecar_path(path).write_text('stale')
+            index = load_index(path, span=128 * 1024)
+            self.assertGreater(len(index.points), 5)
+            self.assertFalse(sidecar_path(path).exists())
+
+    def test_wrapper_open_seekable(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = pathlib.Path(temp_dir, 'data.gz')
+            path.write_bytes(gzip.compress(self.data))
+            with gzip.open(path) as archive_obj:
+                wrapper = FileUnAwareArchiveWrapper(archive_obj, path)
+                with wrapper.open_seekable(span=128 * 1024, sidecar=False) as reader:
+                    reader.seek(len(self.data) // 2)
+                    self.assertEqual(reader.read(100), self.data[len(self.data) // 2:][:100])
+            self.assertFalse(sidecar_path(path).exists())
@@ -1,5 +1,9 @@
 import os
 import io
+import struct
+import subprocess
+import sys
+import tracemalloc
 import unittest
 from unittest.mock import patch
 import tempfile
@@ -21,7 +25,10 @@ from custom_types.io import ArchiveIO
 from archive.wrappers import ArchiveWrapper, TarArchiveWrapper, \
                              ZipArchiveWrapper, FileUnAwareArchiveWrapper, \
                              SevenZArchiveWrapper, RarArchiveWrapper, \
-                             LhaArchiveWrapper
+                             LhaArchiveWrapper, SevenZMemberReader, build_lha_index, copy_stream
+from archive.open_archive import open_archive
+from archive.pipeline import PipelinedWriter
+from archive.index_cache import IndexCache
 
 
 
@@ -43,6 +50,26 @@ dirs_contents = [
     'two/five/nine/ten.txt'
  ]
 
+
+def make_stored_lha(path, members):
+    """
+    Write a level 0 LHA archive of stored (-lh0-) members filled with zero
+    bytes, whose CRC-16 is always 0.
+    """
+    with open(path, 'wb') as fileobj:
+        for name, size in members:
+            name = name.encode()
+            header = b'-lh0-' + struct.pack('<II', size, size) + \
+                b'\x00\x00\x21\x57' + bytes([0x20, 0, len(name)]) + name + \
+                struct.pack('<H', 0)
+            fileobj.write(struct.pack('<BB', len(header), sum(header) & 0xff))
+            fileobj.write(header)
+            for _ in range(size // 2**20):
+                fileobj.write(bytes(2**20))
+            fileobj.write(bytes(size % 2**20))
+        fileobj.write(b'\x00')
+
+
 class WrapperTestCase(unittest.TestCase):
 
     def setUp(self):
@@ -120,6 +147,9 @@ class ConcreteArchiveWrapperMock(ArchiveWrapper):
     def __init__(self):
         pass
     
+    def _build_members(self):
+        pass
+    
     def list(self):
         pass
     
@@ -151,6 +181,26 @@ class TestArchiveWrapper(unittest.TestCase):
             mock_list.return_value = case[0]
             self.assertEqual(archive_wrapper._num_root_items(), case[1])
 
+    def test__has_multiple_roots_stops_at_second_root(self):
+        test_cases = [
+            ([], False),
+            (['one.txt'], False),
+            (['two/', 'two/three.txt', 'two/four/'], False),
+            (['two/three.txt', 'one.txt', 'never/read.txt'], True),
+        ]
+        archive_wrapper = ConcreteArchiveWrapperMock()
+        for names, expected in test_cases:
+            seen = []
+
+            def scan_names():
+                for name in names:
+                    seen.append(name)
+                    yield name
+
+            with patch.object(archive_wrapper, '_scan_names', scan_names):
+                self.assertEqual(archive_wrapper._has_multiple_roots(), expected)
+            self.assertNotIn('never/read.txt', seen)
+
 
 class TestTarArchiveWrapper(WrapperTestCase):
 
@@ -275,6 +325,91 @@ class TestTarArchiveWrapper(WrapperTestCase):
         wrapper = self._get_tar_wrapper(path)
         self._extract_to_asserts_file(wrapper)
 
+    def test_members_built_once(self):
+        path = pathlib.Path(FIXTURES_DIR, 'dirs.tar.gz')
+        wrapper = self._get_tar_wrapper(path)
+        with patch.object(TarArchiveWrapper, '_build_members', autospec=True,
+                          side_effect=TarArchiveWrapper._build_members) as build:
+            wrapper.list()
+            wrapper.open_by_name('two/three.txt')
+            wrapper.open_by_name('notafile')
+            wrapper._num_root_items()
+            wrapper.open_all()
+            self.assertEqual(build.call_count, 1)
+        info = wrapper.members.get('two/three.txt')
+        self.assertEqual(info.size, 6)
+        self.assertEqual(info.offset % 512, 0)
+
+
+class TestTarRootScan(unittest.TestCase):
+
+    def test_scan_stops_after_second_root(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = pathlib.Path(temp_dir, 'many.tar')
+            with tarfile.open(path, 'w') as archive_obj:
+                for name in ['a/0.txt', 'b/0.txt'] + ['b/{}.txt'.format(index) for index in range(1, 500)]:
+                    info = tarfile.TarInfo(name)
+                    archive_obj.addfile(info, io.BytesIO())
+            with tarfile.open(path) as archive_obj:
+                wrapper = TarArchiveWrapper(archive_obj, path)
+                self.assertEqual(wrapper._get_extract_path(pathlib.Path(temp_dir)),
+                                 pathlib.Path(temp_dir, 'many'))
+                self.assertEqual(len(archive_obj.members), 2)
+                self.assertNotIn('members', wrapper.__dict__)
+
+    def test_cached_members_used(self):
+        path = pathlib.Path(FIXTURES_DIR, 'dirs.tar.gz')
+        with tempfile.TemporaryDirectory() as temp_dir, \
+             IndexCache(pathlib.Path(temp_dir, 'cache.db')) as cache:
+            with open_archive(path, index_cache=cache) as handle:
+                handle.wrapper.list()
+            with open_archive(path, index_cache=cache) as handle, \
+                 patch.object(TarArchiveWrapper, '_scan_names') as scan_names:
+                self.assertTrue(handle.wrapper._has_multiple_roots())
+                scan_names.assert_not_called()
+                # tarfile reads the first header on open, and no more
+                self.assertEqual(len(handle.archive_obj.members), 1)
+
+
+class TestTarSeekIndex(unittest.TestCase):
+
+    def _make_tar(self, path, mode):
+        contents = {}
+        # Level 1 gives bzip2 100k blocks
+        with tarfile.open(path, mode, compresslevel=1) as archive_obj:
+            for index in range(300):
+                data = ''.join('member {} line {}\n'.format(index, line)
+                               for line in range(400)).encode()
+                info = tarfile.TarInfo('dir/{}.txt'.format(index))
+                info.size = len(data)
+                archive_obj.addfile(info, io.BytesIO(data))
+                contents[info.name] = data
+        return contents
+
+    def test_compressed_member_read_from_nearest_point(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for mode, suffix in (('w:gz', 'gz'), ('w:bz2', 'bz2')):
+                path = pathlib.Path(temp_dir, 'many.tar.{}'.format(suffix))
+                contents = self._make_tar(path, mode)
+                with tarfile.open(path) as archive_obj:
+                    wrapper = TarArchiveWrapper(archive_obj, path)
+                    self.assertTrue(wrapper.use_seek_index(span=256 * 1024, sidecar=False))
+                    index = wrapper._indexed_tar.fileobj.raw._index
+                    self.assertGreater(len(index.points), 5)
+                    with patch.object(index, 'chunks_from', wraps=index.chunks_from) as chunks_from:
+                        for name in ['dir/299.txt', 'dir/150.txt', 'dir/0.txt']:
+                            self.assertEqual(wrapper.open_by_name(name)[name].read(), contents[name])
+                        self.assertGreater(chunks_from.call_args_list[0].args[1], len(index.points) - 3)
+                    wrapper.close()
+
+    def test_plain_tar_unchanged(self):
+        path = pathlib.Path(FIXTURES_DIR, 'dirs.tar')
+        with tarfile.open(path) as archive_obj:
+            wrapper = TarArchiveWrapper(archive_obj, path)
+            self.assertFalse(wrapper.use_seek_index(sidecar=False))
+            self.assertEqual(wrapper.open_by_name('one.txt')['one.txt'].read(), b'one\n')
+
+
 class TestZipArchiveWrapper(WrapperTestCase):
 
     def _get_zip_wrapper(self, path):
@@ -313,6 +448,15 @@ class TestZipArchiveWrapper(WrapperTestCase):
         wrapper = self._get_zip_wrapper(path)
         self._extract_to_asserts_file(wrapper)
 
+    def test_members_metadata(self):
+        path = pathlib.Path(FIXTURES_DIR, 'dirs.zip')
+        wrapper = self._get_zip_wrapper(path)
+        info = wrapper.members.get('two/five/eight.txt')
+        self.assertEqual(info.size, 6)
+        self.assertFalse(info.is_dir)
+        self.assertTrue(wrapper.members.get('two/').is_dir)
+
+
 class TestSevenZArchiveWrapper(WrapperTestCase):
 
     def _get_sevenz_wrapper(self, path):
@@ -351,6 +495,57 @@ class TestSevenZArchiveWrapper(WrapperTestCase):
         wrapper = self._get_sevenz_wrapper(path)
         self._extract_to_asserts_file(wrapper)
 
+    def test_iter_by_names_in_archive_order(self):
+        path = pathlib.Path(FIXTURES_DIR, 'dirs.7z')
+        wrapper = self._get_sevenz_wrapper(path)
+        results = list(wrapper.iter_by_names(['two/three.txt', 'one.txt', 'two/']))
+        self.assertEqual([name for name, _ in results], ['two/', 'one.txt', 'two/three.txt'])
+        self.assertIsNone(results[0][1])
+        self.assertEqual(b'one\n', results[1][1].read())
+        self.assertEqual(b'three\n', results[2][1].read())
+
+    def test_open_all_single_pass(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = pathlib.Path(temp_dir, 'many.7z')
+            with py7zr.SevenZipFile(path, 'w') as archive:
+                for index in range(200):
+                    archive.writestr('member {}\n'.format(index), 'dir/{}.txt'.format(index))
+            wrapper = self._get_sevenz_wrapper(path)
+            with patch.object(self.archiveobj, 'reset', wraps=self.archiveobj.reset) as reset:
+                results = wrapper.open_all()
+                reset.assert_called_once()
+            self.assertEqual(len(results), 200)
+            self.assertEqual(b'member 150\n', results['dir/150.txt'].read())
+
+    def test_iter_by_names_skips_unwanted_folders(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = pathlib.Path(temp_dir, 'many.7z')
+            # Each append session writes a separate folder
+            for batch in range(4):
+                with py7zr.SevenZipFile(path, 'a' if batch else 'w') as archive:
+                    for index in range(batch * 10, batch * 10 + 10):
+                        archive.writestr('member {}\n'.format(index), '{}.txt'.format(index))
+            wrapper = self._get_sevenz_wrapper(path)
+            decompress = py7zr.py7zr.Worker.decompress
+            with patch.object(py7zr.py7zr.Worker, 'decompress', autospec=True,
+                              side_effect=decompress) as worker_decompress:
+                self.assertEqual(wrapper.open_by_name('39.txt')['39.txt'].read(), b'member 39\n')
+                self.assertEqual(worker_decompress.call_count, 10)
+                worker_decompress.reset_mock()
+                results = dict(wrapper.iter_by_names(['12.txt', '31.txt']))
+                self.assertEqual(worker_decompress.call_count, 5)
+            self.assertEqual(results['12.txt'].read(), b'member 12\n')
+            self.assertEqual(results['31.txt'].read(), b'member 31\n')
+
+    def test_member_reader_in_solid_folder(self):
+        path = pathlib.Path(FIXTURES_DIR, 'dirs.7z')
+        self._get_sevenz_wrapper(path)
+        member = [file for file in self.archiveobj.files if file.filename == 'two/three.txt'][0]
+        reader = SevenZMemberReader(self.archiveobj, member)
+        self.assertEqual(reader.read(), b'three\n')
+        reader.seek(2)
+        self.assertEqual(reader.read(), b'ree\n')
+
 
 class TestRarArchiveWrapper(WrapperTestCase):
 
@@ -390,6 +585,31 @@ class TestRarArchiveWrapper(WrapperTestCase):
         wrapper = self._get_rar_wrapper(path)
         self._extract_to_asserts_file(wrapper)
 
+    def test_open_by_name_does_not_reparse_headers(self):
+        path = pathlib.Path(FIXTURES_DIR, 'dirs.rar')
+        wrapper = self._get_rar_wrapper(path)
+        names = ['one.txt', 'two/three.txt', 'two/five/eight.txt']
+        expected = {'one.txt': b'one\n', 'two/three.txt': b'three\n',
+                    'two/five/eight.txt': b'eight\n'}
+        with patch.object(rarfile.RarFile, '_parse', autospec=True) as parse:
+            for index in range(1000):
+                name = names[index % len(names)]
+                result = wrapper.open_by_name(name)
+                self.assertEqual(expected[name], result[name].read())
+            self.assertEqual(parse.call_count, 0)
+
+    def test_interleaved_reads_are_independent(self):
+        path = pathlib.Path(FIXTURES_DIR, 'dirs.rar')
+        wrapper = self._get_rar_wrapper(path)
+        one = wrapper.open_by_name('one.txt')['one.txt']
+        three = wrapper.open_by_name('two/three.txt')['two/three.txt']
+        self.assertEqual(b'on', one.read(2))
+        self.assertEqual(b'thr', three.read(3))
+        self.assertEqual(b'e\n', one.read())
+        self.assertEqual(b'ee\n', three.read())
+        one.seek(0)
+        self.assertEqual(b'one\n', one.read())
+
 
 class TestLhaArchiveWrapper(WrapperTestCase):
 
@@ -429,6 +649,64 @@ class TestLhaArchiveWrapper(WrapperTestCase):
         wrapper = self._get_lha_wrapper(path)
         self._extract_to_asserts_file(wrapper)
 
+    def test_index_built_once(self):
+        path = pathlib.Path(FIXTURES_DIR, 'dirs.lha')
+        wrapper = self._get_lha_wrapper(path)
+        with patch('archive.wrappers.build_lha_index') as build_index:
+            wrapper.list()
+            wrapper.open_by_name('two/')
+            wrapper.open_by_name('notafile')
+            self.assertEqual(wrapper._num_root_items(), 2)
+            build_index.assert_not_called()
+
+    def test_open_by_name_interleaved(self):
+        path = pathlib.Path(FIXTURES_DIR, 'dirs.lha')
+        wrapper = self._get_lha_wrapper(path)
+        one = wrapper.open_by_name('one.txt')['one.txt']
+        three = wrapper.open_by_name('two/three.txt')['two/three.txt']
+        self.assertEqual(b'on', one.read(2))
+        self.assertEqual(b'three\n', three.read())
+        self.assertEqual(b'e\n', one.read())
+        one.seek(1)
+        self.assertEqual(b'ne\n', one.read())
+
+
+class TestLhaArchiveWrapperMemory(unittest.TestCase):
+
+    def _extract_peak_rss(self, size):
+        script = (
+            'import resource, sys, lhafile, pathlib\n'
+            'from archive.wrappers import LhaArchiveWrapper\n'
+            'path, target = sys.argv[1:]\n'
+            'with open(path, "rb") as fileobj:\n'
+            '    wrapper = LhaArchiveWrapper(lhafile.LhaFile(fileobj), pathlib.Path(path))\n'
+            '    wrapper.extract_to(target)\n'
+            'print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)\n'
+        )
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = pathlib.Path(temp_dir, 'big.lha')
+            make_stored_lha(path, [('big.bin', size)])
+            target = pathlib.Path(temp_dir, 'out')
+            output = subprocess.run([sys.executable, '-c', script, str(path), str(target)],
+                                    cwd=os.path.dirname(SCRIPT_DIR), check=True,
+                                    capture_output=True, text=True).stdout
+            self.assertEqual(os.path.getsize(pathlib.Path(target, 'big.bin')), size)
+        return int(output) * 1024
+
+    def test_extract_to_peak_rss_flat(self):
+        small = self._extract_peak_rss(4 * 2**20)
+        large = self._extract_peak_rss(64 * 2**20)
+        self.assertLess(large - small, 16 * 2**20)
+
+
+class TestBuildLhaIndex(unittest.TestCase):
+
+    def test_build_lha_index(self):
+        index = build_lha_index(['one.txt', 'two/three.txt', 'two/five/eight.txt'])
+        self.assertEqual(index.files, ('one.txt', 'two/three.txt', 'two/five/eight.txt'))
+        self.assertEqual(index.dir_set, frozenset(['two/', 'two/five/']))
+        self.assertEqual(index.num_root_items, 2)
+
 
 class TestFileUnawareArchiveWrapper(WrapperTestCase):
 
@@ -512,3 +790,195 @@ class TestFileUnawareArchiveWrapper(WrapperTestCase):
             self.assertEqual(set(['file.txt']), set(os.listdir(temp_dir)))
             with open(pathlib.Path(temp_dir, 'file.txt'), 'rb') as file:
                 self.assertEqual(b'Test text\n', file.read())
+
+    def test_extract_to_bounded_memory(self):
+        payload_size = 32 * 2**20
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = pathlib.Path(temp_dir, 'zeros.bin.gz')
+            with gzip.open(path, 'wb') as fileobj:
+                for _ in range(payload_size // 2**20):
+                    fileobj.write(bytes(2**20))
+            wrapper = self._get_gz_wrapper(path)
+            tracemalloc.start()
+            try:
+                wrapper.extract_to(temp_dir, chunk_size=64 * 1024)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            self.assertEqual(os.path.getsize(pathlib.Path(temp_dir, 'zeros.bin')), payload_size)
+            self.assertLess(peak, 4 * 2**20)
+
+
+class TestCopyStream(unittest.TestCase):
+
+    def test_copy_stream(self):
+        source = io.BytesIO(b'0123456789' * 1000)
+        target = io.BytesIO()
+        self.assertEqual(copy_stream(source, target, chunk_size=7), 10000)
+        self.assertEqual(target.getvalue(), b'0123456789' * 1000)
+
+
+class TestIterMembers(unittest.TestCase):
+
+    def _check(self, name):
+        path = pathlib.Path(FIXTURES_DIR, name)
+        with open_archive(path) as handle:
+            expected = {}
+            for member in handle.wrapper.list():
+                item = handle.wrapper.open_by_name(member)
+                stream = item.get(member) if item else None
+                expected[member] = None if stream is None else stream.read()
+        with open_archive(path) as handle:
+            seen = {}
+            streams = []
+            for info, stream in handle.wrapper.iter_members():
+                self.assertEqual(info, handle.wrapper.members.get(info.name))
+                seen[info.name] = None if stream is None else stream.read()
+                streams.append(stream)
+            self.assertEqual(seen, expected)
+            if name != 'file.txt.gz':
+                self.assertTrue(all(stream.closed for stream in streams if stream is not None))
+
+    def test_iter_members(self):
+        for name in ['dirs.tar.gz', 'dirs.zip', 'dirs.7z', 'dirs.rar', 'dirs.lha', 'file.txt.gz']:
+            with self.subTest(name=name):
+                self._check(name)
+
+    def test_stream_tar_keeps_no_headers(self):
+        with open(pathlib.Path(FIXTURES_DIR, 'dirs.tar.gz'), 'rb') as fileobj:
+            archive_obj = tarfile.open(fileobj=fileobj, mode='r|*')
+            wrapper = TarArchiveWrapper(archive_obj, pathlib.Path('dirs.tar.gz'))
+            names = []
+            for info, stream in wrapper.iter_members():
+                names.append(info.name)
+                self.assertLessEqual(len(archive_obj.members), 1)
+            self.assertIn('two/five/nine/ten.txt', names)
+
+
+class TestSelectiveExtract(unittest.TestCase):
+
+    def _extracted(self, temp_dir):
+        return sorted(os.path.relpath(os.path.join(root, file), temp_dir)
+                      for root, _, files in os.walk(temp_dir) for file in files)
+
+    def test_include_and_exclude(self):
+        for name in ['dirs.tar.gz', 'dirs.zip', 'dirs.7z', 'dirs.rar', 'dirs.lha']:
+            with self.subTest(name=name), tempfile.TemporaryDirectory() as temp_dir, \
+                 open_archive(pathlib.Path(FIXTURES_DIR, name)) as handle:
+                handle.wrapper.extract_to(temp_dir, include=['*.txt'], exclude=['two/five/*'])
+                self.assertEqual(self._extracted(temp_dir),
+                                 ['dirs/one.txt', 'dirs/two/four/six.txt', 'dirs/two/three.txt'])
+
+    def test_predicate(self):
+        for name in ['dirs.tar.gz', 'dirs.zip', 'dirs.7z', 'dirs.rar', 'dirs.lha']:
+            with self.subTest(name=name), tempfile.TemporaryDirectory() as temp_dir, \
+                 open_archive(pathlib.Path(FIXTURES_DIR, name)) as handle:
+                handle.wrapper.extract_to(temp_dir, predicate=lambda info: info.size == 6)
+                self.assertEqual(self._extracted(temp_dir),
+                                 ['dirs/two/five/eight.txt', 'dirs/two/three.txt'])
+
+    def test_options_keyword_only(self):
+        for name in ['dirs.tar.gz', 'dirs.zip', 'dirs.7z', 'dirs.rar', 'dirs.lha', 'file.txt.gz']:
+            with self.subTest(name=name), tempfile.TemporaryDirectory() as temp_dir, \
+                 open_archive(pathlib.Path(FIXTURES_DIR, name)) as handle:
+                with self.assertRaises(TypeError):
+                    handle.wrapper.extract_to(temp_dir, ['*.txt'])
+
+    def test_nothing_selected_from_compressed_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir, \
+             open_archive(pathlib.Path(FIXTURES_DIR, 'file.txt.gz')) as handle:
+            handle.wrapper.extract_to(temp_dir, include=['other'])
+            self.assertEqual(self._extracted(temp_dir), [])
+
+    def test_open_all_filtered(self):
+        with open_archive(pathlib.Path(FIXTURES_DIR, 'dirs.zip')) as handle:
+            items = handle.wrapper.open_all(include=['two/*'], predicate=lambda info: not info.is_dir)
+            self.assertEqual(sorted(items), ['two/five/eight.txt', 'two/five/nine/ten.txt',
+                                             'two/four/seven/.keep', 'two/four/six.txt',
+                                             'two/three.txt'])
+
+    def test_zip_skips_unselected(self):
+        with tempfile.TemporaryDirectory() as temp_dir, \
+             open_archive(pathlib.Path(FIXTURES_DIR, 'dirs.zip')) as handle:
+            with patch.object(zipfile.ZipFile, 'open', wraps=handle.archive_obj.open) as zip_open:
+                handle.wrapper.extract_to(temp_dir, include=['two/three.txt'])
+            self.assertEqual([call.args[0].filename for call in zip_open.call_args_list],
+                             ['two/three.txt'])
+
+    def test_stream_tar_stops_at_last_target(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = pathlib.Path(temp_dir, 'many.tar.gz')
+            with tarfile.open(path, 'w:gz') as archive_obj:
+                for index in range(200):
+                    data = os.urandom(4096)
+                    info = tarfile.TarInfo('{}.bin'.format(index))
+                    info.size = len(data)
+                    archive_obj.addfile(info, io.BytesIO(data))
+            target = pathlib.Path(temp_dir, 'out')
+            with open(path, 'rb') as fileobj:
+                archive_obj = tarfile.open(fileobj=fileobj, mode='r|*')
+                wrapper = TarArchiveWrapper(archive_obj, path)
+                wrapper.extract_to(target, include=['3.bin', '10.bin'])
+                self.assertLess(fileobj.tell(), os.path.getsize(path) / 4)
+            self.assertEqual(sorted(os.listdir(target)), ['10.bin', '3.bin'])
+
+    def test_compressed_tar_stops_at_last_target(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = pathlib.Path(temp_dir, 'many.tar.gz')
+            with tarfile.open(path, 'w:gz') as archive_obj:
+                for index in range(200):
+                    data = os.urandom(4096)
+                    info = tarfile.TarInfo('{}.bin'.format(index))
+                    info.size = len(data)
+                    archive_obj.addfile(info, io.BytesIO(data))
+            target = pathlib.Path(temp_dir, 'out')
+            with open_archive(path) as handle:
+                handle.wrapper.extract_to(target, include=['3.bin', '10.bin'])
+                self.assertEqual(len(handle.archive_obj.members), 11)
+            self.assertEqual(sorted(os.listdir(pathlib.Path(target, 'many'))), ['10.bin', '3.bin'])
+
+
+class TestPipelinedExtract(unittest.TestCase):
+
+    def _tree(self, root):
+        tree = {}
+        for dirpath, _, files in os.walk(root):
+            for file in files:
+                with open(os.path.join(dirpath, file), 'rb') as fileobj:
+                    tree[os.path.relpath(os.path.join(dirpath, file), root)] = fileobj.read()
+        return tree
+
+    def test_same_result_as_serial(self):
+        for name in ['dirs.tar.gz', 'dirs.zip', 'dirs.lha', 'file.txt.gz']:
+            with self.subTest(name=name), tempfile.TemporaryDirectory() as serial, \
+                 tempfile.TemporaryDirectory() as pipelined:
+                with open_archive(pathlib.Path(FIXTURES_DIR, name)) as handle:
+                    handle.wrapper.extract_to(serial)
+                with open_archive(pathlib.Path(FIXTURES_DIR, name)) as handle, \
+                     patch('archive.wrappers.PipelinedWriter.write_stream', autospec=True,
+                           side_effect=PipelinedWriter.write_stream) as write_stream:
+                    handle.wrapper.extract_to(pipelined, writers=2, preallocate=True)
+                    self.assertTrue(write_stream.called)
+                self.assertEqual(self._tree(pipelined), self._tree(serial))
+                self.assertTrue(self._tree(serial))
+
+    def test_tar_mtimes_match_serial(self):
+        with tempfile.TemporaryDirectory() as serial, tempfile.TemporaryDirectory() as pipelined:
+            for target, options in [(serial, {}), (pipelined, {'writers': 2})]:
+                with open_archive(pathlib.Path(FIXTURES_DIR, 'dirs.tar.gz')) as handle:
+                    handle.wrapper.extract_to(target, **options)
+            mtimes = []
+            # dirs itself is made by the wrapper rather than taken from the archive
+            for root in [os.path.join(serial, 'dirs'), os.path.join(pipelined, 'dirs')]:
+                mtimes.append({os.path.relpath(dirpath, root): os.stat(dirpath).st_mtime
+                               for dirpath, _, _ in os.walk(root) if dirpath != root})
+            self.assertIn('two', mtimes[0])
+            self.assertEqual(mtimes[1], mtimes[0])
+
+    def test_with_filter(self):
+        with tempfile.TemporaryDirectory() as temp_dir, \
+             open_archive(pathlib.Path(FIXTURES_DIR, 'dirs.tar.gz')) as handle:
+            handle.wrapper.extract_to(temp_dir, include=['two/*.txt'], exclude=['two/five/*'],
+                                      writers=2)
+            self.assertEqual(sorted(self._tree(temp_dir)),
+                             ['dirs/two/four/six.txt', 'dirs/two/three.txt'])